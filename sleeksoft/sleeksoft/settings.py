@@ -53,8 +53,9 @@ CKEDITOR_CONFIGS = {
 }
 
 
-DATA_UPLOAD_MAX_MEMORY_SIZE = 1073741824  # 1GB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 1073741824
+# Phần form không phải file (file upload được ghi thẳng xuống đĩa, xem sleekweb/uploads.py)
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+FILE_UPLOAD_HANDLERS = ['sleekweb.uploads.StreamingUploadHandler']
 
 
 import environ
@@ -76,6 +77,77 @@ EMAIL_PORT = env('EMAIL_PORT')
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
 
+# Cache dùng chung cho mọi worker gunicorn và lệnh manage.py: version trang, khoá render, xếp hạng nguồn kênh
+# Mặc định là thư mục trên đĩa (dùng chung giữa các process trên một máy, cache hit không tốn query DB)
+# Chạy nhiều máy: đặt CACHE_URL=redis://... hoặc pymemcache://...
+# Không dùng locmem: mỗi process có bản riêng, invalidation không tới được worker khác
+CACHE_DIR = env('CACHE_DIR', default=os.path.join(BASE_DIR, 'cache_data'))
+CACHES = {'default': env.cache('CACHE_URL', default=f'filecache://{CACHE_DIR}?max_entries=20000')}
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.filebased.FileBasedCache':
+    # Khoá render (cache.add) phải nguyên tử giữa các process (sleekweb/cache_backend.py)
+    CACHES['default']['BACKEND'] = 'sleekweb.cache_backend.FileCache'
+
+# HLS relay: phát playlist/segment qua server này thay vì để mỗi người xem gọi thẳng CDN
+HLS_RELAY = env.bool('HLS_RELAY', default=False)
+HLS_RELAY_SEGMENT_CACHE_BYTES = env.int('HLS_RELAY_SEGMENT_CACHE_BYTES', default=256 * 1024 * 1024)
+# Segment lưu trên đĩa, dùng chung cho mọi worker gunicorn (giới hạn tổng, không nhân theo số worker)
+HLS_RELAY_SEGMENT_CACHE_DIR = env('HLS_RELAY_SEGMENT_CACHE_DIR', default=os.path.join(CACHE_DIR, 'hls_segments'))
+
+# Nén gzip/brotli cho HTML và JSON, bỏ qua response nhỏ hơn ngưỡng này (byte)
+COMPRESS_MIN_BYTES = env.int('COMPRESS_MIN_BYTES', default=1024)
+
+# CDN / reverse proxy trước các trang public: thời gian giữ cache và endpoint xoá theo surrogate key
+CDN_CACHE_MAX_AGE = env.int('CDN_CACHE_MAX_AGE', default=300)
+CDN_SURROGATE_KEY_HEADER = env('CDN_SURROGATE_KEY_HEADER', default='Surrogate-Key')
+CDN_PURGE_URL = env('CDN_PURGE_URL', default=None)  # None = không gửi lệnh xoá
+CDN_PURGE_TOKEN = env('CDN_PURGE_TOKEN', default=None)
+
+# Upload: file tạm nằm cùng ổ với MEDIA_ROOT để chuyển vào storage bằng rename, không copy lần hai
+FILE_UPLOAD_TEMP_DIR = env('FILE_UPLOAD_TEMP_DIR', default=os.path.join(BASE_DIR, 'upload_tmp'))
+UPLOAD_MAX_BYTES = env.int('UPLOAD_MAX_BYTES', default=1024 * 1024 * 1024)  # 1GB mỗi file
+# Upload video lớn theo từng phần (chunked_uploads.py), phiên bỏ dở bị xoá sau TTL (gc_upload_sessions)
+UPLOAD_PART_SIZE = env.int('UPLOAD_PART_SIZE', default=8 * 1024 * 1024)
+CHUNKED_UPLOAD_MAX_BYTES = env.int('CHUNKED_UPLOAD_MAX_BYTES', default=20 * 1024 * 1024 * 1024)
+UPLOAD_SESSION_TTL_HOURS = env.int('UPLOAD_SESSION_TTL_HOURS', default=24)
+
+# Chuyển mã video sang HLS nhiều mức bitrate sau khi upload (transcoding.py)
+VIDEO_TRANSCODER = env('VIDEO_TRANSCODER', default='sleekweb.transcoding.FfmpegTranscoder')
+VIDEO_TRANSCODE_ON_SAVE = env.bool('VIDEO_TRANSCODE_ON_SAVE', default=True)  # False = chỉ chạy bằng transcode_videos
+FFMPEG_BIN = env('FFMPEG_BIN', default='ffmpeg')
+FFPROBE_BIN = env('FFPROBE_BIN', default='ffprobe')
+
+# File trong MEDIA_ROOT (/upload/) qua views/client/media_client.py
+MEDIA_SENDFILE = env('MEDIA_SENDFILE', default=None)  # None | 'x-accel-redirect' (nginx) | 'x-sendfile' (Apache)
+MEDIA_ACCEL_PREFIX = env('MEDIA_ACCEL_PREFIX', default='/protected-upload/')  # location internal của nginx, alias tới MEDIA_ROOT
+MEDIA_CACHE_MAX_AGE = env.int('MEDIA_CACHE_MAX_AGE', default=3600)  # file có hash trong tên: 1 năm, immutable
+
+# File upload lưu theo hash nội dung, file trùng chỉ lưu một lần, xoá khi hết tham chiếu (storage.py)
+STORAGES = {
+    'default': {'BACKEND': env('MEDIA_STORAGE', default='sleekweb.storage.ContentAddressedStorage')},
+    # Django 5.1 bỏ qua STATICFILES_STORAGE bên dưới, giữ nguyên storage static đang chạy
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_BLOB_GRACE_SECONDS = env.int('MEDIA_BLOB_GRACE_SECONDS', default=60)  # blob vừa lưu lại thì chưa xoá, để gc_media xử lý
+
+# Ảnh thu nhỏ WebP/JPEG cho srcset (image_variants.py), tạo ngay sau upload hoặc khi có request đầu tiên
+IMAGE_VARIANT_WIDTHS = tuple(env.list('IMAGE_VARIANT_WIDTHS', cast=int, default=[160, 320, 640, 1280]))
+IMAGE_VARIANT_MAX_WIDTH = env.int('IMAGE_VARIANT_MAX_WIDTH', default=1920)
+IMAGE_VARIANTS_ON_SAVE = env.bool('IMAGE_VARIANTS_ON_SAVE', default=True)  # False = chỉ tạo khi có request
+# Ảnh động: luôn tạo WebP động; thêm MP4 khi đặt 'sleekweb.animated_images.FfmpegAnimationEncoder' (animated_images.py)
+ANIMATION_VIDEO_ENCODER = env('ANIMATION_VIDEO_ENCODER', default=None)
+ANIMATION_MAX_PIXELS = env.int('ANIMATION_MAX_PIXELS', default=50_000_000)  # tổng pixel các khung WebP thu nhỏ giữ trong RAM (x4 byte)
+
+# Ảnh tỉ lệ cược upload hàng loạt (image_ingest.py): số luồng xử lý, ảnh rộng hơn thì thu nhỏ lại
+IMAGE_INGEST_WORKERS = env.int('IMAGE_INGEST_WORKERS', default=4)
+IMAGE_INGEST_MAX_WIDTH = env.int('IMAGE_INGEST_MAX_WIDTH', default=1920)
+
+# Nhập sản phẩm / video từ Excel (catalog_import.py): số dòng mỗi lần bulk_create
+IMPORT_BATCH_SIZE = env.int('IMPORT_BATCH_SIZE', default=500)
+
+# Warm-up lúc khởi động (wsgi.py): import view, URL, template, cache trang chủ
+WARMUP_ON_STARTUP = env.bool('WARMUP_ON_STARTUP', default=True)
+WARMUP_PRIME_CACHES = env.bool('WARMUP_PRIME_CACHES', default=True)
+
 
 
 
@@ -106,6 +178,8 @@ AUTH_USER_MODEL = 'sleekweb.User'
 DOMAIN = 'http://127.0.0.1:8000'
 
 MIDDLEWARE = [
+    # Đứng đầu để nén sau cùng (sau khi browser_reload chèn script)
+    'sleekweb.compression.CompressionMiddleware',
     "django_browser_reload.middleware.BrowserReloadMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -31,8 +31,15 @@ from django.conf.urls.static import serve
 from django.views.generic import RedirectView
 
 
+from sleekweb.lazy_views import LazyModule
+
+media_client = LazyModule('sleekweb.views.client.media_client')
+
+
 urlpatterns = [
     # path('admin/', admin.site.urls),
     path("__reload__/", include("django_browser_reload.urls")),
     path('', include('sleekweb.urls')),
-]+ static(settings.MEDIA_URL,document_root=settings.MEDIA_ROOT)
+    # File upload: Range, ETag, cache header; web server gửi file khi bật MEDIA_SENDFILE
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', media_client.serve_media, name='media'),
+]
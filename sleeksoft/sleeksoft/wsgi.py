@@ -8,9 +8,15 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 """
 
 import os
+import time
 
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sleeksoft.settings')
 
+started = time.perf_counter()
 application = get_wsgi_application()
+
+# Warm-up before serving (once in the master with gunicorn --preload)
+from sleekweb.warmup import startup  # noqa: E402
+startup(setup_seconds=time.perf_counter() - started)
@@ -0,0 +1,152 @@
+"""
+Smaller encodings of animated images (the Animation_Image GIFs on home),
+made by image_variants.generate after an upload. The original is kept;
+next to it in _variants/ go
+
+    <stem>.<hash>.<width>.webp     animated WebP (Pillow), every frame and its timing
+    <stem>.<hash>.<width>.mp4      muted H.264, only when ANIMATION_VIDEO_ENCODER is set
+
+An encoding is kept only when it is smaller than what it would replace: the
+WebP than the original, the MP4 than both. The manifest records the bytes of
+the original and of every encoding made under 'animation' (see
+`manage.py report_animations`). Templates get the WebP through
+`webp_srcset` (a <picture> source, the GIF stays the fallback) and the MP4
+URL as `mp4`, to play in a <video> instead.
+
+The video encoder is pluggable: ANIMATION_VIDEO_ENCODER is the dotted path
+of a class with `mp4(source, output_path, width)`; see FfmpegAnimationEncoder.
+
+Encoding runs on the 'animation' background pool, never in a request
+(image_client.image_variant serves the original until it is done). A WebP
+at the original width is encoded straight from the source, frame by frame;
+a resized one needs every resized frame in memory, so it is skipped when
+they would take more than ANIMATION_MAX_PIXELS and the MP4 encoder, which
+streams, is left to do the resize.
+"""
+
+import os
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+
+from .transcoding import FfmpegTranscoder
+
+
+logger = logging.getLogger(__name__)
+
+WEBP_OPTIONS = {'quality': 80, 'method': 4}
+# Browsers play GIF frames without a delay at about 10 fps
+DEFAULT_FRAME_DURATION = 100
+
+
+class FfmpegAnimationEncoder(FfmpegTranscoder):
+    """Muted H.264 MP4 with ffmpeg (FFMPEG_BIN)"""
+
+    def mp4(self, source, output_path, width):
+        self.run([
+            self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-i', source,
+            # yuv420p needs even sides
+            '-vf', f'scale={width // 2 * 2}:-2,format=yuv420p', '-an',
+            '-c:v', 'libx264', '-preset', 'slow', '-crf', '28', '-movflags', '+faststart',
+            '-f', 'mp4', output_path,
+        ])
+
+
+def get_video_encoder():
+    path = getattr(settings, 'ANIMATION_VIDEO_ENCODER', None)
+    return import_string(path)() if path else None
+
+
+def max_pixels():
+    return getattr(settings, 'ANIMATION_MAX_PIXELS', 50_000_000)
+
+
+def scaled_height(image, width):
+    return max(1, round(image.height * width / image.width))
+
+
+def fits_in_memory(image, width):
+    """The resized frames of `image` stay under ANIMATION_MAX_PIXELS (a copy at full size is never made)"""
+    return width == image.width or image.n_frames * width * scaled_height(image, width) <= max_pixels()
+
+
+def save_webp(image, out, width):
+    """Write every frame of the open animated `image`, `width` px wide, as an animated WebP"""
+    from PIL import Image, ImageSequence
+
+    durations = [frame.info.get('duration') or DEFAULT_FRAME_DURATION for frame in ImageSequence.Iterator(image)]
+    options = dict(save_all=True, duration=durations, loop=image.info.get('loop', 0), **WEBP_OPTIONS)
+    image.seek(0)
+    if width == image.width:
+        # Pillow reads the frames one at a time from the source
+        image.save(out, 'WEBP', **options)
+        return
+    size = (width, scaled_height(image, width))
+    frames = [frame.convert('RGBA').resize(size, Image.LANCZOS) for frame in ImageSequence.Iterator(image)]
+    frames[0].save(out, 'WEBP', append_images=frames[1:], **options)
+
+
+def encode_mp4(encoder, source, path, width):
+    """Run the video encoder into a temp file beside `path`, then rename it into place"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.partial')
+    os.close(fd)
+    try:
+        encoder.mp4(source, partial, width)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def encode(name, image, manifest):
+    """Make the smaller encodings of the open animated `image` stored as `name`; fills in `manifest`"""
+    from .image_variants import max_width, variant_dir, write_atomic
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+    width = min(image.width, max_width())
+    prefix = f'{variant_dir(name)}/{stem}.{manifest["hash"]}.{width}'
+    sizes = {'source': manifest['size']}
+    smallest = manifest['size']
+
+    webp = f'{prefix}.webp'
+    if not fits_in_memory(image, width):
+        logger.warning('%s: %d frames too large to resize to WebP', name, image.n_frames)
+    else:
+        write_atomic(default_storage.path(webp), lambda out: save_webp(image, out, width))
+        sizes['webp'] = os.path.getsize(default_storage.path(webp))
+        if sizes['webp'] < smallest:
+            manifest['variants']['webp'].append([width, webp])
+            smallest = sizes['webp']
+        else:
+            os.remove(default_storage.path(webp))
+
+    encoder = get_video_encoder()
+    if encoder:
+        mp4 = f'{prefix}.mp4'
+        try:
+            encode_mp4(encoder, default_storage.path(name), default_storage.path(mp4), width)
+        except Exception as e:
+            # WebP alone is still worth having
+            logger.warning('MP4 for %s failed: %s', name, e)
+        else:
+            sizes['mp4'] = os.path.getsize(default_storage.path(mp4))
+            if sizes['mp4'] < smallest:
+                manifest['video'] = [width, mp4]
+            else:
+                os.remove(default_storage.path(mp4))
+    manifest['animation'] = sizes
+    return manifest
+
+
+def served_size(manifest):
+    """(bytes, format) of what home sends for an animated image: the smallest kept encoding"""
+    sizes = manifest['animation']
+    if manifest.get('video'):
+        return sizes['mp4'], 'mp4'
+    if manifest['variants'].get('webp'):
+        return sizes['webp'], 'webp'
+    return sizes['source'], 'original'
@@ -1,6 +1,17 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class SleekwebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sleekweb'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Thư mục file upload tạm (uploads.py), phải có trước khi check files.E001 chạy
+        if getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None):
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+
@@ -0,0 +1,77 @@
+"""
+Small in-process thread pools for work that must not block a request
+(CDN purges, video transcoding, animated image encoding, file deletion, ...). Jobs are per worker process and are
+lost on restart, so only use it for work that is safe to drop or that a
+command can redo. Long jobs go to their own pool (submit_to) so they do not
+hold up the short ones in 'default'.
+"""
+
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Pool name -> worker threads; 'default' is BACKGROUND_WORKERS
+POOL_SIZES = {
+    'transcode': 1,
+    'delete': 1,
+    'animation': 1,
+    'upload': 1,
+}
+
+_executors = {}
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def executor(pool='default'):
+    with _executor_lock:
+        if pool not in _executors:
+            workers = getattr(settings, 'BACKGROUND_WORKERS', 2) if pool == 'default' else POOL_SIZES[pool]
+            _executors[pool] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'sleekweb-{pool}')
+        return _executors[pool]
+
+
+def _run(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        logger.exception('Background job %s failed', getattr(fn, '__name__', fn))
+        raise
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the default pool, returns a Future"""
+    return submit_to('default', fn, *args, **kwargs)
+
+
+def submit_to(pool, fn, *args, **kwargs):
+    future = executor(pool).submit(_run, fn, args, kwargs)
+    with _executor_lock:
+        _pending.add(future)
+    future.add_done_callback(_forget)
+    return future
+
+
+def _forget(future):
+    with _executor_lock:
+        _pending.discard(future)
+
+
+def wait_idle(timeout=None):
+    """Block until no job is pending, including jobs queued by jobs (tests, shutdown)"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        with _executor_lock:
+            futures = list(_pending)
+        if not futures:
+            return True
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return False
+        wait(futures, timeout=remaining)
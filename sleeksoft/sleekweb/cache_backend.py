@@ -0,0 +1,37 @@
+"""
+FileBasedCache with an atomic `add`, the default CACHES backend (settings.py).
+
+The cache directory is shared by every gunicorn worker and manage.py command
+on the machine, so page versions (page_cache.py), content versions
+(content_version.py) and channel rankings (stream_ranking.py) written by one
+process are read by all. Django's own `add` checks and then writes, so two
+workers could both take the render lock in page_cache.cached_page; here the
+entry is written to a temp file and hard-linked into place, which fails when
+the key already exists.
+"""
+
+import os
+import tempfile
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class FileCache(FileBasedCache):
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Also removes an expired entry
+        if self.has_key(key, version):
+            return False
+        self._createdir()
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            try:
+                os.link(tmp_path, self._key_to_file(key, version))
+            except FileExistsError:
+                return False
+            return True
+        finally:
+            os.remove(tmp_path)
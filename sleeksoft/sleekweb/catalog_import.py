@@ -0,0 +1,209 @@
+"""
+Bulk import of Products and Videos from an Excel sheet (`manage.py
+import_catalog`, POST /admin/import/<kind>).
+
+The workbook is opened with openpyxl in read-only mode, which streams rows
+out of the file instead of loading the whole sheet. The first row names the
+columns, by field name or verbose name ('Title' or 'Tiêu đề'); other
+columns are ignored. Rows are validated one at a time and inserted with
+bulk_create in chunks of IMPORT_BATCH_SIZE, each chunk in its own
+transaction. A bad row is reported with its sheet row number and skipped;
+the rest of the file is still imported.
+
+Product slugs are allocated per chunk by slugs.allocate_slugs, one query
+per base slug. Video rows may point Avatar / Video at files already in
+storage, e.g. uploaded through /admin/video/upload/.
+"""
+
+import os
+from zipfile import BadZipFile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+
+from .models import Product, Video
+from .slugs import allocate_slugs
+from .storage import is_blob
+from .signals import bulk_created
+from .home_snapshot import VIDEO_CATEGORIES
+
+
+# kind -> (model, importable fields)
+IMPORTS = {
+    'product': (Product, ('Title', 'Slug', 'Description', 'Link', 'Iframe')),
+    'video': (Video, ('Title', 'Category', 'Avatar', 'Video')),
+}
+
+
+class ImportFailed(Exception):
+    """The file as a whole cannot be imported; the message is shown to the admin"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        # (sheet row number, message)
+        self.errors = []
+
+
+def import_batch_size():
+    return getattr(settings, 'IMPORT_BATCH_SIZE', 500)
+
+
+def column_map(model, fields, header):
+    """{column index: field name} for the header cells that name one of `fields`"""
+    names = {}
+    for name in fields:
+        names[name.lower()] = name
+        names[str(model._meta.get_field(name).verbose_name).lower()] = name
+    mapping = {}
+    for index, cell in enumerate(header):
+        name = names.get(str(cell).strip().lower()) if cell is not None else None
+        if name and name not in mapping.values():
+            mapping[index] = name
+    return mapping
+
+
+def cell_text(value):
+    if value is None:
+        return None
+    # Excel stores every number as a float
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() or None
+
+
+def error_message(e):
+    if hasattr(e, 'error_dict'):
+        return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in e.message_dict.items())
+    return ' '.join(e.messages)
+
+
+def stored_file_exists(name):
+    try:
+        return default_storage.exists(name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def check_video(video):
+    errors = {}
+    if video.Category and video.Category not in VIDEO_CATEGORIES:
+        errors['Category'] = f'phải là một trong {", ".join(VIDEO_CATEGORIES)}'
+    for attname in ('Avatar', 'Video'):
+        name = getattr(video, attname).name
+        if name and not stored_file_exists(name):
+            errors[attname] = f'không có file {name}'
+    if errors:
+        raise ValidationError(errors)
+    if video.Video:
+        video.Video_size = default_storage.size(video.Video.name)
+        # Only blob names carry their hash; hashing other videos here would read every file
+        if is_blob(video.Video.name):
+            video.Video_hash = os.path.splitext(os.path.basename(video.Video.name))[0]
+
+
+# Checks the field validators cannot make
+CHECKS = {
+    Video: check_video,
+}
+
+
+def build(model, mapping, row):
+    """Unsaved instance from a sheet row; ValidationError when a value is invalid"""
+    instance = model(**{name: cell_text(row[index]) if index < len(row) else None for index, name in mapping.items()})
+    instance.clean_fields()
+    if model in CHECKS:
+        CHECKS[model](instance)
+    return instance
+
+
+def assign_slugs(model, chunk, result):
+    """Reject rows whose own slug is taken, allocate the others; returns (rows left, their own slugs)"""
+    given = {instance.Slug for _, instance in chunk if instance.Slug}
+    taken = set(model.objects.filter(Slug__in=given).values_list('Slug', flat=True)) if given else set()
+    kept, used = [], set()
+    for number, instance in chunk:
+        if instance.Slug:
+            if instance.Slug in taken or instance.Slug in used:
+                result.errors.append((number, f'Slug: {instance.Slug} đã tồn tại'))
+                continue
+            used.add(instance.Slug)
+        kept.append((number, instance))
+    allocate_slugs(model, [instance for _, instance in kept], reserved=used)
+    return kept, used
+
+
+def save_chunk(model, chunk, result):
+    slugged = any(field.name == 'Slug' for field in model._meta.fields)
+    if slugged:
+        chunk, given = assign_slugs(model, chunk, result)
+    try:
+        with transaction.atomic():
+            created = model.objects.bulk_create([instance for _, instance in chunk])
+            bulk_created(model, created)
+        result.created += len(created)
+        return
+    except IntegrityError:
+        pass
+    # A slug was taken in the meantime: row by row, so only the clashing rows fail
+    for number, instance in chunk:
+        instance.pk = None
+        if slugged and instance.Slug not in given:
+            instance.Slug = None
+        try:
+            with transaction.atomic():
+                # Product.save allocates the slug again
+                instance.save()
+        except IntegrityError as e:
+            result.errors.append((number, str(e)))
+        else:
+            result.created += 1
+
+
+def import_rows(kind, rows, batch_size=None):
+    """Import `rows` (tuples, header first) as `kind`; returns an ImportResult"""
+    model, fields = IMPORTS[kind]
+    batch_size = batch_size or import_batch_size()
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFailed('File không có dữ liệu')
+    mapping = column_map(model, fields, header)
+    if not mapping:
+        raise ImportFailed(f'Dòng đầu phải có tên cột: {", ".join(fields)}')
+
+    result = ImportResult()
+    chunk = []
+    for number, row in enumerate(rows, start=2):
+        if all(cell_text(cell) is None for cell in row):
+            continue
+        try:
+            chunk.append((number, build(model, mapping, row)))
+        except ValidationError as e:
+            result.errors.append((number, error_message(e)))
+            continue
+        if len(chunk) >= batch_size:
+            save_chunk(model, chunk, result)
+            chunk = []
+    if chunk:
+        save_chunk(model, chunk, result)
+    result.errors.sort()
+    return result
+
+
+def import_xlsx(kind, file, batch_size=None):
+    """Import the first sheet of an .xlsx file (path or file object)"""
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, BadZipFile, KeyError, OSError) as e:
+        raise ImportFailed(f'Không đọc được file XLSX: {e}')
+    try:
+        return import_rows(kind, workbook.worksheets[0].iter_rows(values_only=True), batch_size)
+    finally:
+        workbook.close()
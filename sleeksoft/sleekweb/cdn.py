@@ -0,0 +1,139 @@
+"""
+CDN / reverse proxy integration for public pages.
+
+Public views send `Cache-Control: s-maxage` plus a surrogate-key header
+listing the models (and some objects, e.g. `video:123`) they show. Admin
+writes purge those keys: signals.py enqueues them after the transaction
+commits, and a background job POSTs them in batches to CDN_PURGE_URL.
+Without CDN_PURGE_URL nothing is sent.
+
+Purge request: POST CDN_PURGE_URL, JSON {"keys": [...]},
+`Authorization: Bearer CDN_PURGE_TOKEN` when a token is set.
+The proxy should key pages on the `language` cookie only (Vary: Cookie).
+"""
+
+import time
+import logging
+import threading
+import requests
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+
+from . import background
+
+
+logger = logging.getLogger(__name__)
+
+PURGE_TIMEOUT = 10
+PURGE_BATCH_SIZE = 256
+PURGE_MAX_ATTEMPTS = 5
+# Retry after 1s, 2s, 4s, ...
+PURGE_RETRY_BASE = 1
+
+
+def model_key(model):
+    return model._meta.model_name
+
+
+def object_key(model, pk):
+    return f'{model_key(model)}:{pk}'
+
+
+def instance_keys(instance, list_changed=True):
+    """
+    Keys to purge when this row changes: the row, its parent rows (a
+    Channel_Source edit purges `channel:<id>`) and, when rows were added or
+    removed, every page listing the model
+    """
+    model = type(instance)
+    keys = [object_key(model, instance.pk)]
+    for field in model._meta.concrete_fields:
+        if field.is_relation and field.many_to_one:
+            value = getattr(instance, field.attname)
+            if value is not None:
+                keys.append(object_key(field.related_model, value))
+    if list_changed:
+        keys.append(model_key(model))
+    return keys
+
+
+def cdn_headers(response, keys):
+    """Shared-cache headers for a public response (browsers still revalidate)"""
+    patch_cache_control(response, public=True, s_maxage=getattr(settings, 'CDN_CACHE_MAX_AGE', 300))
+    header = getattr(settings, 'CDN_SURROGATE_KEY_HEADER', 'Surrogate-Key')
+    existing = response.get(header, '').split()
+    response[header] = ' '.join(dict.fromkeys([*existing, *keys]))
+    return response
+
+
+class PurgeQueue:
+    """
+    Pending surrogate keys, deduplicated; one background job drains them
+    Keys added while a purge is in flight go out with the next batch
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}  # key -> attempts so far
+        self._scheduled = False
+
+    def enqueue(self, keys):
+        if not getattr(settings, 'CDN_PURGE_URL', None):
+            return
+        with self._lock:
+            for key in keys:
+                self._keys.setdefault(key, 0)
+            if self._scheduled or not self._keys:
+                return
+            self._scheduled = True
+        background.submit(self._drain, getattr(settings, 'CDN_PURGE_DELAY', 0.5))
+
+    def _drain(self, delay=0):
+        # Short delay: a burst of admin saves becomes one purge call
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            batch = dict(list(self._keys.items())[:PURGE_BATCH_SIZE])
+            for key in batch:
+                del self._keys[key]
+
+        failed = {}
+        if batch and not self._send(list(batch)):
+            failed = {key: attempts + 1 for key, attempts in batch.items() if attempts + 1 < PURGE_MAX_ATTEMPTS}
+            dropped = len(batch) - len(failed)
+            if dropped:
+                logger.error('CDN purge gave up on %s keys', dropped)
+
+        with self._lock:
+            for key, attempts in failed.items():
+                self._keys[key] = max(self._keys.get(key, 0), attempts)
+            if not self._keys:
+                self._scheduled = False
+                return
+            retry = max(self._keys.values())
+        background.submit(self._drain, PURGE_RETRY_BASE * 2 ** (retry - 1) if retry else 0)
+
+    def _send(self, keys):
+        headers = {}
+        token = getattr(settings, 'CDN_PURGE_TOKEN', None)
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            response = requests.post(settings.CDN_PURGE_URL, json={'keys': keys}, headers=headers, timeout=PURGE_TIMEOUT)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.warning('CDN purge failed: %s', e)
+            return False
+
+    def pending(self):
+        with self._lock:
+            return list(self._keys)
+
+
+purge_queue = PurgeQueue()
+
+
+def purge(keys):
+    purge_queue.enqueue(keys)
@@ -0,0 +1,325 @@
+"""
+Resumable chunked uploads for large admin videos.
+
+Protocol (views/admin/video_upload_admin.py):
+
+    POST   /admin/video/upload/                  {filename, size, title, category}
+           -> {token, part_size, part_count}
+    PUT    /admin/video/upload/<token>/part/<n>  raw bytes of part n (0-based)
+    GET    /admin/video/upload/<token>/          -> {received: [...], missing: [...], status, video}
+    POST   /admin/video/upload/<token>/complete  -> 202 {status: assembling}, 200 {video: id} once done
+    DELETE /admin/video/upload/<token>/          abort
+
+Parts may arrive in any order and in parallel. Each part is streamed from
+the request to `<FILE_UPLOAD_TEMP_DIR>/chunked/<token>/<n>` (written to a
+.partial file, renamed when complete), so a dropped connection loses at most
+the part in flight and the client only re-sends what GET lists as missing.
+Finalizing concatenates the parts into one temp file (fixed-size buffer,
+hashing on the way), which storage then moves into MEDIA_ROOT with a rename.
+That takes minutes for a multi-GB file, so it runs on the 'upload'
+background pool, outside any transaction: complete only marks the session
+'assembling' and the client polls GET until status is 'ready' (or 'failed',
+after which complete may be called again).
+Sessions untouched for UPLOAD_SESSION_TTL are removed by
+`manage.py gc_upload_sessions` (cron).
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import background
+from .models import Upload_Session, Video
+from .uploads import sniff_container, ALLOWED_VIDEO_CONTAINERS, SNIFF_BYTES
+from .storage import is_blob
+
+
+MIN_PART_SIZE = 1024 * 1024
+MAX_PART_SIZE = 64 * 1024 * 1024
+COPY_BUFFER = 1024 * 1024
+# An assembly still running after this long was lost with its worker: complete restarts it
+ASSEMBLE_RETRY_AFTER = timedelta(minutes=30)
+
+logger = logging.getLogger(__name__)
+
+
+class UploadError(Exception):
+    """Client error: the message is returned to the browser"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def part_size_setting():
+    return getattr(settings, 'UPLOAD_PART_SIZE', 8 * 1024 * 1024)
+
+
+def max_size_setting():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_BYTES', 20 * 1024 * 1024 * 1024)
+
+
+def session_ttl():
+    return timedelta(hours=getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', 24))
+
+
+def upload_root():
+    return os.path.join(getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None) or tempfile.gettempdir(), 'chunked')
+
+
+def session_dir(session):
+    return os.path.join(upload_root(), str(session.Token))
+
+
+def part_path(session, number):
+    return os.path.join(session_dir(session), f'{number:06d}')
+
+
+def part_count(session):
+    return max(1, -(-session.Size // session.Part_size))
+
+
+def expected_part_size(session, number):
+    if number == part_count(session) - 1:
+        return session.Size - number * session.Part_size
+    return session.Part_size
+
+
+def create_session(filename, size, title=None, category=None, part_size=None):
+    if not filename:
+        raise UploadError('filename is required')
+    if size is None or size <= 0:
+        raise UploadError('size must be positive')
+    if size > max_size_setting():
+        raise UploadError(f'larger than {max_size_setting()} bytes', status=413)
+    part_size = min(max(part_size or part_size_setting(), MIN_PART_SIZE), MAX_PART_SIZE)
+    session = Upload_Session.objects.create(
+        Filename=os.path.basename(filename)[:255], Size=size, Part_size=part_size,
+        Title=title, Category=category,
+    )
+    os.makedirs(session_dir(session), exist_ok=True)
+    return session
+
+
+def write_part(session, number, stream, length):
+    """Stream one part from `stream` to disk; replaces an earlier copy of the same part"""
+    if session.Link_video_id:
+        raise UploadError('upload already completed', status=409)
+    if session.Status == 'assembling':
+        raise UploadError('upload is being assembled', status=409)
+    if not 0 <= number < part_count(session):
+        raise UploadError('part out of range', status=404)
+    if length != expected_part_size(session, number):
+        raise UploadError(f'part {number} must be {expected_part_size(session, number)} bytes')
+
+    os.makedirs(session_dir(session), exist_ok=True)
+    target = part_path(session, number)
+    # Unique per request: two PUTs of the same part do not write the same .partial
+    fd, partial = tempfile.mkstemp(dir=session_dir(session), suffix='.partial')
+    received = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while received < length:
+                chunk = stream.read(min(COPY_BUFFER, length - received))
+                if not chunk:
+                    break
+                if number == 0 and received == 0:
+                    check_container(chunk[:SNIFF_BYTES])
+                out.write(chunk)
+                received += len(chunk)
+        if received != length:
+            raise UploadError(f'part {number} is incomplete ({received}/{length} bytes)')
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    # Sessions are garbage-collected by Update_time
+    Upload_Session.objects.filter(pk=session.pk).update(Update_time=timezone.now())
+
+
+def check_container(head):
+    if sniff_container(head) not in ALLOWED_VIDEO_CONTAINERS:
+        raise UploadError(f'not a supported video file ({", ".join(ALLOWED_VIDEO_CONTAINERS)})', status=415)
+
+
+def received_parts(session):
+    try:
+        names = os.listdir(session_dir(session))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+def missing_parts(session):
+    received = set(received_parts(session))
+    return [number for number in range(part_count(session)) if number not in received]
+
+
+class AssembledFile(File):
+    """A finished temp file; FileSystemStorage moves it (rename) instead of copying"""
+
+    def __init__(self, path, name, sha256):
+        super().__init__(open(path, 'rb'), name)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def assemble(session):
+    """
+    Concatenate the parts into one temp file next to MEDIA_ROOT. The parts
+    stay until the Video row is committed, so a failed finalize can be retried
+    """
+    fd, path = tempfile.mkstemp(dir=getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None), suffix='.upload')
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for number in range(part_count(session)):
+                with open(part_path(session, number), 'rb') as part:
+                    while True:
+                        chunk = part.read(COPY_BUFFER)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        out.write(chunk)
+        if os.path.getsize(path) != session.Size:
+            raise UploadError('assembled file has the wrong size', status=409)
+    except BaseException:
+        os.remove(path)
+        raise
+    return AssembledFile(path, session.Filename, digest.hexdigest())
+
+
+def complete_session(token):
+    """
+    Queue the assembly of a fully uploaded session; returns the session.
+    The copy and hash run on the 'upload' pool, GET reports Status until the
+    Video exists. Calling it again does not queue a second assembly
+    """
+    with transaction.atomic():
+        session = Upload_Session.objects.select_for_update().get(Token=token)
+        if session.Link_video_id:
+            return session
+        if session.Status == 'assembling' and session.Update_time > timezone.now() - ASSEMBLE_RETRY_AFTER:
+            return session
+        missing = missing_parts(session)
+        if missing:
+            raise UploadError(f'{len(missing)} parts missing', status=409)
+        # Also restarts an assembly lost with its worker
+        session.Status = 'assembling'
+        session.Error = None
+        session.save(update_fields=['Status', 'Error', 'Update_time'])
+        transaction.on_commit(lambda: background.submit_to('upload', finalize_in_background, session.pk))
+    return session
+
+
+def finalize_in_background(session_id):
+    try:
+        finalize(session_id)
+    finally:
+        # Pool threads keep their own DB connection otherwise
+        connections.close_all()
+
+
+def finalize(session_id):
+    """Assemble outside any transaction, then create the Video under the session's row lock"""
+    session = Upload_Session.objects.filter(pk=session_id, Status='assembling').first()
+    if session is None or session.Link_video_id:
+        return None
+    try:
+        assembled = assemble(session)
+        try:
+            with transaction.atomic():
+                session = Upload_Session.objects.select_for_update().get(pk=session_id)
+                if session.Link_video_id:
+                    # A restarted assembly finished first
+                    return session.Link_video
+                video = Video(Title=session.Title, Category=session.Category,
+                              Video_hash=assembled.sha256, Video_size=session.Size)
+                try:
+                    video.Video.save(session.Filename, assembled, save=False)
+                    video.save()
+                    session.Link_video = video
+                    session.Status = 'ready'
+                    session.save(update_fields=['Link_video', 'Status', 'Update_time'])
+                except BaseException:
+                    # Never leave a stored file without its row. A blob may be shared
+                    # with other rows and its delete() waits for a commit: gc_media removes it
+                    if video.Video.name and not is_blob(video.Video.name):
+                        video.Video.storage.delete(video.Video.name)
+                    raise
+                transaction.on_commit(lambda: discard_parts(session))
+        finally:
+            assembled.discard()
+    except Exception as e:
+        logger.exception('Assembling upload session %s failed', session_id)
+        Upload_Session.objects.filter(pk=session_id, Link_video__isnull=True).update(
+            Status='failed', Error=str(e)[-4000:], Update_time=timezone.now(),
+        )
+        return None
+    return video
+
+
+def discard_parts(session):
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+
+
+def abort_session(session):
+    discard_parts(session)
+    session.delete()
+
+
+def collect_stale(now=None):
+    """
+    Remove unfinished sessions idle for longer than UPLOAD_SESSION_TTL, part
+    directories no open session owns, and assembled / uploaded temp files
+    left behind by a crashed worker. Returns (sessions, paths) removed
+    """
+    cutoff = (now or timezone.now()) - session_ttl()
+    removed_sessions = 0
+    for session in Upload_Session.objects.filter(Link_video__isnull=True, Update_time__lt=cutoff):
+        abort_session(session)
+        removed_sessions += 1
+
+    open_tokens = {
+        str(token) for token in Upload_Session.objects.filter(Link_video__isnull=True).values_list('Token', flat=True)
+    }
+    stale_paths = []
+    for root, keep in ((upload_root(), open_tokens), (getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None), None)):
+        if not root or not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if keep is not None:
+                candidate = name not in keep
+            else:
+                # Django and assemble() both name their temp files *.upload
+                candidate = name.endswith('.upload') and os.path.isfile(path)
+            if candidate and os.path.getmtime(path) < cutoff.timestamp():
+                stale_paths.append(path)
+
+    for path in stale_paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+    return removed_sessions, len(stale_paths)
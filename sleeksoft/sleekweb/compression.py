@@ -0,0 +1,136 @@
+"""
+Response compression (brotli / gzip) for HTML and JSON.
+
+Page-cache entries carry their compressed variants (see page_cache.py), so a
+cached page is compressed once per render instead of once per request;
+everything else is compressed on the fly by CompressionMiddleware.
+Brotli is optional: without the `brotli` package only gzip is offered.
+
+Responses carrying a secret are never compressed (BREACH): pages that
+rendered a CSRF token ({% csrf_token %} in the admin forms) and responses
+setting a cookie. Their size would otherwise leak the secret byte by byte
+to an attacker who can inject text into the same page.
+"""
+
+import re
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ('text/html', 'application/json')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Preferred order when the client accepts several encodings equally
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+accept_encoding_re = re.compile(r'^\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def min_bytes():
+    return getattr(settings, 'COMPRESS_MIN_BYTES', 1024)
+
+
+def is_compressible(content_type, size):
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    return media_type in COMPRESSIBLE_TYPES and size >= min_bytes()
+
+
+def carries_secret(response):
+    """
+    The response sets a cookie (CsrfViewMiddleware sets csrftoken again
+    whenever a page renders a token) or has a {% csrf_token %} form
+    """
+    return bool(response.cookies) or b'csrfmiddlewaretoken' in response.content
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0: the same body always gives the same bytes
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_variants(body, content_type):
+    """{encoding: compressed body} for every supported encoding that is smaller"""
+    if not is_compressible(content_type, len(body)):
+        return {}
+    variants = {}
+    for encoding in ENCODINGS:
+        compressed = compress(body, encoding)
+        if len(compressed) < len(body):
+            variants[encoding] = compressed
+    return variants
+
+
+def accepted_encoding(request, available=ENCODINGS):
+    """Best encoding in `available` allowed by Accept-Encoding, None for identity"""
+    header = request.headers.get('Accept-Encoding', '')
+    weights = {}
+    for part in header.split(','):
+        match = accept_encoding_re.match(part)
+        if not match:
+            continue
+        coding = match.group(1).lower()
+        try:
+            weights[coding] = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+    best, best_weight = None, 0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get('*', 0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Like django.middleware.gzip.GZipMiddleware, plus brotli and reuse of
+    variants already attached to the response (response.precompressed,
+    valid for a body of response.precompressed_size bytes)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not is_compressible(response.get('Content-Type'), len(response.content)):
+            return response
+        if carries_secret(response):
+            return response
+
+        # Eligible: the body depends on Accept-Encoding whether or not this client gets it compressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        variants = getattr(response, 'precompressed', None)
+        if getattr(response, 'precompressed_size', None) != len(response.content):
+            # Body changed after the cache (e.g. browser_reload script): variants are stale
+            variants = None
+        if variants is None:
+            encoding = accepted_encoding(request)
+            compressed = compress(response.content, encoding) if encoding else None
+            if compressed is not None and len(compressed) >= len(response.content):
+                return response
+        else:
+            encoding = accepted_encoding(request, [name for name in ENCODINGS if name in variants])
+            compressed = variants.get(encoding)
+        if not compressed:
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # Same rule as GZipMiddleware: the compressed body is not byte-identical
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,169 @@
+"""
+Content versions for conditional GET on client pages.
+
+Each model's version is the time of its last committed write (max
+Update_time on a cold cache), kept in the cache and moved forward by
+signals.py after every save/delete commits, so a request only needs one
+cache read to build its ETag / Last-Modified. A page's version is the newest
+of its models and of its template file (template edits ship with deploys).
+"""
+
+import os
+import time
+import hashlib
+from functools import wraps
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import CharField, Max, Value
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .cdn import cdn_headers, model_key
+from .models import Ads, Channel, Channel_Source, Odds, Odds_Image, Video, Animation_Image, Product
+
+
+MODEL_VERSION_KEY = 'content_version:{}'
+# Values of the language cookie; anything else is the first one
+LANGUAGES = ('VI', 'EN')
+# Workers moving one version take turns (cache.add lock), so a slower one cannot set an older time
+TOUCH_LOCK_TIMEOUT = 5
+TOUCH_WAIT_STEP = 0.01
+
+# Page name -> (template or None, models whose rows the page shows)
+PAGES = {
+    'home': ('sleekweb/client/home.html', (Ads, Odds, Odds_Image, Video, Animation_Image)),
+    'channel_manifest': (None, (Channel, Channel_Source)),
+    'video_feed': (None, (Video,)),
+    'phom': ('sleekweb/client/phom.html', ()),
+    'about': ('sleekweb/client/about.html', ()),
+    'booking': ('sleekweb/client/booking.html', ()),
+    'contact': ('sleekweb/client/contact.html', ()),
+    'menu': ('sleekweb/client/menu.html', (Product,)),
+    'service': ('sleekweb/client/service.html', ()),
+    'team': ('sleekweb/client/team.html', ()),
+    'testimonial': ('sleekweb/client/testimonial.html', ()),
+}
+
+_template_times = {}
+
+
+def page_language(request):
+    """
+    The page language from the language cookie. Pages are cached and tagged
+    per language, so a made-up cookie value must not add a cache entry
+    """
+    lang = (request.COOKIES.get('language') or '').upper()
+    return lang if lang in LANGUAGES else LANGUAGES[0]
+
+
+def version_key(model):
+    return MODEL_VERSION_KEY.format(model._meta.label_lower)
+
+
+def touch(model, moment=None):
+    """Move the model's version forward (never back, whichever worker writes last)"""
+    moment = moment or timezone.now()
+    key = version_key(model)
+    lock_key = f'{key}:lock'
+    # A crashed holder's lock expires: then write without it
+    deadline = time.monotonic() + TOUCH_LOCK_TIMEOUT
+    locked = cache.add(lock_key, 1, TOUCH_LOCK_TIMEOUT)
+    while not locked and time.monotonic() < deadline:
+        time.sleep(TOUCH_WAIT_STEP)
+        locked = cache.add(lock_key, 1, TOUCH_LOCK_TIMEOUT)
+    try:
+        current = cache.get(key)
+        if current is None or moment > current:
+            cache.set(key, moment, None)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def model_versions(models):
+    """
+    {model: version} in one cache round-trip
+    Only a cold cache falls back to the database: one UNION of Max(Update_time)
+    """
+    keys = {version_key(model): model for model in models}
+    cached = cache.get_many(list(keys))
+    versions = {keys[key]: version for key, version in cached.items()}
+    missing = [model for model in models if model not in versions]
+    if missing:
+        queries = [
+            model.objects.order_by()
+            .annotate(label=Value(model._meta.label_lower, output_field=CharField()))
+            .values('label').annotate(version=Max('Update_time')).values_list('label', 'version')
+            for model in missing
+        ]
+        latest = dict(queries[0].union(*queries[1:], all=True))
+        for model in missing:
+            # Empty table: any later write is newer than the epoch
+            version = latest.get(model._meta.label_lower) or datetime.fromtimestamp(0, tz=dt_timezone.utc)
+            cache.add(version_key(model), version, None)
+            versions[model] = cache.get(version_key(model), version)
+    return versions
+
+
+def template_time(template_name):
+    """mtime of a page template, read once per process"""
+    if template_name not in _template_times:
+        origin = get_template(template_name).origin.name
+        _template_times[template_name] = datetime.fromtimestamp(int(os.path.getmtime(origin)), tz=dt_timezone.utc)
+    return _template_times[template_name]
+
+
+def page_last_modified(name):
+    template_name, models = PAGES[name]
+    versions = list(model_versions(models).values())
+    if template_name:
+        versions.append(template_time(template_name))
+    return max(versions)
+
+
+def page_etag(name, lang, last_modified=None):
+    last_modified = last_modified or page_last_modified(name)
+    raw = f'{name}:{lang}:{last_modified.timestamp()}'
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def page_keys(name):
+    """Surrogate keys of a page: the page itself and every model it shows"""
+    return [f'page-{name}', *(model_key(model) for model in PAGES[name][1])]
+
+
+def conditional_page(name, per_language=True):
+    """
+    View decorator: ETag / Last-Modified from the page's content version,
+    304 without calling the view when the client's copy is still current,
+    CDN cache headers + surrogate keys (response.surrogate_keys adds object keys)
+    per_language=False for responses that ignore the language cookie
+    """
+    def decorator(view):
+        def last_modified_func(request, *args, **kwargs):
+            # Both validators come from one cache read per request
+            if not hasattr(request, 'page_last_modified'):
+                request.page_last_modified = page_last_modified(name)
+            return request.page_last_modified
+
+        def etag_func(request, *args, **kwargs):
+            lang = page_language(request) if per_language else ''
+            return page_etag(name, lang, last_modified_func(request))
+
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Browsers always revalidate (pages change during matches);
+            # the CDN keeps its copy until a purge or s-maxage
+            patch_cache_control(response, max_age=0, must_revalidate=True)
+            cdn_headers(response, page_keys(name) + getattr(response, 'surrogate_keys', []))
+            if per_language:
+                patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
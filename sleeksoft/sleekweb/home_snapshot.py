@@ -0,0 +1,179 @@
+"""
+Home snapshot - one Home_Snapshot row holding every list home.html needs,
+pre-serialized. Each section is rebuilt on its own when one of its models
+changes, so a cold home render is a single read.
+
+Model changes rebuild their section after the transaction commits, once per
+section however many rows the transaction wrote (rebuild_for_model).
+"""
+
+import threading
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Ads, Channel, Channel_Source, Odds, Odds_Image, Video, Animation_Image, Home_Snapshot
+from .stream_ranking import channel_candidates
+from .image_variants import image_info
+
+
+SNAPSHOT_PK = 1
+# Bump when the shape of a section changes: old rows are rebuilt on load
+SNAPSHOT_FORMAT = 4
+VIDEO_CATEGORIES = ('GaThuong', 'GaDao')
+VIDEO_PAGE_SIZE = 12
+
+# Sections made stale by the open transaction of this thread
+_pending = threading.local()
+
+
+def file_info(field):
+    """FieldFile -> {'url': ...} so templates keep using `x.Avatar.url`"""
+    return {'url': field.url} if field else None
+
+
+def image_file_info(field):
+    """Like file_info, plus `srcset` / `webp_srcset` / `thumb` / `poster` of the resized variants"""
+    return image_info(field) if field else None
+
+
+def build_channels():
+    channels = []
+    for channel in Channel.objects.all().order_by('Count').prefetch_related('sources'):
+        channels.append({
+            'id': channel.id,
+            'Name': channel.Name,
+            'Key': channel.Key,
+            # Key + nguồn dự phòng theo thứ tự admin, dùng khi chưa có bảng xếp hạng
+            'Candidates': channel_candidates(channel),
+            'Iframe': channel.Iframe,
+            'StreamType': channel.StreamType,
+            'Count': channel.Count,
+            'Avatar': image_file_info(channel.Avatar),
+            # Chỉ cần biết kênh có mật khẩu, mật khẩu được kiểm tra qua API
+            'Password': bool(channel.Password),
+            'Time': channel.Time,
+        })
+    return channels
+
+
+def build_ads():
+    return [
+        {'id': ads.id, 'Script': ads.Script, 'Link': ads.Link, 'Banner': image_file_info(ads.Banner)}
+        for ads in Ads.objects.all().order_by('Count')
+    ]
+
+
+def build_odds():
+    return [
+        {
+            'id': odds.id,
+            'Category': odds.Category,
+            'Describe': odds.Describe,
+            'images': [{'Image': image_file_info(image.Image)} for image in odds.images.all()],
+        }
+        for odds in Odds.objects.all().order_by('Count').prefetch_related('images')
+    ]
+
+
+def build_animations():
+    return [
+        {'id': image.id, 'Image': image_file_info(image.Image)}
+        for image in Animation_Image.objects.all()
+    ]
+
+
+def serialize_video(video):
+    return {
+        'id': video.id,
+        'Title': video.Title,
+        'Avatar': image_file_info(video.Avatar),
+        'Video': file_info(video.Video),
+        'Hls': {'url': default_storage.url(video.Hls)} if video.Hls else None,
+    }
+
+
+def video_page(category, before=None, limit=VIDEO_PAGE_SIZE):
+    """
+    One page of a video feed, newest first, keyset-paginated on id
+    Returns (videos, next cursor or None); uses the (Category, id) index
+    """
+    videos = Video.objects.filter(Category=category).order_by('-id')
+    if before is not None:
+        videos = videos.filter(id__lt=before)
+    videos = list(videos[:limit + 1])
+    next_cursor = videos[limit - 1].id if len(videos) > limit else None
+    return [serialize_video(video) for video in videos[:limit]], next_cursor
+
+
+def build_videos():
+    # Chỉ trang đầu được nhúng vào home, phần còn lại tải qua video_feed
+    videos = {}
+    for category in VIDEO_CATEGORIES:
+        items, next_cursor = video_page(category)
+        videos[category] = {'items': items, 'next': next_cursor}
+    return videos
+
+
+SECTION_BUILDERS = {
+    'channels': build_channels,
+    'ads': build_ads,
+    'odds': build_odds,
+    'animations': build_animations,
+    'videos': build_videos,
+}
+
+# Which sections a model change makes stale
+MODEL_SECTIONS = {
+    Channel: 'channels',
+    Channel_Source: 'channels',
+    Ads: 'ads',
+    Odds: 'odds',
+    Odds_Image: 'odds',
+    Animation_Image: 'animations',
+    Video: 'videos',
+}
+
+
+def rebuild_snapshot(sections=None):
+    """Rebuild the given sections (all when None) and bump the version"""
+    with transaction.atomic():
+        snapshot, _ = Home_Snapshot.objects.select_for_update().get_or_create(pk=SNAPSHOT_PK)
+        if snapshot.Data.get('format') != SNAPSHOT_FORMAT:
+            snapshot.Data = {'format': SNAPSHOT_FORMAT}
+        missing = [name for name in SECTION_BUILDERS if name not in snapshot.Data]
+        names = set(sections or SECTION_BUILDERS) | set(missing)
+        for name in names:
+            snapshot.Data[name] = SECTION_BUILDERS[name]()
+        snapshot.Version += 1
+        snapshot.Built_time = timezone.now()
+        snapshot.save()
+    return snapshot
+
+
+def rebuild_for_model(model):
+    """
+    Rebuild the model's section once the transaction commits (now in autocommit).
+    The first commit callback rebuilds every section the transaction made
+    stale, the next ones find nothing left. Sections left by a rolled back
+    transaction are rebuilt with the next commit: extra work, never stale data
+    """
+    section = MODEL_SECTIONS.get(model)
+    if section:
+        _pending.__dict__.setdefault('sections', set()).add(section)
+        transaction.on_commit(rebuild_pending)
+
+
+def rebuild_pending():
+    sections = _pending.__dict__.pop('sections', None)
+    if sections:
+        rebuild_snapshot(sorted(sections))
+
+
+def load_snapshot():
+    """Single read; builds the snapshot the first time"""
+    snapshot = Home_Snapshot.objects.filter(pk=SNAPSHOT_PK).first()
+    if snapshot is None or snapshot.Data.get('format') != SNAPSHOT_FORMAT:
+        snapshot = rebuild_snapshot()
+    return snapshot
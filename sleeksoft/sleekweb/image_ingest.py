@@ -0,0 +1,146 @@
+"""
+Batch ingestion of odds images (odds_add_admin / odds_edit_admin).
+
+Uploads are decoded, validated and, when wider than IMAGE_INGEST_MAX_WIDTH,
+resized on a thread pool (Pillow releases the GIL while decoding and
+resampling). The rows are then written in one transaction: one bulk_create
+for the new images, one delete for the removed ones.
+
+On edit the submitted images are matched to the existing rows by content
+hash: an image uploaded again unchanged keeps its row and its file, so only
+the difference is written or deleted. Images are shown in id order, so kept
+images stay ahead of new ones.
+"""
+
+import io
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import Odds_Image
+from .storage import is_blob, content_hash
+from .signals import bulk_created
+
+
+# Pillow format -> save options when a resized image is re-encoded
+SAVE_OPTIONS = {
+    'WEBP': {'quality': 85, 'method': 4},
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+}
+
+
+class ImageRejected(Exception):
+    """An upload that is not a readable image; the message is shown to the admin"""
+
+
+class PreparedImage:
+    def __init__(self, name, content, sha256):
+        self.name = name
+        self.content = content
+        self.sha256 = sha256
+
+
+def ingest_workers():
+    return getattr(settings, 'IMAGE_INGEST_WORKERS', 4)
+
+
+def ingest_max_width():
+    return getattr(settings, 'IMAGE_INGEST_MAX_WIDTH', 1920)
+
+
+def prepare(upload):
+    """Validate one upload and shrink it to IMAGE_INGEST_MAX_WIDTH; runs on the pool"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(upload) as image:
+            image.verify()
+        upload.seek(0)
+        with Image.open(upload) as image:
+            if image.width > ingest_max_width() and not getattr(image, 'is_animated', False):
+                image_format = image.format
+                image = ImageOps.exif_transpose(image)
+                height = max(1, round(image.height * ingest_max_width() / image.width))
+                image = image.resize((ingest_max_width(), height), Image.LANCZOS)
+                if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+                buffer = io.BytesIO()
+                image.save(buffer, image_format, **SAVE_OPTIONS.get(image_format, {}))
+                data = buffer.getvalue()
+                content = ContentFile(data, name=upload.name)
+                # ContentAddressedStorage reuses it instead of hashing again
+                content.sha256 = hashlib.sha256(data).hexdigest()
+                return PreparedImage(upload.name, content, content.sha256)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise ImageRejected(f'{upload.name}: không phải file ảnh hợp lệ')
+    upload.seek(0)
+    # StreamingUploadHandler hashed it while it was written to disk
+    digest = getattr(upload, 'sha256', None) or content_hash(upload)
+    upload.sha256 = digest
+    return PreparedImage(upload.name, upload, digest)
+
+
+def prepare_images(uploads):
+    """PreparedImage per upload, in order; ImageRejected if any is not an image"""
+    if not uploads:
+        return []
+    with ThreadPoolExecutor(max_workers=min(ingest_workers(), len(uploads))) as pool:
+        return list(pool.map(prepare, uploads))
+
+
+def stored_hash(name):
+    """sha256 of a stored image: part of the name for blobs, read from disk otherwise"""
+    if is_blob(name):
+        return os.path.splitext(os.path.basename(name))[0]
+    try:
+        with default_storage.open(name) as f:
+            return content_hash(f)
+    except OSError:
+        return None
+
+
+def save_odds_images(odds, prepared, replace=False):
+    """
+    Store `prepared` as the images of `odds`. With replace, images not among
+    them are removed and unchanged ones kept. Returns (created, kept, removed)
+    """
+    existing = list(odds.images.all()) if replace else []
+    unmatched = {}
+    if existing:
+        with ThreadPoolExecutor(max_workers=min(ingest_workers(), len(existing))) as pool:
+            hashes = pool.map(stored_hash, [row.Image.name if row.Image else '' for row in existing])
+            for row, digest in zip(existing, hashes):
+                unmatched.setdefault(digest, []).append(row)
+
+    new = []
+    kept = 0
+    for image in prepared:
+        rows = unmatched.get(image.sha256)
+        if rows:
+            rows.pop(0)
+            kept += 1
+        else:
+            new.append(image)
+    removed = [row for rows in unmatched.values() for row in rows]
+
+    field = Odds_Image._meta.get_field('Image')
+    with transaction.atomic():
+        rows = [
+            Odds_Image(Link_image=odds, Image=default_storage.save(field.generate_filename(None, image.name), image.content))
+            for image in new
+        ]
+        created = Odds_Image.objects.bulk_create(rows)
+        bulk_created(Odds_Image, created)
+        for row in removed:
+            if row.Image and not is_blob(row.Image.name):
+                # Blobs go when their last reference does (post_delete)
+                default_storage.delete(row.Image.name)
+        if removed:
+            Odds_Image.objects.filter(pk__in=[row.pk for row in removed]).delete()
+    return len(created), kept, len(removed)
@@ -0,0 +1,291 @@
+"""
+Resized WebP / JPEG variants of uploaded images, for `srcset`.
+
+For an original `Channel_Daga/logo.png` the variants live next to it:
+
+    Channel_Daga/_variants/logo.<hash>.320.webp
+    Channel_Daga/_variants/logo.<hash>.320.jpg
+    Channel_Daga/_variants/logo.json            (manifest)
+
+<hash> is the start of the sha256 of the original, so a variant URL never
+changes content and can be cached forever. One variant is made per
+IMAGE_VARIANT_WIDTHS entry narrower than the original, plus one at the
+original width (capped at IMAGE_VARIANT_MAX_WIDTH). Images with
+transparency get no JPEG; animated images get an animated WebP (and an MP4)
+at one width instead, see animated_images.py.
+
+Variants are made eagerly after an upload commits (signals.py, background
+pool; animated images move on to the 'animation' pool) and lazily by
+`image_variant` (/img/<width>/<format>/<name>) when a page asks for one that
+does not exist yet, except for animated images. `manage.py build_image_variants`
+fills in images uploaded before this existed.
+
+home_snapshot.file_info uses `image_info`: besides `url` templates get
+`srcset` (JPEG), `webp_srcset`, `poster` / `thumb` URLs of one size and
+`mp4` for animated images.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+
+from . import background
+from .models import Channel, Ads, Odds_Image, Animation_Image, Video
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = '_variants'
+# format -> (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+HASH_LENGTH = 12
+# Bump when variants should be regenerated (new widths, quality)
+MANIFEST_VERSION = 2
+
+# Image fields that get variants
+IMAGE_FIELDS = {
+    Channel: 'Avatar',
+    Ads: 'Banner',
+    Odds_Image: 'Image',
+    Animation_Image: 'Image',
+    Video: 'Avatar',
+}
+
+
+def variant_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (160, 320, 640, 1280))))
+
+
+def max_width():
+    return getattr(settings, 'IMAGE_VARIANT_MAX_WIDTH', 1920)
+
+
+def image_dirs():
+    """upload_to of every IMAGE_FIELDS field: the only places /img/ serves from"""
+    return {model._meta.get_field(name).upload_to for model, name in IMAGE_FIELDS.items()}
+
+
+def variant_dir(name):
+    return f'{os.path.dirname(name)}/{VARIANT_DIR}'
+
+
+def manifest_name(name):
+    return f'{variant_dir(name)}/{os.path.splitext(os.path.basename(name))[0]}.json'
+
+
+def lazy_url(name, width, fmt):
+    return f'/img/{width}/{fmt}/{name}'
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def planned_widths(width):
+    """Variant widths for an original `width` px wide"""
+    full = min(width, max_width())
+    return [w for w in variant_widths() if w < full] + [full]
+
+
+def write_atomic(path, write):
+    """Write through a temp file in the same directory, then rename over `path`"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.partial')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            write(out)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def load_manifest(name):
+    """The manifest of `name` if it was made for the current file, else None"""
+    try:
+        with open(default_storage.path(manifest_name(name))) as f:
+            manifest = json.load(f)
+        size = os.path.getsize(default_storage.path(name))
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('source') != name or manifest.get('size') != size:
+        return None
+    return manifest
+
+
+def source_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def generate(name):
+    """Make every variant of `name` and its manifest; returns the manifest"""
+    from PIL import Image, ImageOps
+    from .animated_images import encode
+
+    path = default_storage.path(name)
+    digest = source_hash(path)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    manifest = {
+        'version': MANIFEST_VERSION, 'source': name, 'size': os.path.getsize(path), 'hash': digest,
+        'width': None, 'height': None, 'variants': {fmt: [] for fmt in FORMATS},
+    }
+    with Image.open(path) as image:
+        manifest['width'], manifest['height'] = image.size
+        if getattr(image, 'is_animated', False):
+            # The resizes below would keep only the first frame
+            write_manifest(name, encode(name, image, manifest))
+            return manifest
+        image = ImageOps.exif_transpose(image)
+        alpha = has_alpha(image)
+        image = image.convert('RGBA' if alpha else 'RGB')
+        for width in planned_widths(image.width):
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt, (pil_format, options) in FORMATS.items():
+                if fmt == 'jpg' and alpha:
+                    continue
+                variant = f'{variant_dir(name)}/{stem}.{digest}.{width}.{fmt}'
+                write_atomic(default_storage.path(variant), lambda out: resized.save(out, pil_format, **options))
+                manifest['variants'][fmt].append([width, variant])
+    write_manifest(name, manifest)
+    return manifest
+
+
+def write_manifest(name, manifest):
+    write_atomic(default_storage.path(manifest_name(name)), lambda out: out.write(json.dumps(manifest).encode()))
+
+
+def discard_variants(name, remove):
+    """Remove the variants and manifest of `name` with remove(name) (the original is being deleted)"""
+    try:
+        with open(default_storage.path(manifest_name(name))) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return
+    for entries in manifest.get('variants', {}).values():
+        for _, variant in entries:
+            remove(variant)
+    if manifest.get('video'):
+        remove(manifest['video'][1])
+    remove(manifest_name(name))
+
+
+def is_animated(name):
+    """From the header; False when the file cannot be read as an image"""
+    from PIL import Image
+
+    try:
+        with Image.open(default_storage.path(name)) as image:
+            return getattr(image, 'is_animated', False)
+    except OSError:
+        return False
+
+
+def ensure(name):
+    """Manifest of `name`, generating the variants first when missing or stale"""
+    return load_manifest(name) or generate(name)
+
+
+def lazy_variants(name):
+    """Variant list for an image not processed yet: /img/ URLs, from the header only"""
+    from PIL import Image
+
+    with Image.open(default_storage.path(name)) as image:
+        if getattr(image, 'is_animated', False):
+            return None
+        width, height = image.size
+        # exif_transpose may swap the sides; close enough for srcset descriptors
+        formats = ['webp'] if has_alpha(image) else list(FORMATS)
+    variants = {fmt: [] for fmt in FORMATS}
+    for fmt in formats:
+        variants[fmt] = [[w, None] for w in planned_widths(width)]
+    return width, height, variants
+
+
+def image_info(field):
+    """
+    FieldFile -> {'url', 'srcset', 'webp_srcset', 'thumb', 'poster', 'mp4', 'width', 'height'}
+    for templates and JSON. Only `url` when the file cannot be read as an image
+    """
+    info = {'url': field.url}
+    name = field.name
+    manifest = load_manifest(name)
+    try:
+        if manifest:
+            width, height = manifest['width'], manifest['height']
+            variants = {
+                fmt: [(w, default_storage.url(variant)) for w, variant in entries]
+                for fmt, entries in manifest['variants'].items()
+            }
+        else:
+            lazy = lazy_variants(name)
+            if lazy is None:
+                return info
+            width, height, planned = lazy
+            variants = {fmt: [(w, lazy_url(name, w, fmt)) for w, _ in entries] for fmt, entries in planned.items()}
+    except Exception:
+        # Missing or unreadable file: the original URL is all there is
+        return info
+
+    info.update(width=width, height=height)
+    if variants['jpg']:
+        info['srcset'] = ', '.join(f'{url} {w}w' for w, url in variants['jpg'])
+    if variants['webp']:
+        info['webp_srcset'] = ', '.join(f'{url} {w}w' for w, url in variants['webp'])
+        info['thumb'] = pick(variants['webp'], 160)
+        info['poster'] = pick(variants['webp'], 640)
+    if manifest and manifest.get('video'):
+        info['mp4'] = default_storage.url(manifest['video'][1])
+    return info
+
+
+def pick(entries, width):
+    """URL of the narrowest variant at least `width` wide (else the widest)"""
+    for w, url in entries:
+        if w >= width:
+            return url
+    return entries[-1][1]
+
+
+def variant_for(name, width, fmt):
+    """Storage name of the variant to serve for /img/<width>/<fmt>/<name>, None for the original"""
+    entries = ensure(name)['variants'].get(fmt) or []
+    for w, variant in entries:
+        if w >= width:
+            return variant
+    return entries[-1][1] if entries else None
+
+
+def generate_for_instance(model, pk, pool='default'):
+    """Background job after an upload: make the variants, then refresh pages showing the row"""
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        field = getattr(instance, IMAGE_FIELDS[model], None) if instance else None
+        if not field or load_manifest(field.name):
+            return
+        if pool != 'animation' and is_animated(field.name):
+            # Minutes of CPU and a lot of memory: one at a time, without holding up the short jobs
+            background.submit_to('animation', generate_for_instance, model, pk, 'animation')
+            return
+        try:
+            generate(field.name)
+        except Exception:
+            logger.exception('Image variants for %s %s failed', model._meta.model_name, pk)
+            return
+        # Snapshot, page cache, ETag and CDN pick up the direct variant URLs via post_save
+        instance.save(update_fields=['Update_time'])
+    finally:
+        connections.close_all()
@@ -0,0 +1,180 @@
+"""
+Channel key refresh - re-extracts signed m3u8 URLs from a channel's source page
+before their token expires and swaps Channel.Key atomically.
+"""
+
+import re
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import urlparse, parse_qsl
+
+from django.utils import timezone
+
+from .models import Channel
+from .stream_ranking import invalidate_ranking
+from .page_cache import invalidate_page
+from .home_snapshot import rebuild_snapshot
+from .content_version import touch
+from .cdn import object_key, purge
+from .views.client import stream_finder
+
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that carry the token expiry on common CDNs
+EXPIRY_PARAMS = ['expires', 'expire', 'expiry', 'exp', 'e', 'validto', 'valid_to', 'deadline', 'ttl_until']
+# Tencent / Aliyun style: expiry as hex epoch seconds
+HEX_EXPIRY_PARAMS = ['wstime', 'txtime']
+# Rescan this long before the token expires
+REFRESH_MARGIN = timedelta(minutes=10)
+# Used when neither an expiry nor Refresh_interval is known
+DEFAULT_REFRESH_INTERVAL = timedelta(minutes=60)
+# Epoch values outside this window are not expiry timestamps
+MAX_EXPIRY_AHEAD = timedelta(days=30)
+
+
+def parse_epoch(value, now):
+    """Epoch seconds / milliseconds -> aware datetime, None if implausible"""
+    if not value.isdigit():
+        return None
+    number = int(value)
+    if len(value) == 13:
+        number //= 1000
+    elif len(value) != 10:
+        return None
+    moment = datetime.fromtimestamp(number, tz=dt_timezone.utc)
+    if now - timedelta(days=1) <= moment <= now + MAX_EXPIRY_AHEAD:
+        return moment
+    return None
+
+
+def detect_key_expiry(url, now=None):
+    """
+    Find the token expiry in a signed stream URL
+    Returns an aware datetime, or None when the URL carries no expiry
+    """
+    if not url:
+        return None
+    now = now or timezone.now()
+    params = {key.lower(): value for key, value in parse_qsl(urlparse(url).query)}
+
+    for name in EXPIRY_PARAMS:
+        if name in params:
+            moment = parse_epoch(params[name], now)
+            if moment:
+                return moment
+
+    for name in HEX_EXPIRY_PARAMS:
+        if name in params:
+            try:
+                moment = parse_epoch(str(int(params[name], 16)), now)
+            except ValueError:
+                moment = None
+            if moment:
+                return moment
+
+    # Tokens like "md5hash-1700000000" or "1700000000-md5hash"
+    for value in params.values():
+        for candidate in re.findall(r'(?<!\d)(\d{10})(?!\d)', value):
+            moment = parse_epoch(candidate, now)
+            if moment and moment > now:
+                return moment
+    return None
+
+
+def refresh_due(channel, now=None):
+    """True when the channel's Key should be re-extracted now"""
+    if not channel.Source_page:
+        return False
+    now = now or timezone.now()
+    if channel.Key_expires:
+        return now >= channel.Key_expires - REFRESH_MARGIN
+    if channel.Key_refreshed is None:
+        return True
+    interval = timedelta(minutes=channel.Refresh_interval) if channel.Refresh_interval else DEFAULT_REFRESH_INTERVAL
+    return now >= channel.Key_refreshed + interval
+
+
+def extract_candidates(channel):
+    """Scan the source page and return HLS URLs matching the channel's rule"""
+    page_url = channel.Source_page
+    parsed = urlparse(page_url)
+    base_url = f"{parsed.scheme}://{parsed.netloc}"
+
+    html_content = stream_finder.fetch_with_requests(page_url)
+    streams = stream_finder.extract_hls_streams(html_content, base_url, page_url)
+    if not streams and stream_finder.SELENIUM_AVAILABLE and stream_finder.looks_like_player(html_content):
+        rendered, network_urls, js_sources = stream_finder.fetch_with_selenium(page_url)
+        if rendered is not None:
+            streams = stream_finder.extract_hls_streams(rendered, base_url, page_url, network_urls, js_sources)
+
+    urls = [stream['url'] for stream in streams]
+    if channel.Extract_rule:
+        rule = re.compile(channel.Extract_rule, re.IGNORECASE)
+        urls = [url for url in urls if rule.search(url)]
+    return urls
+
+
+def refresh_channel_key(channel, now=None):
+    """
+    Rescan one channel and swap in a new, validated Key
+    Returns the new Key, or None when nothing changed
+    """
+    now = now or timezone.now()
+    old_key = channel.Key
+    try:
+        candidates = extract_candidates(channel)
+    except Exception as e:
+        Channel.objects.filter(pk=channel.pk).update(Key_refreshed=now, Refresh_error=str(e)[:1000])
+        return None
+
+    # Only a playlist that actually lists segments and fits in Channel.Key is accepted
+    max_length = Channel._meta.get_field('Key').max_length
+    new_key = next((url for url in candidates if len(url) <= max_length and stream_finder.fingerprint_hls(url)), None)
+    if new_key is None:
+        Channel.objects.filter(pk=channel.pk).update(
+            Key_refreshed=now,
+            Refresh_error='Không tìm thấy link hợp lệ' if candidates else 'Không tìm thấy link m3u8',
+        )
+        return None
+
+    # Compare-and-swap: an admin edit made during the scan wins
+    updated = Channel.objects.filter(pk=channel.pk, Key=old_key).update(
+        Key=new_key,
+        Key_expires=detect_key_expiry(new_key, now),
+        Key_refreshed=now,
+        Refresh_error=None,
+        Update_time=now,
+    )
+    if not updated:
+        return None
+
+    invalidate_channel_key(channel.pk)
+    return new_key
+
+
+def invalidate_channel_key(channel_pk):
+    """Drop every cache that still holds the channel's old Key"""
+    invalidate_ranking(channel_pk)
+    # .update() bypasses the post_save signal
+    rebuild_snapshot(['channels'])
+    invalidate_page('channel_manifest')
+    touch(Channel)
+    purge([object_key(Channel, channel_pk)])
+
+
+def refresh_due_channels(force=False):
+    """Scheduler entry point: returns [(channel, new_key or None)]"""
+    now = timezone.now()
+    results = []
+    for channel in Channel.objects.exclude(Source_page__isnull=True).exclude(Source_page=''):
+        if force or refresh_due(channel, now):
+            try:
+                new_key = refresh_channel_key(channel, now)
+            except Exception as e:
+                # One broken channel must not stop the others
+                logger.exception('Key refresh of channel %s failed', channel.pk)
+                Channel.objects.filter(pk=channel.pk).update(Key_refreshed=now, Refresh_error=str(e)[:1000])
+                new_key = None
+            results.append((channel, new_key))
+    return results
@@ -0,0 +1,72 @@
+"""
+Lazy view references for urls.py.
+
+urls.py used to star-import every view module, so each worker paid for all of
+them (and their imports) at startup even if it only ever served the home
+page. Routes now point at LazyView objects: building the resolver and
+reverse() only need the dotted path, and the module is imported the first
+time a request is routed to one of its views (the CSRF middleware reads
+`csrf_exempt` from the callback, which is when the import happens).
+
+    client = LazyModule('sleekweb.views.client.home_client')
+    path('', client.home, name='home')
+
+Only for function views; class-based views keep using as_view().
+"""
+
+import threading
+from importlib import import_module
+
+
+# Attributes Django probes on URL callbacks that a function view never has;
+# answering them must not import the module
+ABSENT_ATTRIBUTES = frozenset(('view_class', 'view_initkwargs', 'as_view'))
+
+_import_lock = threading.Lock()
+
+
+class LazyView:
+    def __init__(self, module_path, name):
+        self.__module__ = module_path
+        self.__name__ = self.__qualname__ = name
+        self._view = None
+
+    def resolve(self):
+        view = self._view
+        if view is None:
+            with _import_lock:
+                if self._view is None:
+                    self._view = getattr(import_module(self.__module__), self.__name__)
+                view = self._view
+        return view
+
+    @property
+    def loaded(self):
+        return self._view is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        # Only reached for attributes not set in __init__ (csrf_exempt, ...)
+        if attr.startswith('_') or attr in ABSENT_ATTRIBUTES:
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f'<LazyView {self.__module__}.{self.__name__}{"" if self.loaded else " (not loaded)"}>'
+
+
+class LazyModule:
+    """`LazyModule(path).view_name` -> LazyView, one per name"""
+
+    def __init__(self, module_path):
+        self._module_path = module_path
+        self._views = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name not in self._views:
+            self._views[name] = LazyView(self._module_path, name)
+        return self._views[name]
@@ -0,0 +1,113 @@
+import sys
+import json
+import statistics
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter so every import is cold.
+# eager  = what urls.py did before lazy views: every view module + Selenium
+# lazy   = URLconf only, view modules load on first request
+# warmed = lazy + the public view modules warmup.py imports at startup
+CHILD = r'''
+import sys, json, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+
+from django.urls import get_resolver, reverse
+get_resolver().reverse_dict
+reverse('home')
+mode = sys.argv[1]
+if mode == 'eager':
+    import importlib, pkgutil
+    for package_name in ('sleekweb.views.client', 'sleekweb.views.admin'):
+        package = importlib.import_module(package_name)
+        for module in pkgutil.iter_modules(package.__path__):
+            importlib.import_module(f'{package_name}.{module.name}')
+    for name in ('selenium.webdriver', 'webdriver_manager.chrome'):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+elif mode == 'warmed':
+    from sleekweb.warmup import StartupReport, import_views
+    import_views(StartupReport())
+finished = time.perf_counter()
+
+rss_kb = None
+try:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss_kb //= 1024
+print(json.dumps({
+    'setup': setup_done - started,
+    'urls': finished - setup_done,
+    'total': finished - started,
+    'rss_kb': rss_kb,
+    'views': sum(1 for name in sys.modules if name.startswith('sleekweb.views.') and name.count('.') == 3),
+    'selenium': 'selenium' in sys.modules,
+}))
+'''
+
+MODES = ('eager', 'lazy', 'warmed')
+
+
+def run_child(mode):
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, mode],
+        cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(f"{mode}: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    help = "Đo thời gian import lúc khởi động và RAM (RSS) của một worker: nạp hết view (eager) so với nạp lười (lazy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Số lần chạy mỗi chế độ (lấy trung vị)")
+        parser.add_argument('--mode', choices=MODES, action='append',
+                            help="Chỉ đo chế độ này (có thể lặp lại), mặc định đo tất cả")
+        parser.add_argument('--json', action='store_true', help="In kết quả dạng JSON")
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in options['mode'] or MODES:
+            runs = [run_child(mode) for _ in range(max(options['repeat'], 1))]
+            results[mode] = {
+                'setup_ms': statistics.median(run['setup'] for run in runs) * 1000,
+                'urls_ms': statistics.median(run['urls'] for run in runs) * 1000,
+                'total_ms': statistics.median(run['total'] for run in runs) * 1000,
+                'rss_mb': statistics.median(run['rss_kb'] for run in runs) / 1024,
+                'views': runs[-1]['views'],
+                'selenium': runs[-1]['selenium'],
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'mode':<8} {'setup':>9} {'urls+views':>11} {'total':>9} {'RSS':>9} {'views':>6}  selenium")
+        for mode, row in results.items():
+            self.stdout.write(
+                f"{mode:<8} {row['setup_ms']:>7.1f}ms {row['urls_ms']:>9.1f}ms {row['total_ms']:>7.1f}ms "
+                f"{row['rss_mb']:>7.1f}MB {row['views']:>6}  {'yes' if row['selenium'] else 'no'}"
+            )
+        if 'eager' in results and 'lazy' in results:
+            # django.setup() chạy giống nhau ở mọi chế độ, chỉ so phần URL + view
+            eager, lazy = results['eager'], results['lazy']
+            self.stdout.write(
+                f"lazy - eager: {lazy['urls_ms'] - eager['urls_ms']:+.1f}ms import, "
+                f"{lazy['rss_mb'] - eager['rss_mb']:+.1f}MB RSS mỗi worker"
+            )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from sleekweb.image_variants import IMAGE_FIELDS, load_manifest, generate
+from sleekweb.signals import invalidate_cached_pages
+from sleekweb.cdn import model_key, purge
+
+
+class Command(BaseCommand):
+    help = "Tạo ảnh thu nhỏ WebP/JPEG (srcset) cho ảnh đã upload chưa có, rồi dựng lại snapshot trang chủ"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Tạo lại cả ảnh đã có biến thể")
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        changed = set()
+        for model, field_name in IMAGE_FIELDS.items():
+            names = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for name in names.values_list(field_name, flat=True).distinct():
+                if not options['force'] and load_manifest(name):
+                    continue
+                try:
+                    generate(name)
+                    built += 1
+                    changed.add(model)
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{name}: {e}")
+        for model in changed:
+            # Snapshot, cache trang, ETag và CDN chuyển sang URL biến thể trực tiếp
+            invalidate_cached_pages(model)
+            purge([model_key(model)])
+        self.stdout.write(self.style.SUCCESS(f"Đã tạo biến thể cho {built} ảnh, lỗi {failed}"))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sleekweb.media_gc import find_orphans, remove_orphan
+
+
+class Command(BaseCommand):
+    help = "Tìm và xoá file trong MEDIA_ROOT không còn FileField/ImageField nào trỏ tới (chạy bằng cron hoặc --interval)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Chỉ liệt kê, không xoá")
+        parser.add_argument('--min-age', type=int, default=24,
+                            help="Chỉ xét file cũ hơn N giờ (file mới có thể chưa commit)")
+        parser.add_argument('--exclude', action='append', default=[],
+                            help="Thư mục (tính từ MEDIA_ROOT) bỏ qua, dùng nhiều lần được")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Lặp lại sau mỗi N giây (0 = chạy một lần)")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            files = size = 0
+            min_age = options['min_age'] * 3600
+            for name, file_size in find_orphans(min_age=min_age, exclude=options['exclude']):
+                if options['dry_run']:
+                    self.stdout.write(name)
+                elif not remove_orphan(name, min_age=min_age):
+                    # Được lưu lại / tham chiếu lại sau khi quét
+                    continue
+                files += 1
+                size += file_size
+            verb = "Tìm thấy" if options['dry_run'] else "Đã xoá"
+            self.stdout.write(self.style.SUCCESS(f"{verb} {files} file mồ côi ({size / 1024 / 1024:.1f} MB)"))
+            if not interval:
+                break
+            time.sleep(interval)
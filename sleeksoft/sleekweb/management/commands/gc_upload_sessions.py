@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sleekweb.chunked_uploads import collect_stale
+
+
+class Command(BaseCommand):
+    help = "Xoá các phiên upload video bỏ dở quá UPLOAD_SESSION_TTL_HOURS và file tạm còn sót (chạy bằng cron hoặc --interval)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Lặp lại sau mỗi N giây (0 = chạy một lần)")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            sessions, paths = collect_stale()
+            self.stdout.write(self.style.SUCCESS(f"Đã xoá {sessions} phiên upload, {paths} file/thư mục tạm"))
+            if not interval:
+                break
+            time.sleep(interval)
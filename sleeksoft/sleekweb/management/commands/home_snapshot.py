@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sleekweb.home_snapshot import SECTION_BUILDERS, rebuild_snapshot
+from sleekweb.models import Home_Snapshot
+from sleekweb.page_cache import invalidate_page
+
+
+class Command(BaseCommand):
+    help = "Xem phiên bản / độ cũ của snapshot trang chủ, hoặc dựng lại (--rebuild)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', nargs='*', choices=list(SECTION_BUILDERS), metavar='SECTION',
+                            help="Dựng lại các phần đã chọn (bỏ trống = tất cả)")
+
+    def handle(self, *args, **options):
+        if options['rebuild'] is not None:
+            rebuild_snapshot(options['rebuild'] or None)
+            invalidate_page('home')
+            invalidate_page('channel_manifest')
+
+        snapshot = Home_Snapshot.objects.first()
+        if snapshot is None:
+            self.stdout.write(self.style.WARNING("Chưa có snapshot (sẽ được dựng ở lần mở trang chủ đầu tiên)"))
+            return
+        age = (timezone.now() - snapshot.Built_time).total_seconds() if snapshot.Built_time else None
+        self.stdout.write(f"Phiên bản: {snapshot.Version}")
+        self.stdout.write(f"Dựng lúc: {snapshot.Built_time}")
+        self.stdout.write(f"Tuổi: {age:.0f}s" if age is not None else "Tuổi: -")
+        for name in SECTION_BUILDERS:
+            section = snapshot.Data.get(name)
+            if isinstance(section, dict):
+                size = sum(len(page['items']) for page in section.values())
+            else:
+                size = len(section) if section is not None else '-'
+            self.stdout.write(f"  {name}: {size}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sleekweb.catalog_import import IMPORTS, ImportFailed, import_xlsx
+
+
+class Command(BaseCommand):
+    help = "Nhập sản phẩm / video hàng loạt từ file Excel (.xlsx), dòng đầu là tên cột; dòng lỗi được báo và bỏ qua"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTS))
+        parser.add_argument('path', help="Đường dẫn file .xlsx")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Số dòng mỗi lần bulk_create (mặc định IMPORT_BATCH_SIZE)")
+
+    def handle(self, *args, **options):
+        try:
+            result = import_xlsx(options['kind'], options['path'], options['batch_size'])
+        except ImportFailed as e:
+            raise CommandError(str(e))
+        for number, message in result.errors:
+            self.stderr.write(f"Dòng {number}: {message}")
+        self.stdout.write(self.style.SUCCESS(f"Đã nhập {result.created} dòng, lỗi {len(result.errors)}"))
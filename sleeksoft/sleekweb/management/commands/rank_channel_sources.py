@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sleekweb.stream_ranking import rank_all_channels
+
+
+class Command(BaseCommand):
+    help = "Đo TTFB / tốc độ của các nguồn phát và lưu thứ hạng vào cache (chạy bằng cron hoặc --interval)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Lặp lại sau mỗi N giây (0 = chạy một lần)")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            started = time.monotonic()
+            rankings = rank_all_channels()
+            for pk, ranking in rankings.items():
+                best = ranking[0] if ranking else '-'
+                self.stdout.write(f"Channel {pk}: {len(ranking)} nguồn, tốt nhất: {best}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Đã xếp hạng {len(rankings)} kênh trong {time.monotonic() - started:.1f}s"
+            ))
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sleekweb.key_refresh import refresh_due_channels
+
+
+class Command(BaseCommand):
+    help = "Quét lại trang nguồn để làm mới Key có token sắp hết hạn (chạy bằng cron hoặc --interval)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Lặp lại sau mỗi N giây (0 = chạy một lần)")
+        parser.add_argument('--force', action='store_true',
+                            help="Làm mới tất cả kênh có trang nguồn, kể cả chưa đến hạn")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            for channel, new_key in refresh_due_channels(force=options['force']):
+                if new_key:
+                    self.stdout.write(self.style.SUCCESS(f"Channel {channel.pk} ({channel.Name}): Key mới {new_key}"))
+                else:
+                    self.stdout.write(self.style.WARNING(f"Channel {channel.pk} ({channel.Name}): không đổi Key"))
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from sleekweb.models import Animation_Image
+from sleekweb.image_variants import load_manifest
+from sleekweb.animated_images import served_size
+
+
+def megabytes(size):
+    return f"{size / 1024 / 1024:.2f} MB"
+
+
+class Command(BaseCommand):
+    help = "Thống kê dung lượng ảnh động (Animation_Image): file gốc, bản WebP/MP4 được dùng và số byte tiết kiệm được"
+
+    def handle(self, *args, **options):
+        total_source = total_served = converted = pending = static = 0
+        names = Animation_Image.objects.exclude(Image='').exclude(Image__isnull=True)
+        for name in names.values_list('Image', flat=True).distinct():
+            manifest = load_manifest(name)
+            if not manifest:
+                # Chưa tạo biến thể: build_image_variants
+                pending += 1
+                continue
+            if 'animation' not in manifest:
+                static += 1
+                continue
+            source = manifest['animation']['source']
+            served, fmt = served_size(manifest)
+            converted += 1
+            total_source += source
+            total_served += served
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{name}: {megabytes(source)} -> {megabytes(served)} ({fmt})")
+        saved = total_source - total_served
+        percent = saved * 100 / total_source if total_source else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{converted} ảnh động: {megabytes(total_source)} -> {megabytes(total_served)}, "
+            f"tiết kiệm {saved} byte = {megabytes(saved)} ({percent:.0f}%)"
+        ))
+        if pending or static:
+            self.stdout.write(f"Chưa xử lý {pending} ảnh (chạy build_image_variants), {static} ảnh không động")
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sleekweb.models import Video, Transcode_Job
+from sleekweb.transcoding import enqueue, run_job, run_pending
+
+
+class Command(BaseCommand):
+    help = "Chuyển mã video sang HLS: chạy các job đang chờ (cron hoặc --interval), hoặc một video cụ thể (--video)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--video', type=int, action='append', help="Chuyển mã lại video này (có thể lặp lại)")
+        parser.add_argument('--all', action='store_true', help="Tạo job cho mọi video chưa có bản HLS")
+        parser.add_argument('--retry-failed', action='store_true', help="Chạy lại cả các job bị lỗi")
+        parser.add_argument('--status', action='store_true', help="Chỉ in trạng thái các job gần nhất")
+        parser.add_argument('--interval', type=int, default=0, help="Lặp lại sau mỗi N giây (0 = chạy một lần)")
+
+    def handle(self, *args, **options):
+        if options['status']:
+            for job in Transcode_Job.objects.order_by('-id')[:20]:
+                self.stdout.write(f"Job {job.pk} video {job.Link_video_id}: {job.Status} ({job.Attempts} lần) {job.Error or ''}")
+            return
+
+        for pk in options['video'] or []:
+            try:
+                video = Video.objects.get(pk=pk)
+            except Video.DoesNotExist:
+                raise CommandError(f"Không có video {pk}")
+            job = enqueue(video) or video.transcode_jobs.filter(Source=video.Video.name).last()
+            if job is None:
+                raise CommandError(f"Video {pk} không có file")
+            # Chạy lại kể cả khi đã xong
+            Transcode_Job.objects.filter(pk=job.pk).update(Status='pending')
+            run_job(job.pk)
+            job.refresh_from_db()
+            self.stdout.write(f"Video {pk}: {job.Status} {job.Error or ''}")
+        if options['video']:
+            return
+
+        if options['all']:
+            for video in Video.objects.filter(Hls__isnull=True).exclude(Video='').exclude(Video__isnull=True):
+                enqueue(video)
+
+        while True:
+            jobs = run_pending(retry_failed=options['retry_failed'])
+            statuses = dict(Transcode_Job.objects.filter(pk__in=jobs).values_list('pk', 'Status'))
+            done = sum(1 for status in statuses.values() if status == 'ready')
+            self.stdout.write(self.style.SUCCESS(f"Đã chạy {len(jobs)} job: {done} xong, {len(jobs) - done} lỗi"))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
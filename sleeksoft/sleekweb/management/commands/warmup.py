@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from sleekweb.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = "Chạy các bước warm-up (import view, URL, template, cache trang chủ) và in thời gian từng bước"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-cache', action='store_true',
+                            help="Bỏ qua bước nạp sẵn cache (không truy cập DB)")
+
+    def handle(self, *args, **options):
+        report = warm_up(prime=not options['no_cache'])
+        for line in report.lines():
+            self.stdout.write(line)
+        if any(error for _, _, error in report.stages):
+            self.stdout.write(self.style.WARNING("Có bước warm-up bị lỗi"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Warm-up xong"))
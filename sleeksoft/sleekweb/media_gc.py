@@ -0,0 +1,171 @@
+"""
+Orphaned media: files under MEDIA_ROOT that no FileField / ImageField (or
+Video.Hls) refers to any more, left by failed or lost deletions, rolled
+back uploads and files replaced before deletion was counted.
+
+The tree is walked with os.scandir one directory at a time, and candidates
+are checked against the database in batches (`field__in=[...]` per file
+field), so memory stays flat for hundreds of thousands of files. Derived
+files belong to their source:
+
+    <dir>/_variants/<stem>.*           the image named in <stem>.json
+    Video_Hls/<video>/<job>/...        Video.Hls = .../<job>/master.m3u8
+
+Files younger than `min_age` are skipped: their row may not be committed yet.
+A blob saved again is touched (storage.py), so its age counts from the last
+save. `remove_orphan` checks age and references once more right before the
+unlink, blobs under their Media_Blob row lock, since a row may have taken
+the file since its batch was checked.
+"""
+
+import os
+import json
+import time
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from .image_variants import VARIANT_DIR
+from .models import Video, Media_Blob
+from .storage import file_fields, is_blob, blob_grace
+from .transcoding import HLS_ROOT
+
+
+BATCH_SIZE = 1000
+
+
+def file_field_models():
+    """[(model, attnames)] of every installed model with file fields"""
+    return [(model, file_fields(model)) for model in apps.get_models() if file_fields(model)]
+
+
+def field_defaults():
+    """Default files (e.g. User.Avatar) are kept even when no row uses them"""
+    names = set()
+    for model, attnames in file_field_models():
+        for attname in attnames:
+            field = model._meta.get_field(attname)
+            if field.has_default() and isinstance(field.get_default(), str):
+                names.add(field.get_default())
+    return names
+
+
+def skipped_dirs(extra=()):
+    """Top-level directories under MEDIA_ROOT that hold files no FileField tracks"""
+    skip = {path.strip('/') for path in extra}
+    # Ảnh chèn trong bài viết CKEditor chỉ nằm trong HTML
+    ckeditor = getattr(settings, 'CKEDITOR_UPLOAD_PATH', '')
+    if ckeditor:
+        skip.add(ckeditor.strip('/'))
+    temp = getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None)
+    if temp:
+        relative = os.path.relpath(os.path.abspath(temp), os.path.abspath(settings.MEDIA_ROOT))
+        if not relative.startswith('..'):
+            skip.add(relative.replace(os.sep, '/'))
+    return skip
+
+
+def walk(root, skip=()):
+    """Yield (storage name, DirEntry) of every file under root, depth first"""
+    stack = ['']
+    while stack:
+        relative = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(root, relative))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = f'{relative}/{entry.name}' if relative else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in skip:
+                        stack.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    yield name, entry
+
+
+@lru_cache(maxsize=4096)
+def manifest_source(root, manifest):
+    try:
+        with open(os.path.join(root, manifest)) as f:
+            return json.load(f).get('source')
+    except (OSError, ValueError):
+        return None
+
+
+def owner(root, name):
+    """Storage name whose reference keeps `name`; None when nothing can"""
+    parts = name.split('/')
+    if parts[0] == HLS_ROOT:
+        if len(parts) >= 4 and parts[1].isdigit() and parts[2].isdigit():
+            return f'{HLS_ROOT}/{parts[1]}/{parts[2]}/master.m3u8'
+        return None
+    if len(parts) >= 2 and parts[-2] == VARIANT_DIR:
+        filename = parts[-1]
+        # <stem>.json or <stem>.<hash>.<width>.<format>
+        stem = filename[:-len('.json')] if filename.endswith('.json') else filename.rsplit('.', 3)[0]
+        return manifest_source(root, '/'.join(parts[:-1] + [f'{stem}.json']))
+    return name
+
+
+def referenced(names):
+    """The subset of `names` some row refers to"""
+    names = list(names)
+    found = set()
+    for model, attnames in file_field_models():
+        for attname in attnames:
+            found.update(model._default_manager.filter(**{f'{attname}__in': names}).values_list(attname, flat=True))
+    found.update(Video.objects.filter(Hls__in=names).values_list('Hls', flat=True))
+    return found
+
+
+def find_orphans(root=None, min_age=24 * 3600, exclude=(), batch_size=BATCH_SIZE):
+    """Yield (storage name, size) of files under MEDIA_ROOT no row refers to"""
+    root = root or settings.MEDIA_ROOT
+    manifest_source.cache_clear()
+    keep = field_defaults()
+    cutoff = time.time() - min_age
+    batch = []
+
+    def resolve(batch):
+        owners = {key for _, key, _ in batch if key}
+        live = referenced(owners) if owners else set()
+        for name, key, size in batch:
+            if key not in live and key not in keep:
+                yield name, size
+
+    for name, entry in walk(root, skipped_dirs(exclude)):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime > cutoff:
+            continue
+        batch.append((name, owner(root, name), stat.st_size))
+        if len(batch) >= batch_size:
+            yield from resolve(batch)
+            batch = []
+    if batch:
+        yield from resolve(batch)
+
+
+def remove_orphan(name, root=None, min_age=0):
+    """Unlink an orphan found by find_orphans unless it was saved or referenced since; True when removed"""
+    root = root or settings.MEDIA_ROOT
+    path = os.path.join(root, name)
+    key = owner(root, name)
+    with transaction.atomic():
+        blob = Media_Blob.objects.select_for_update().filter(Name=name).first() if is_blob(name) else None
+        if blob and (blob.References > 0 or blob.Update_time > timezone.now() - blob_grace()):
+            return False
+        if key and referenced([key]):
+            return False
+        try:
+            if os.stat(path).st_mtime > time.time() - min_age:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        if blob:
+            Media_Blob.objects.filter(pk=blob.pk).delete()
+    return True
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0024_channel_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Channel_Source',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Url', models.CharField(max_length=500, verbose_name='Link nguồn')),
+                ('Order', models.IntegerField(default=0, verbose_name='Thứ tự')),
+                ('Ttfb', models.IntegerField(blank=True, null=True, verbose_name='TTFB (ms)')),
+                ('Throughput', models.IntegerField(blank=True, null=True, verbose_name='Tốc độ (KB/s)')),
+                ('Online', models.BooleanField(default=True, verbose_name='Đang phát')),
+                ('Checked_time', models.DateTimeField(blank=True, null=True, verbose_name='Thời gian đo')),
+                ('Creation_time', models.DateTimeField(auto_now_add=True, verbose_name='Thời gian tạo')),
+                ('Update_time', models.DateTimeField(auto_now=True, verbose_name='Thời gian cập nhật')),
+                ('Link_channel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sources', to='sleekweb.channel')),
+            ],
+            options={
+                'verbose_name_plural': 'Nguồn phát dự phòng',
+                'ordering': ['Order', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0025_channel_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='Extract_rule',
+            field=models.CharField(blank=True, max_length=500, null=True, verbose_name='Quy tắc lọc link (regex)'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='Key_expires',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Key hết hạn lúc'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='Key_refreshed',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Lần làm mới Key'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='Refresh_error',
+            field=models.CharField(blank=True, max_length=1000, null=True, verbose_name='Lỗi làm mới'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='Refresh_interval',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Chu kỳ làm mới (phút)'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='Source_page',
+            field=models.CharField(blank=True, max_length=2000, null=True, verbose_name='Trang nguồn'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0026_channel_key_refresh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Home_Snapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Data', models.JSONField(default=dict, verbose_name='Dữ liệu')),
+                ('Version', models.IntegerField(default=0, verbose_name='Phiên bản')),
+                ('Built_time', models.DateTimeField(blank=True, null=True, verbose_name='Thời gian dựng')),
+            ],
+            options={
+                'verbose_name_plural': 'Dữ liệu trang chủ (snapshot)',
+            },
+        ),
+    ]
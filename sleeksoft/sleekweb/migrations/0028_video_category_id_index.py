@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0027_home_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['Category', 'id'], name='sleekweb_vi_Categor_72ae0a_idx'),
+        ),
+    ]
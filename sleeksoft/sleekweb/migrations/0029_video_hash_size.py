@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0028_video_category_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='Video_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='SHA-256 video'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='Video_size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Dung lượng video (byte)'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='Video_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='SHA-256 video'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='Video_size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Dung lượng video (byte)'),
+        ),
+    ]
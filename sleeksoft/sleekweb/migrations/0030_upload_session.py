@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:29
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0029_video_hash_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Upload_Session',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Mã phiên')),
+                ('Filename', models.CharField(max_length=255, verbose_name='Tên file')),
+                ('Size', models.BigIntegerField(verbose_name='Dung lượng (byte)')),
+                ('Part_size', models.IntegerField(verbose_name='Kích thước mỗi phần (byte)')),
+                ('Title', models.CharField(blank=True, max_length=200, null=True, verbose_name='Tiêu đề')),
+                ('Category', models.CharField(blank=True, max_length=10, null=True, verbose_name='Danh mục')),
+                ('Creation_time', models.DateTimeField(auto_now_add=True, verbose_name='Thời gian tạo')),
+                ('Update_time', models.DateTimeField(auto_now=True, verbose_name='Thời gian cập nhật')),
+                ('Link_video', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='sleekweb.video')),
+            ],
+            options={
+                'verbose_name_plural': 'Phiên upload video',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0030_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='Hls',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Playlist HLS'),
+        ),
+        migrations.CreateModel(
+            name='Transcode_Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Source', models.CharField(max_length=255, verbose_name='File gốc')),
+                ('Status', models.CharField(choices=[('pending', 'Đang chờ'), ('running', 'Đang chuyển mã'), ('ready', 'Xong'), ('failed', 'Lỗi')], default='pending', max_length=10, verbose_name='Trạng thái')),
+                ('Error', models.TextField(blank=True, null=True, verbose_name='Lỗi')),
+                ('Attempts', models.IntegerField(default=0, verbose_name='Số lần chạy')),
+                ('Started_time', models.DateTimeField(blank=True, null=True, verbose_name='Bắt đầu')),
+                ('Finished_time', models.DateTimeField(blank=True, null=True, verbose_name='Kết thúc')),
+                ('Creation_time', models.DateTimeField(auto_now_add=True, verbose_name='Thời gian tạo')),
+                ('Update_time', models.DateTimeField(auto_now=True, verbose_name='Thời gian cập nhật')),
+                ('Link_video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transcode_jobs', to='sleekweb.video')),
+            ],
+            options={
+                'verbose_name_plural': 'Chuyển mã video (HLS)',
+                'ordering': ['id'],
+            },
+        ),
+    ]
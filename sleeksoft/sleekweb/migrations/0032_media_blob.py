@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-19 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0031_video_hls_transcode_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Media_Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Name', models.CharField(max_length=255, unique=True, verbose_name='Tên file')),
+                ('Hash', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('Size', models.BigIntegerField(default=0, verbose_name='Dung lượng (byte)')),
+                ('References', models.IntegerField(default=0, verbose_name='Số tham chiếu')),
+                ('Creation_time', models.DateTimeField(auto_now_add=True, verbose_name='Thời gian tạo')),
+                ('Update_time', models.DateTimeField(auto_now=True, verbose_name='Thời gian cập nhật')),
+            ],
+            options={
+                'verbose_name_plural': 'File lưu theo nội dung',
+                'ordering': ['id'],
+            },
+        ),
+    ]
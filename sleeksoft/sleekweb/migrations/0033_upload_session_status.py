@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:39
+
+from django.db import migrations, models
+
+
+def mark_completed_ready(apps, schema_editor):
+    Upload_Session = apps.get_model('sleekweb', 'Upload_Session')
+    Upload_Session.objects.filter(Link_video__isnull=False).update(Status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sleekweb', '0032_media_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload_session',
+            name='Error',
+            field=models.TextField(blank=True, null=True, verbose_name='Lỗi'),
+        ),
+        migrations.AddField(
+            model_name='upload_session',
+            name='Status',
+            field=models.CharField(choices=[('uploading', 'Đang tải lên'), ('assembling', 'Đang ghép file'), ('ready', 'Xong'), ('failed', 'Lỗi')], default='uploading', max_length=10, verbose_name='Trạng thái'),
+        ),
+        migrations.RunPython(mark_completed_ready, migrations.RunPython.noop),
+    ]
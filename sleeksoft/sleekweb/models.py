@@ -9,7 +9,9 @@ from django.db.models import Q
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager,PermissionsMixin
 
 from ckeditor_uploader.fields import RichTextUploadingField
-from django.utils.text import slugify
+
+from .slugs import allocate_slugs
+import uuid
 
 # Create your models here.
 
@@ -47,22 +49,16 @@ class Product(models.Model):
     Description = models.TextField('Mô tả',blank=True, null=True)
     Avatar = models.ImageField(upload_to='Avatar_Product', null=True,blank=True)
     Video = models.FileField(upload_to='Video_Product', null=True, blank=True)
+    Video_hash = models.CharField('SHA-256 video', max_length=64, blank=True, null=True)
+    Video_size = models.BigIntegerField('Dung lượng video (byte)', blank=True, null=True)
     Link = models.CharField('Link video', max_length=10000,blank=True, null=True)
     Iframe = models.CharField('Iframe video', max_length=10000,blank=True, null=True)
     Creation_time = models.DateTimeField('Thời gian tạo',auto_now_add=True)
     Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
 
     def save(self, *args, **kwargs):
-        # Tạo slug từ Title nếu chưa có
-        if self.Title and not self.Slug:
-            base_slug = slugify(self.Title)
-            slug = base_slug
-            counter = 1
-            # Đảm bảo slug là unique
-            while Product.objects.filter(Slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.Slug = slug
+        # Tạo slug unique từ Title nếu chưa có, một query (slugs.py)
+        allocate_slugs(Product, [self])
         super().save(*args, **kwargs)
 
 class Ads(models.Model):
@@ -95,6 +91,28 @@ class Channel(models.Model):
     Avatar = models.ImageField(upload_to='Channel_Daga', null=True,blank=True)
     Password = models.CharField('Mật khẩu', max_length=100,blank=True, null=True)
     Time = models.CharField('Ngày', max_length=100,blank=True, null=True)
+    # Tự động lấy lại Key có token hết hạn từ trang nguồn
+    Source_page = models.CharField('Trang nguồn', max_length=2000,blank=True, null=True)
+    Extract_rule = models.CharField('Quy tắc lọc link (regex)', max_length=500,blank=True, null=True)
+    Refresh_interval = models.IntegerField('Chu kỳ làm mới (phút)',blank=True, null=True)
+    Key_expires = models.DateTimeField('Key hết hạn lúc',blank=True, null=True)
+    Key_refreshed = models.DateTimeField('Lần làm mới Key',blank=True, null=True)
+    Refresh_error = models.CharField('Lỗi làm mới', max_length=1000,blank=True, null=True)
+    Creation_time = models.DateTimeField('Thời gian tạo',auto_now_add=True)
+    Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
+
+class Channel_Source(models.Model):
+    class Meta:
+        ordering = ["Order", "id"]
+        verbose_name_plural = "Nguồn phát dự phòng"
+
+    Link_channel = models.ForeignKey(Channel, on_delete=models.CASCADE, null=True, blank=True,related_name='sources')
+    Url = models.CharField('Link nguồn', max_length=500)
+    Order = models.IntegerField('Thứ tự', default=0)
+    Ttfb = models.IntegerField('TTFB (ms)', blank=True, null=True)
+    Throughput = models.IntegerField('Tốc độ (KB/s)', blank=True, null=True)
+    Online = models.BooleanField('Đang phát', default=True)
+    Checked_time = models.DateTimeField('Thời gian đo', blank=True, null=True)
     Creation_time = models.DateTimeField('Thời gian tạo',auto_now_add=True)
     Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
 
@@ -103,10 +121,18 @@ class Video(models.Model):
     class Meta:
         ordering = ["id"]
         verbose_name_plural = "Video"
+        indexes = [
+            # Feed video theo danh mục, mới nhất trước (keyset trên id)
+            models.Index(fields=['Category', 'id']),
+        ]
     
     Title = models.CharField('Tiêu đề', max_length=200,blank=True, null=True)
     Avatar = models.ImageField(upload_to='Video_Daga', null=True,blank=True)
     Video = models.FileField(upload_to='Video_Daga', null=True, blank=True)
+    Video_hash = models.CharField('SHA-256 video', max_length=64, blank=True, null=True)
+    Video_size = models.BigIntegerField('Dung lượng video (byte)', blank=True, null=True)
+    # Master playlist HLS (đường dẫn trong MEDIA_ROOT), có sau khi chuyển mã xong (transcoding.py)
+    Hls = models.CharField('Playlist HLS', max_length=255, blank=True, null=True)
     Category = models.CharField('Danh mục', max_length=10,blank=True, null=True)
     Creation_time = models.DateTimeField('Thời gian tạo',auto_now_add=True)
     Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
@@ -139,4 +165,76 @@ class Animation_Image(models.Model):
     
     Image = models.ImageField(upload_to='Animation_Image', null=True,blank=True)
     Creation_time = models.DateTimeField('Thời gian tạo',auto_now_add=True)
-    Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
\ No newline at end of file
+    Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
+
+class Home_Snapshot(models.Model):
+    class Meta:
+        verbose_name_plural = "Dữ liệu trang chủ (snapshot)"
+
+    # Danh sách kênh, quảng cáo, tỉ lệ cược, ảnh động, video đã serialize sẵn cho home.html
+    Data = models.JSONField('Dữ liệu', default=dict)
+    Version = models.IntegerField('Phiên bản', default=0)
+    Built_time = models.DateTimeField('Thời gian dựng', blank=True, null=True)
+
+class Upload_Session(models.Model):
+    STATUS_CHOICES = [
+        ('uploading', 'Đang tải lên'),
+        ('assembling', 'Đang ghép file'),
+        ('ready', 'Xong'),
+        ('failed', 'Lỗi'),
+    ]
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name_plural = "Phiên upload video"
+
+    # Upload video lớn theo từng phần, có thể tiếp tục khi rớt mạng (chunked_uploads.py)
+    Token = models.UUIDField('Mã phiên', default=uuid.uuid4, unique=True, editable=False)
+    Filename = models.CharField('Tên file', max_length=255)
+    Size = models.BigIntegerField('Dung lượng (byte)')
+    Part_size = models.IntegerField('Kích thước mỗi phần (byte)')
+    Title = models.CharField('Tiêu đề', max_length=200, blank=True, null=True)
+    Category = models.CharField('Danh mục', max_length=10, blank=True, null=True)
+    Link_video = models.ForeignKey(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions')
+    # Ghép các phần chạy nền sau khi gọi complete (chunked_uploads.py)
+    Status = models.CharField('Trạng thái', max_length=10, choices=STATUS_CHOICES, default='uploading')
+    Error = models.TextField('Lỗi', blank=True, null=True)
+    Creation_time = models.DateTimeField('Thời gian tạo',auto_now_add=True)
+    Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
+
+class Transcode_Job(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Đang chờ'),
+        ('running', 'Đang chuyển mã'),
+        ('ready', 'Xong'),
+        ('failed', 'Lỗi'),
+    ]
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name_plural = "Chuyển mã video (HLS)"
+
+    Link_video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='transcode_jobs')
+    # Video.Video lúc tạo job: upload file mới thì tạo job mới
+    Source = models.CharField('File gốc', max_length=255)
+    Status = models.CharField('Trạng thái', max_length=10, choices=STATUS_CHOICES, default='pending')
+    Error = models.TextField('Lỗi', blank=True, null=True)
+    Attempts = models.IntegerField('Số lần chạy', default=0)
+    Started_time = models.DateTimeField('Bắt đầu', blank=True, null=True)
+    Finished_time = models.DateTimeField('Kết thúc', blank=True, null=True)
+    Creation_time = models.DateTimeField('Thời gian tạo',auto_now_add=True)
+    Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
+
+class Media_Blob(models.Model):
+    class Meta:
+        ordering = ["id"]
+        verbose_name_plural = "File lưu theo nội dung"
+
+    # Một file trong MEDIA_ROOT/blobs dùng chung cho mọi FileField có cùng nội dung (storage.py)
+    Name = models.CharField('Tên file', max_length=255, unique=True)
+    Hash = models.CharField('SHA-256', max_length=64)
+    Size = models.BigIntegerField('Dung lượng (byte)', default=0)
+    # Số FileField đang trỏ tới file, về 0 thì file bị xoá
+    References = models.IntegerField('Số tham chiếu', default=0)
+    Creation_time = models.DateTimeField('Thời gian tạo',auto_now_add=True)
+    Update_time = models.DateTimeField('Thời gian cập nhật',auto_now=True)
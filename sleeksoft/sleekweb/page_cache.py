@@ -0,0 +1,96 @@
+"""
+Full-page cache for public pages (home) keyed by the language cookie.
+
+Each page has a version in the cache; saving/deleting any model the page shows
+bumps the version (see signals.py), so old entries are never served again.
+After an invalidation only one worker re-renders (cache.add lock); the others
+serve the last rendered copy until the new one is ready.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .compression import compress_variants
+
+
+PAGE_VERSION_KEY = 'page:{name}:version'
+PAGE_KEY = 'page:{name}:{lang}:{version}'
+PAGE_STALE_KEY = 'page:{name}:{lang}:stale'
+PAGE_LOCK_KEY = 'page:{name}:{lang}:{version}:lock'
+PAGE_TIMEOUT = 60 * 60 * 24
+# A render that takes longer than this is assumed dead and the lock expires
+LOCK_TIMEOUT = 30
+# Cold start (no stale copy): how long waiters poll before rendering themselves
+WAIT_TIMEOUT = 3
+WAIT_STEP = 0.05
+
+
+def page_version(name):
+    version = cache.get(PAGE_VERSION_KEY.format(name=name))
+    if version is None:
+        cache.add(PAGE_VERSION_KEY.format(name=name), time.time_ns(), None)
+        version = cache.get(PAGE_VERSION_KEY.format(name=name))
+    return version
+
+
+def invalidate_page(name):
+    cache.set(PAGE_VERSION_KEY.format(name=name), time.time_ns(), None)
+
+
+def response_to_entry(response):
+    return {
+        'status': response.status_code,
+        'content_type': response['Content-Type'],
+        'content': response.content,
+        # gzip / br bodies, compressed once per render (CompressionMiddleware picks one)
+        'variants': compress_variants(response.content, response['Content-Type']),
+        'surrogate_keys': getattr(response, 'surrogate_keys', []),
+    }
+
+
+def entry_to_response(entry):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'], status=entry['status'])
+    response.precompressed = entry.get('variants')
+    response.precompressed_size = len(entry['content'])
+    response.surrogate_keys = entry.get('surrogate_keys', [])
+    return response
+
+
+def cached_page(name, lang, render):
+    """
+    Cached entry of page `name` for language `lang`
+    render() returns an HttpResponse and only runs on a miss in one worker
+    """
+    version = page_version(name)
+    key = PAGE_KEY.format(name=name, lang=lang, version=version)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    lock_key = PAGE_LOCK_KEY.format(name=name, lang=lang, version=version)
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            entry = response_to_entry(render())
+            if entry['status'] == 200:
+                cache.set_many({
+                    key: entry,
+                    PAGE_STALE_KEY.format(name=name, lang=lang): entry,
+                }, PAGE_TIMEOUT)
+            return entry
+        finally:
+            cache.delete(lock_key)
+
+    # Another worker is rendering: serve the previous copy meanwhile
+    stale = cache.get(PAGE_STALE_KEY.format(name=name, lang=lang))
+    if stale is not None:
+        return stale
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return response_to_entry(render())
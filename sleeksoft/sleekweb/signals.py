@@ -0,0 +1,118 @@
+"""
+Model signals that keep public page caches (local and CDN) in sync with admin
+writes, start post-upload processing (HLS transcoding, image variants) and
+count references to content-addressed media files (storage.py)
+"""
+
+from django.conf import settings
+from django.db.models.signals import post_init, post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from .page_cache import invalidate_page
+from .home_snapshot import rebuild_for_model
+from .content_version import PAGES, touch
+from .cdn import instance_keys, purge
+from .models import Video
+from . import transcoding, background
+from .image_variants import IMAGE_FIELDS, load_manifest, generate_for_instance
+from .storage import file_fields, stored_name, add_reference, drop_reference
+
+
+# Models shown on a client page: snapshot section, page cache and ETag
+VERSIONED_MODELS = {model for _, models in PAGES.values() for model in models}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_pages(sender, **kwargs):
+    if sender in VERSIONED_MODELS:
+        # Only the snapshot section of the changed model is rebuilt, after commit
+        rebuild_for_model(sender)
+        # Then the pages and the ETag: a page rendered before the new snapshot commits
+        # would be cached as current, a new ETag served with the old body would get 304s
+        transaction.on_commit(lambda: invalidate_pages(sender))
+
+
+def invalidate_pages(model):
+    for name, (_, models) in PAGES.items():
+        if model in models:
+            invalidate_page(name)
+    # Commit time, not Update_time: a transaction committing after a newer one must still move the version
+    touch(model)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def purge_cdn(sender, instance, signal, **kwargs):
+    if sender in VERSIONED_MODELS:
+        # Added / removed rows change every list of the model, edits only the pages showing the row
+        keys = instance_keys(instance, list_changed=signal is post_delete or kwargs.get('created', False))
+        transaction.on_commit(lambda: purge(keys))
+
+
+@receiver(post_save, sender=Video)
+def transcode_video(sender, instance, **kwargs):
+    if instance.Video:
+        # After commit: the job must see the saved file; no job if this file already has one
+        transaction.on_commit(lambda: transcoding.schedule(instance.pk))
+
+
+@receiver(post_save)
+def build_image_variants(sender, instance, **kwargs):
+    if sender in IMAGE_FIELDS and getattr(settings, 'IMAGE_VARIANTS_ON_SAVE', True):
+        field = getattr(instance, IMAGE_FIELDS[sender])
+        if field and not load_manifest(field.name):
+            # Until the job is done pages use the lazy /img/ URLs
+            transaction.on_commit(lambda: background.submit(generate_for_instance, sender, instance.pk))
+
+
+@receiver(post_init)
+def remember_file_names(sender, instance, **kwargs):
+    fields = file_fields(sender)
+    if fields:
+        # Deferred fields are left out instead of being loaded
+        instance._stored_files = {
+            attname: stored_name(instance.__dict__[attname]) for attname in fields if attname in instance.__dict__
+        }
+
+
+@receiver(post_save)
+def count_file_references(sender, instance, created, update_fields=None, **kwargs):
+    fields = file_fields(sender)
+    if not fields:
+        return
+    before = instance.__dict__.setdefault('_stored_files', {})
+    for attname in fields:
+        if attname not in instance.__dict__ or (update_fields is not None and attname not in update_fields):
+            continue
+        new = stored_name(instance.__dict__[attname])
+        old = None if created else before.get(attname, new)
+        if new != old:
+            add_reference(new)
+            drop_reference(old)
+        before[attname] = new
+
+
+@receiver(post_delete)
+def release_file_references(sender, instance, **kwargs):
+    fields = file_fields(sender)
+    if fields:
+        stored = getattr(instance, '_stored_files', {})
+        for attname in fields:
+            drop_reference(stored.get(attname, stored_name(instance.__dict__.get(attname))))
+
+
+def bulk_created(model, instances):
+    """bulk_create() sends no post_save: do for the new rows what the receivers above do"""
+    if not instances:
+        return
+    for instance in instances:
+        count_file_references(model, instance, created=True)
+        build_image_variants(model, instance)
+        if model is Video:
+            transcode_video(model, instance)
+    invalidate_cached_pages(model)
+    if model in VERSIONED_MODELS:
+        keys = sorted({key for instance in instances for key in instance_keys(instance)})
+        transaction.on_commit(lambda: purge(keys))
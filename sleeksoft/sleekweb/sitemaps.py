@@ -5,7 +5,6 @@ from .models import *
 
 from datetime import datetime
 
-from .views.client.home_client import *
 
 protocol = 'https'
 
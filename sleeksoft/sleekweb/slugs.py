@@ -0,0 +1,61 @@
+"""
+Unique slugs for many rows at once (Product.save, catalog_import.py).
+
+Rows are grouped by base slug (slugify(Title)); each group costs one query
+for the slugs already taken (`base` and `base-<n>`). The first row gets
+`base` when it is free, the others `base-<n>` numbered on from the highest
+in use. The database unique constraint stays the final check against
+concurrent writers.
+"""
+
+import re
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils.text import slugify
+
+
+# Room left in the field for the "-<n>" suffix
+SUFFIX_ROOM = 6
+
+
+def base_slug(model, title, field='Slug'):
+    max_length = model._meta.get_field(field).max_length
+    slug = slugify(title or '')
+    if len(slug) > max_length - SUFFIX_ROOM:
+        slug = slug[:max_length - SUFFIX_ROOM].rstrip('-')
+    # Tiêu đề chỉ có ký tự đặc biệt
+    return slug or model._meta.model_name
+
+
+def taken_slugs(model, base, field='Slug'):
+    """Slugs in use that `base` could collide with: one query"""
+    return set(
+        model._default_manager.filter(Q(**{field: base}) | Q(**{f'{field}__startswith': f'{base}-'}))
+        .values_list(field, flat=True)
+    )
+
+
+def allocate_slugs(model, instances, field='Slug', title='Title', reserved=()):
+    """
+    Set a unique slug on every instance that has a title and no slug.
+    `reserved`: slugs not saved yet but already given to other rows
+    """
+    groups = defaultdict(list)
+    for instance in instances:
+        if getattr(instance, title) and not getattr(instance, field):
+            groups[base_slug(model, getattr(instance, title), field)].append(instance)
+    for base, members in groups.items():
+        taken = taken_slugs(model, base, field) | {slug for slug in reserved if slug == base or slug.startswith(f'{base}-')}
+        suffix = re.compile(r'^%s-(\d+)$' % re.escape(base))
+        # Continue after the highest number in use instead of probing each one
+        counter = max([int(m.group(1)) for m in map(suffix.match, taken) if m] + [0]) + 1
+        for instance in members:
+            if base not in taken:
+                slug = base
+                taken.add(base)
+            else:
+                slug = f'{base}-{counter}'
+                counter += 1
+            setattr(instance, field, slug)
+    return instances
@@ -0,0 +1,193 @@
+"""
+Content-addressed media storage.
+
+Every file saved through the default storage is stored once per content as
+MEDIA_ROOT/blobs/<aa>/<sha256><ext>, whatever the FileField's upload_to.
+Saving content that is already stored writes nothing and returns the same
+name, so identical uploads (the same banner on several Ads, Channel and
+Odds_Image rows) share one file and one URL, and a URL never changes
+content (media_client.py caches blobs as immutable).
+
+A Media_Blob row per file counts the FileField values pointing at it.
+signals.py keeps the count: a save that changes a file field adds a
+reference to the new name and drops one from the old one, a delete drops
+one per field. A blob whose count reaches 0 is removed after the
+transaction commits. `delete()` on a blob (FieldFile.delete in the admin
+views) only removes it while nothing references it, so deleting the old
+file before assigning a new one never removes a file another row shows.
+
+Deleting never blocks the caller: `delete()` queues the removal until the
+transaction commits (nothing is lost when it rolls back) and the unlink of
+a possibly multi-GB file runs on the 'delete' background pool. The job
+locks the Media_Blob row and only removes row and file when the blob is
+still unreferenced and was not saved again in the last
+MEDIA_BLOB_GRACE_SECONDS, whichever process saved it: `_save` takes the
+same row lock, writes the file again when the row is gone and marks the
+row as just saved. `manage.py gc_media` removes what a lost job, a skipped
+young blob or a crash left behind.
+
+Names outside blobs/ (uploaded before this storage) are not deduplicated
+or counted. QuerySet.update() and bulk_create() skip the signals: callers
+use add_reference / drop_reference themselves.
+"""
+
+import os
+import re
+import hashlib
+import threading
+from functools import lru_cache
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from . import background
+from .models import Media_Blob
+
+
+BLOB_ROOT = 'blobs'
+blob_re = re.compile(r'^%s/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$' % BLOB_ROOT)
+
+
+def is_blob(name):
+    return bool(name) and bool(blob_re.match(name))
+
+
+def blob_name(digest, extension):
+    return f'{BLOB_ROOT}/{digest[:2]}/{digest}{extension}'
+
+
+def blob_grace():
+    """A blob saved this recently is not removed: its reference may not be counted yet"""
+    return timedelta(seconds=getattr(settings, 'MEDIA_BLOB_GRACE_SECONDS', 60))
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Names queued for removal in this process; saving one again cancels it
+    _queued = set()
+    _queued_lock = threading.Lock()
+
+    def _save(self, name, content):
+        # StreamingUploadHandler / chunked_uploads already hashed the upload on the way in
+        digest = getattr(content, 'sha256', None) or content_hash(content)
+        name = blob_name(digest, os.path.splitext(name)[1].lower())
+        with self._queued_lock:
+            self._queued.discard(name)
+        with transaction.atomic():
+            # Waits for a removal of this blob in another process (remove_queued)
+            blob = Media_Blob.objects.select_for_update().filter(Name=name).first()
+            if blob is None or not self.exists(name):
+                # Without a row the file may be half way to being removed: write it again
+                saved = super()._save(name, content)
+                if saved != name:
+                    os.replace(self.path(saved), self.path(name))
+            else:
+                # Reused: gc_media's min_age counts from the last save, not the first
+                os.utime(self.path(name))
+            if blob is None:
+                try:
+                    with transaction.atomic():
+                        Media_Blob.objects.create(Name=name, Hash=digest, Size=self.size(name))
+                except IntegrityError:
+                    # Another process saved the same new content at the same time: share its row
+                    blob = Media_Blob.objects.select_for_update().get(Name=name)
+            if blob is not None:
+                Media_Blob.objects.filter(pk=blob.pk).update(Update_time=timezone.now())
+        return name
+
+    def delete(self, name):
+        if is_blob(name) and Media_Blob.objects.filter(Name=name, References__gt=0).exists():
+            return
+        transaction.on_commit(lambda: self.discard(name))
+
+    def discard(self, name):
+        """After commit: queue the unlink"""
+        if is_blob(name) and Media_Blob.objects.filter(Name=name, References__gt=0).exists():
+            return
+        with self._queued_lock:
+            self._queued.add(name)
+        background.submit_to('delete', self.remove_queued, name)
+
+    def remove_queued(self, name):
+        with self._queued_lock:
+            if name not in self._queued:
+                return
+            self._queued.discard(name)
+        # Unlocked: uploads and deletes in this process must not wait for a large unlink.
+        # The Media_Blob row lock orders the removal against a save of the same content
+        if not is_blob(name):
+            self.delete_now(name)
+            return
+        try:
+            self.remove_blob(name)
+        finally:
+            # Pool threads keep their own DB connection otherwise
+            connections.close_all()
+
+    def remove_blob(self, name):
+        """Remove an unreferenced blob, its row and its variants; False when it is in use again"""
+        with transaction.atomic():
+            blob = Media_Blob.objects.select_for_update().filter(Name=name).first()
+            # Checked again under the lock: another process may have saved or referenced it since
+            if blob is None or blob.References > 0 or blob.Update_time > timezone.now() - blob_grace():
+                return False
+            Media_Blob.objects.filter(pk=blob.pk).delete()
+            from .image_variants import discard_variants
+            discard_variants(name, self.delete_now)
+            self.delete_now(name)
+        return True
+
+    def delete_now(self, name):
+        super().delete(name)
+
+
+@lru_cache(maxsize=None)
+def file_fields(model):
+    """attnames of the model's FileFields / ImageFields"""
+    return tuple(f.attname for f in model._meta.concrete_fields if isinstance(f, models.FileField))
+
+
+def stored_name(value):
+    """Storage name of a file field value; None while the file is not saved yet"""
+    if isinstance(value, FieldFile):
+        return (value.name or None) if value._committed else None
+    if isinstance(value, str):
+        return value or None
+    return None
+
+
+def add_reference(name):
+    if not is_blob(name):
+        return
+    if not Media_Blob.objects.filter(Name=name).update(References=F('References') + 1):
+        # File stored before its row existed (restored backup)
+        digest = os.path.splitext(os.path.basename(name))[0]
+        blob, _ = Media_Blob.objects.get_or_create(Name=name, defaults={'Hash': digest})
+        Media_Blob.objects.filter(pk=blob.pk).update(References=F('References') + 1)
+
+
+def drop_reference(name):
+    if not is_blob(name):
+        return
+    Media_Blob.objects.filter(Name=name).update(References=F('References') - 1)
+    # Another row may take a reference before the commit
+    transaction.on_commit(lambda: collect_blob(name))
+
+
+def collect_blob(name):
+    if Media_Blob.objects.filter(Name=name, References__lte=0).exists():
+        default_storage.delete(name)
+
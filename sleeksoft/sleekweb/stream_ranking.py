@@ -0,0 +1,170 @@
+"""
+Channel source ranking - measures TTFB and throughput of every candidate stream URL
+of a Channel (Key + Channel_Source rows) and keeps the ranking in the cache.
+Page renders only read the cached ranking, they never probe.
+"""
+
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Channel, Channel_Source
+from .page_cache import invalidate_page
+from .content_version import touch
+from .cdn import object_key, purge
+from .views.client.stream_finder import stream_headers, parse_media_playlist
+
+
+RANKING_CACHE_KEY = 'channel_ranking:{}'
+# Keep a ranking well past one job interval so a slow job never empties it
+RANKING_TIMEOUT = 60 * 30
+PROBE_TIMEOUT = 8
+PROBE_CONCURRENCY = 4
+# Bytes read from one segment to estimate throughput
+THROUGHPUT_SAMPLE_BYTES = 512 * 1024
+
+
+def channel_candidates(channel):
+    """Candidate URLs in admin order: Key first, then the sources by Order"""
+    urls = []
+    if channel.Key:
+        urls.append(channel.Key)
+    for source in channel.sources.all():
+        if source.Url and source.Url not in urls:
+            urls.append(source.Url)
+    return urls
+
+
+def measure_source(url):
+    """
+    Probe one candidate
+    Returns: (ttfb_ms, throughput_kbps) - both None if the source is unreachable
+    """
+    try:
+        started = time.monotonic()
+        response = requests.get(url, headers=stream_headers(url), timeout=PROBE_TIMEOUT, verify=False, stream=True)
+        if response.status_code != 200:
+            response.close()
+            return None, None
+        chunks = response.iter_content(1024)
+        first_chunk = next(chunks, b'')
+        ttfb_ms = int((time.monotonic() - started) * 1000)
+        text = b''.join([first_chunk, *chunks]).decode('utf-8', 'ignore')
+
+        playlist = parse_media_playlist(text)
+        playlist_url = response.url
+        if playlist['variants'] and not playlist['segments']:
+            playlist_url = urljoin(playlist_url, playlist['variants'][0])
+            variant = requests.get(playlist_url, headers=stream_headers(playlist_url), timeout=PROBE_TIMEOUT, verify=False)
+            if variant.status_code != 200:
+                return ttfb_ms, 0
+            playlist = parse_media_playlist(variant.text)
+
+        if not playlist['segments']:
+            return ttfb_ms, 0
+
+        # Throughput: download the head of the newest segment
+        segment_url = urljoin(playlist_url, playlist['segments'][-1])
+        started = time.monotonic()
+        received = 0
+        with requests.get(segment_url, headers=stream_headers(segment_url), timeout=PROBE_TIMEOUT, verify=False, stream=True) as segment:
+            if segment.status_code not in (200, 206):
+                return ttfb_ms, 0
+            for chunk in segment.iter_content(64 * 1024):
+                received += len(chunk)
+                if received >= THROUGHPUT_SAMPLE_BYTES:
+                    break
+        elapsed = max(time.monotonic() - started, 0.001)
+        return ttfb_ms, int(received / 1024 / elapsed)
+    except Exception:
+        return None, None
+
+
+def source_score(ttfb_ms, throughput_kbps):
+    """Higher is better; unreachable sources score -1"""
+    if ttfb_ms is None:
+        return -1
+    return (throughput_kbps or 0) / (1 + ttfb_ms / 1000)
+
+
+def rank_channel(channel):
+    """
+    Measure every candidate of a channel, store metrics and cache the ranking
+    Returns the ranked list of URLs (best first)
+    """
+    candidates = channel_candidates(channel)
+    if not candidates:
+        cache.delete(RANKING_CACHE_KEY.format(channel.pk))
+        return []
+
+    with ThreadPoolExecutor(max_workers=PROBE_CONCURRENCY) as executor:
+        metrics = dict(zip(candidates, executor.map(measure_source, candidates)))
+
+    now = timezone.now()
+    for source in channel.sources.all():
+        ttfb_ms, throughput_kbps = metrics.get(source.Url, (None, None))
+        Channel_Source.objects.filter(pk=source.pk).update(
+            Ttfb=ttfb_ms,
+            Throughput=throughput_kbps,
+            Online=ttfb_ms is not None,
+            Checked_time=now,
+        )
+
+    # Stable sort keeps admin order between equal scores
+    ranking = sorted(candidates, key=lambda url: -source_score(*metrics[url]))
+    previous = cache.get(RANKING_CACHE_KEY.format(channel.pk))
+    cache.set(RANKING_CACHE_KEY.format(channel.pk), ranking, RANKING_TIMEOUT)
+    # The channel manifest embeds each channel's best source
+    if not previous or previous[0] != ranking[0]:
+        invalidate_page('channel_manifest')
+        touch(Channel_Source)
+        purge([object_key(Channel, channel.pk)])
+    return ranking
+
+
+def rank_all_channels():
+    """Ranking job entry point: returns {channel pk: ranking}"""
+    rankings = {}
+    channels = Channel.objects.exclude(StreamType='iframe').prefetch_related('sources')
+    for channel in channels:
+        rankings[channel.pk] = rank_channel(channel)
+    return rankings
+
+
+def get_rankings(channels):
+    """
+    Cached rankings for many channels in one cache round-trip
+    Channels never ranked yet fall back to admin order (no probing)
+    """
+    return cached_rankings({channel.pk: channel_candidates(channel) for channel in channels})
+
+
+def cached_rankings(fallbacks):
+    """Same as get_rankings from {channel pk: candidate urls in admin order}"""
+    keys = {RANKING_CACHE_KEY.format(pk): pk for pk in fallbacks}
+    cached = cache.get_many(list(keys))
+    return {pk: cached.get(key) or fallbacks[pk] for key, pk in keys.items()}
+
+
+def best_source(channel):
+    ranking = get_rankings([channel])[channel.pk]
+    return ranking[0] if ranking else channel.Key
+
+
+def next_source(channel, current):
+    """URL ranked right after current, None when every source has been tried"""
+    ranking = get_rankings([channel])[channel.pk]
+    if current not in ranking:
+        return ranking[0] if ranking else None
+    index = ranking.index(current)
+    if index + 1 < len(ranking):
+        return ranking[index + 1]
+    return None
+
+
+def invalidate_ranking(channel_pk):
+    cache.delete(RANKING_CACHE_KEY.format(channel_pk))
@@ -1,3 +1,1857 @@
 from django.test import TestCase
 
 # Create your tests here.
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .models import *
+from .views.client import hls_relay, stream_finder
+
+
+class FakeHlsOrigin:
+    """Local HLS origin: serves fixed playlists/segments and counts requests per path"""
+
+    def __init__(self, files):
+        self.files = files
+        self.hits = {}
+        self.lock = threading.Lock()
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                with origin.lock:
+                    origin.hits[path] = origin.hits.get(path, 0) + 1
+                body = origin.files.get(path)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                # Slow enough that concurrent requests overlap
+                threading.Event().wait(0.2)
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+MEDIA_PLAYLIST = b"""#EXTM3U
+#EXT-X-TARGETDURATION:4
+#EXT-X-MEDIA-SEQUENCE:10
+#EXT-X-KEY:METHOD=AES-128,URI="key.bin"
+#EXTINF:4,
+seg10.ts
+#EXTINF:4,
+seg11.ts
+"""
+
+
+@override_settings(HLS_RELAY=True, HLS_RELAY_SEGMENT_CACHE_BYTES=1000)
+class HlsRelayTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+        cache.clear()
+        self.segments = tempfile.TemporaryDirectory()
+        settings = override_settings(HLS_RELAY_SEGMENT_CACHE_DIR=self.segments.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(self.segments.cleanup)
+        hls_relay.reset_caches()
+        self.origin = FakeHlsOrigin({
+            '/live/index.m3u8': b'#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nmid/media.m3u8\n',
+            '/live/mid/media.m3u8': MEDIA_PLAYLIST,
+            '/live/mid/seg10.ts': b'A' * 400,
+            '/live/mid/seg11.ts': b'B' * 400,
+            '/live/mid/key.bin': b'K' * 16,
+            '/live/big.ts': b'C' * 5000,
+        })
+        self.channel = Channel.objects.create(Name='C1', Key=self.origin.url + '/live/index.m3u8')
+
+    def tearDown(self):
+        self.origin.close()
+        hls_relay.reset_caches()
+
+    def get_media_playlist(self):
+        master = self.client.get(f'/relay/{self.channel.pk}/index.m3u8').content.decode()
+        variant = [line for line in master.splitlines() if line.startswith('/relay/')][0]
+        return self.client.get(variant)
+
+    def test_playlists_are_rewritten_through_relay(self):
+        response = self.get_media_playlist()
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        segments = [line for line in lines if line and not line.startswith('#')]
+        self.assertEqual(len(segments), 2)
+        self.assertTrue(all(line.startswith(f'/relay/{self.channel.pk}/segment?u=') for line in segments))
+        self.assertIn(f'URI="/relay/{self.channel.pk}/segment?u=', response.content.decode())
+        self.assertNotIn(self.origin.url, response.content.decode())
+
+    def test_concurrent_viewers_cause_one_upstream_fetch(self):
+        variant = hls_relay.relay_playlist_url(self.channel.pk, self.origin.url + '/live/mid/media.m3u8')
+
+        def fetch(_):
+            return self.client_class().get(variant).status_code
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = list(executor.map(fetch, range(8)))
+        self.assertEqual(statuses, [200] * 8)
+        self.assertEqual(self.origin.hits['/live/mid/media.m3u8'], 1)
+
+    def test_segments_are_cached_in_byte_bounded_lru(self):
+        lines = self.get_media_playlist().content.decode().splitlines()
+        seg10, seg11 = [line for line in lines if line and not line.startswith('#')]
+
+        for _ in range(3):
+            response = self.client.get(seg10)
+            self.assertEqual(b''.join(response.streaming_content), b'A' * 400)
+        self.assertEqual(self.origin.hits['/live/mid/seg10.ts'], 1)
+
+        self.client.get(seg11)
+        cache = hls_relay.segment_cache()
+        self.assertLessEqual(cache.total_bytes, 1000)
+
+        # Larger than the whole cache: served but never stored
+        big = hls_relay.relay_segment_url(self.channel.pk, self.origin.url + '/live/big.ts')
+        self.assertEqual(len(b''.join(self.client.get(big).streaming_content)), 5000)
+        self.assertLessEqual(cache.total_bytes, 1000)
+
+    def test_workers_share_segments_and_upstream_fetches(self):
+        url = self.origin.url + '/live/mid/seg10.ts'
+        # One SegmentCache per gunicorn worker, all on the same directory
+        workers = [hls_relay.SegmentCache(1000, self.segments.name) for _ in range(4)]
+
+        def fetch(worker):
+            content_type, chunks = worker.fetch(url)
+            return b''.join(chunks)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            bodies = list(executor.map(fetch, workers * 2))
+        self.assertEqual(bodies, [b'A' * 400] * 8)
+        self.assertEqual(self.origin.hits['/live/mid/seg10.ts'], 1)
+
+        other = hls_relay.SegmentCache(1000, self.segments.name)
+        self.assertEqual(b''.join(other.fetch(url)[1]), b'A' * 400)
+        self.assertEqual(self.origin.hits['/live/mid/seg10.ts'], 1)
+        self.assertEqual(other.total_bytes, workers[0].total_bytes)
+
+    def test_failover_stays_on_the_relay(self):
+        backup = self.origin.url + '/live/mid/media.m3u8'
+        Channel_Source.objects.create(Link_channel=self.channel, Url=backup, Order=0)
+        url = '/api/channel/next-source/'
+
+        # Root relay playlist plays the best source: the next one is the backup, through the relay
+        response = self.client.get(url, {'channel': self.channel.pk, 'current': f'/relay/{self.channel.pk}/index.m3u8'})
+        self.assertEqual(response.json(), {'url': hls_relay.relay_playlist_url(self.channel.pk, backup), 'exhausted': False})
+
+        current = 'http://testserver' + response.json()['url']
+        response = self.client.get(url, {'channel': self.channel.pk, 'current': current})
+        self.assertEqual(response.json(), {'url': None, 'exhausted': True})
+
+    def test_unsigned_upstream_is_rejected(self):
+        response = self.client.get(f'/relay/{self.channel.pk}/segment', {'u': self.origin.url + '/live/mid/seg10.ts'})
+        self.assertEqual(response.status_code, 404)
+
+
+def media_playlist(segments, sequence=None, ended=False):
+    """Media playlist of (name, duration) segments; no #EXT-X-MEDIA-SEQUENCE when `sequence` is None"""
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:6']
+    if sequence is not None:
+        lines.append(f'#EXT-X-MEDIA-SEQUENCE:{sequence}')
+    for name, duration in segments:
+        lines += [f'#EXTINF:{duration},', name]
+    if ended:
+        lines.append('#EXT-X-ENDLIST')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+class StreamClusterTests(TestCase):
+    # One live feed: segment durations follow the content (scene cuts)
+    LIVE = [5.0, 6.0, 4.2, 5.5, 6.0, 4.8, 5.1, 6.0]
+
+    def live(self, first, count=5, names='seg{}.ts', renumber=0):
+        return [(names.format(first + i + renumber), self.LIVE[(first + i) % len(self.LIVE)]) for i in range(count)]
+
+    def cluster(self, files):
+        origin = FakeHlsOrigin(files)
+        self.addCleanup(origin.close)
+        streams = [{'url': origin.url + path} for path in files]
+        clusters = stream_finder.check_streams_by_cluster(streams)
+        return [sorted(s['url'][len(origin.url):] for s in c['streams']) for c in clusters]
+
+    def test_mirrors_of_one_live_feed_are_clustered(self):
+        clusters = self.cluster({
+            '/a/index.m3u8': media_playlist(self.live(100), sequence=100),
+            '/b/index.m3u8': media_playlist(self.live(101), sequence=101),
+            # Renamed segments: matched by media sequence and durations
+            '/c/index.m3u8': media_playlist(self.live(102, renumber=5000), sequence=102),
+        })
+        self.assertEqual(clusters, [['/a/index.m3u8', '/b/index.m3u8', '/c/index.m3u8']])
+
+    def test_vod_playlists_without_media_sequence_are_separate(self):
+        clusters = self.cluster({
+            '/a/index.m3u8': media_playlist([('a1.ts', 6.0), ('a2.ts', 6.0), ('a3.ts', 3.2)], ended=True),
+            '/b/index.m3u8': media_playlist([('b1.ts', 6.0), ('b2.ts', 5.0), ('b3.ts', 6.0)], ended=True),
+        })
+        self.assertEqual(len(clusters), 2)
+
+    def test_shared_generic_segment_names_are_no_evidence(self):
+        clusters = self.cluster({
+            '/a/index.m3u8': media_playlist([('index0.ts', 6.0), ('index1.ts', 5.0), ('index2.ts', 4.0)], sequence=0),
+            '/b/index.m3u8': media_playlist([('index0.ts', 4.5), ('index1.ts', 6.0), ('index2.ts', 5.2)], sequence=0),
+            # One shared name out of five
+            '/c/index.m3u8': media_playlist([('index2.ts', 4.0)] + self.live(3, 4, names='other{}.ts'), sequence=0),
+        })
+        self.assertEqual(len(clusters), 3)
+
+    def test_distinct_live_feeds_with_close_sequences_are_separate(self):
+        other = [4.0, 4.0, 6.0, 6.0, 5.0, 4.4]
+        clusters = self.cluster({
+            '/a/index.m3u8': media_playlist(self.live(100), sequence=100),
+            '/b/index.m3u8': media_playlist([(f'seg{100 + i}.ts', other[i]) for i in range(5)], sequence=102),
+            # Equal segments prove nothing, even with the same sequence
+            '/c/index.m3u8': media_playlist([(f'p{i}.ts', 6.0) for i in range(5)], sequence=100),
+            '/d/index.m3u8': media_playlist([(f'q{i}.ts', 6.0) for i in range(5)], sequence=100),
+        })
+        self.assertEqual(len(clusters), 4)
+
+    def test_stream_joins_a_cluster_through_any_member(self):
+        clusters = self.cluster({
+            '/a/index.m3u8': media_playlist(self.live(100), sequence=100),
+            '/b/index.m3u8': media_playlist(self.live(102), sequence=102),
+            # Overlaps b by most of its window but a only by one segment
+            '/c/index.m3u8': media_playlist(self.live(104), sequence=104),
+        })
+        self.assertEqual(clusters, [['/a/index.m3u8', '/b/index.m3u8', '/c/index.m3u8']])
+
+    def test_media_sequence_defaults_to_none(self):
+        playlist = stream_finder.parse_media_playlist(media_playlist([('a.ts', 6.0)], ended=True).decode())
+        self.assertIsNone(playlist['media_sequence'])
+        self.assertEqual(playlist['durations'], [6.0])
+        self.assertTrue(playlist['ended'])
+
+
+def html_page(*links):
+    return ('<html><body>' + ''.join(f'<a href="{link}">x</a>' for link in links) + '</body></html>').encode()
+
+
+class CrawlTests(TestCase):
+    def crawl(self, files, **kwargs):
+        origin = FakeHlsOrigin(files)
+        self.addCleanup(origin.close)
+        pages = stream_finder.crawl_site(origin.url + '/', stream_finder.crawl_patterns(None), **kwargs)
+        return origin, [page['url'][len(origin.url):] for page in pages]
+
+    def test_depth_limit(self):
+        _, pages = self.crawl({
+            '/': html_page('/live/a'),
+            '/live/a': html_page('/live/b'),
+            '/live/b': html_page('/live/c'),
+            '/live/c': html_page(),
+        }, max_depth=1)
+        self.assertEqual(pages, ['/', '/live/a'])
+
+    def test_page_budget(self):
+        _, pages = self.crawl({
+            '/': html_page(*[f'/live/{i}' for i in range(5)]),
+            **{f'/live/{i}': html_page() for i in range(5)},
+        }, max_pages=3)
+        self.assertEqual(pages, ['/', '/live/0', '/live/1'])
+
+    def test_only_same_origin_links_matching_a_pattern_are_followed(self):
+        origin, pages = self.crawl({
+            '/': html_page('https://other.example/live/x', '/about', '/live/a', '/live/logo.png', 'mailto:a@b.c'),
+            '/about': html_page(),
+            '/live/a': html_page(),
+        })
+        self.assertEqual(pages, ['/', '/live/a'])
+        self.assertNotIn('/about', origin.hits)
+
+    def test_duplicate_links_are_fetched_once(self):
+        origin, pages = self.crawl({
+            '/': html_page('/live/a', '/live/a/', '/live/a#player', '/'),
+            '/live/a': html_page('/', '/live/a'),
+        })
+        self.assertEqual(pages, ['/', '/live/a'])
+        self.assertEqual(origin.hits, {'/': 1, '/live/a': 1})
+
+    def test_user_patterns_are_plain_substrings(self):
+        [pattern] = stream_finder.crawl_patterns(['/Kenh.1'])
+        self.assertTrue(pattern.search('/xem/kenh.1/hd'))
+        self.assertIsNone(pattern.search('/kenhx1'))
+        # Catastrophic as a regex, harmless as a substring
+        [pattern] = stream_finder.crawl_patterns(['(a+)+$'])
+        self.assertIsNone(pattern.search('a' * 5000 + '!'))
+
+    def test_bad_parameters_are_rejected(self):
+        import json
+        for data in ({'url': 'x', 'patterns': '/live'}, {'url': 'x', 'patterns': ['a' * 101]},
+                     {'url': 'x', 'patterns': ['/x'] * 21}, {'url': 'x', 'patterns': [1]},
+                     {'url': 'x', 'max_depth': 'deep'}, {'url': 'x', 'max_pages': None}, ['x']):
+            response = self.client.post('/stream-finder/crawl/', json.dumps(data), content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+
+    def test_depth_and_budget_are_clamped(self):
+        import json
+        from unittest import mock
+        with mock.patch('sleekweb.views.client.stream_finder.crawl_site', return_value=[]) as crawl_site:
+            self.client.post('/stream-finder/crawl/', json.dumps({'url': 'x', 'max_depth': -3, 'max_pages': 0}),
+                             content_type='application/json')
+            self.client.post('/stream-finder/crawl/', json.dumps({'url': 'x', 'max_depth': 99, 'max_pages': 10 ** 6}),
+                             content_type='application/json')
+        self.assertEqual([(c.kwargs['max_depth'], c.kwargs['max_pages']) for c in crawl_site.call_args_list], [(0, 1), (4, 100)])
+
+
+class StreamRankingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.channel = Channel.objects.create(Name='C1', Key='https://a.example/live.m3u8')
+        for order, url in enumerate(['https://b.example/live.m3u8', 'https://c.example/live.m3u8', 'https://d.example/live.m3u8']):
+            Channel_Source.objects.create(Link_channel=self.channel, Url=url, Order=order)
+
+    def rank(self, metrics):
+        from unittest import mock
+        from .stream_ranking import rank_channel
+        channel = Channel.objects.prefetch_related('sources').get(pk=self.channel.pk)
+        with mock.patch('sleekweb.stream_ranking.measure_source', side_effect=lambda url: metrics[url]):
+            return [url.split('/')[2][0] for url in rank_channel(channel)]
+
+    def test_ranking_weighs_throughput_against_ttfb(self):
+        ranking = self.rank({
+            'https://a.example/live.m3u8': (900, 2000),
+            'https://b.example/live.m3u8': (100, 2000),
+            # Fast to answer but slow to download
+            'https://c.example/live.m3u8': (50, 200),
+            'https://d.example/live.m3u8': (None, None),
+        })
+        self.assertEqual(ranking, ['b', 'a', 'c', 'd'])
+        source = Channel_Source.objects.get(Url='https://d.example/live.m3u8')
+        self.assertFalse(source.Online)
+        self.assertIsNotNone(source.Checked_time)
+        self.assertEqual(Channel_Source.objects.get(Url='https://b.example/live.m3u8').Ttfb, 100)
+
+    def test_equal_scores_keep_admin_order(self):
+        metrics = {f'https://{host}.example/live.m3u8': (None, None) for host in 'dcba'}
+        self.assertEqual(self.rank(metrics), ['a', 'b', 'c', 'd'])
+
+    def test_next_source_fails_over_in_ranking_order(self):
+        from .stream_ranking import next_source
+        self.rank({
+            'https://a.example/live.m3u8': (100, 100),
+            'https://b.example/live.m3u8': (100, 3000),
+            'https://c.example/live.m3u8': (100, 2000),
+            'https://d.example/live.m3u8': (None, None),
+        })
+        channel = Channel.objects.prefetch_related('sources').get(pk=self.channel.pk)
+        self.assertEqual(next_source(channel, 'https://b.example/live.m3u8'), 'https://c.example/live.m3u8')
+        self.assertEqual(next_source(channel, 'https://d.example/live.m3u8'), None)
+        # Unknown current (a Key edited since the page loaded): the best source
+        self.assertEqual(next_source(channel, 'https://old.example/live.m3u8'), 'https://b.example/live.m3u8')
+
+    def test_next_source_api(self):
+        url = '/api/channel/next-source/'
+        # Never ranked: admin order, no probing
+        response = self.client.get(url, {'channel': self.channel.pk, 'current': 'https://a.example/live.m3u8'})
+        self.assertEqual(response.json(), {'url': 'https://b.example/live.m3u8', 'exhausted': False})
+        response = self.client.get(url, {'channel': self.channel.pk, 'current': 'https://d.example/live.m3u8'})
+        self.assertEqual(response.json(), {'url': None, 'exhausted': True})
+        self.assertEqual(self.client.get(url, {'channel': 'abc'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'channel': self.channel.pk + 1}).status_code, 404)
+
+
+class KeyRefreshTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        self.now = timezone.now()
+        self.channel = Channel.objects.create(Name='C1', Key='https://cdn.example/old.m3u8', Source_page='https://site.example/live')
+
+    def refresh(self, candidates, playable=lambda url: True):
+        from unittest import mock
+        from .key_refresh import refresh_due_channels
+        with mock.patch('sleekweb.key_refresh.extract_candidates', return_value=candidates), \
+                mock.patch('sleekweb.key_refresh.stream_finder.fingerprint_hls', side_effect=playable):
+            [(_, new_key)] = refresh_due_channels(force=True)
+        self.channel.refresh_from_db()
+        return new_key
+
+    def test_detect_key_expiry(self):
+        from .key_refresh import detect_key_expiry
+        expires = int(self.now.timestamp()) + 3600
+        self.assertEqual(detect_key_expiry(f'https://cdn/x.m3u8?Expires={expires}', self.now).timestamp(), expires)
+        self.assertEqual(detect_key_expiry(f'https://cdn/x.m3u8?e={expires}000', self.now).timestamp(), expires)
+        self.assertEqual(detect_key_expiry(f'https://cdn/x.m3u8?wsTime={expires:x}', self.now).timestamp(), expires)
+        self.assertEqual(detect_key_expiry(f'https://cdn/x.m3u8?token=abc123-{expires}', self.now).timestamp(), expires)
+        # Too far ahead, in the past or not an epoch at all
+        self.assertIsNone(detect_key_expiry(f'https://cdn/x.m3u8?exp={expires + 90 * 86400}', self.now))
+        self.assertIsNone(detect_key_expiry(f'https://cdn/x.m3u8?exp={expires - 3 * 86400}', self.now))
+        self.assertIsNone(detect_key_expiry('https://cdn/x.m3u8?exp=soon&id=12345', self.now))
+
+    def test_refresh_due(self):
+        from datetime import timedelta
+        from .key_refresh import refresh_due
+        channel = Channel(Source_page='https://site.example/live')
+        self.assertTrue(refresh_due(channel, self.now))
+        channel.Key_expires = self.now + timedelta(minutes=30)
+        self.assertFalse(refresh_due(channel, self.now))
+        channel.Key_expires = self.now + timedelta(minutes=5)
+        self.assertTrue(refresh_due(channel, self.now))
+        channel.Key_expires, channel.Key_refreshed, channel.Refresh_interval = None, self.now - timedelta(minutes=20), 30
+        self.assertFalse(refresh_due(channel, self.now))
+        channel.Refresh_interval = 15
+        self.assertTrue(refresh_due(channel, self.now))
+        channel.Source_page = None
+        self.assertFalse(refresh_due(channel, self.now))
+
+    def test_new_key_is_swapped_in(self):
+        new_key = 'https://cdn.example/new.m3u8'
+        self.assertEqual(self.refresh(['https://cdn.example/dead.m3u8', new_key], playable=lambda url: 'new' in url), new_key)
+        self.assertEqual(self.channel.Key, new_key)
+        self.assertIsNone(self.channel.Refresh_error)
+
+    def test_admin_edit_during_the_scan_wins(self):
+        from unittest import mock
+        from .key_refresh import refresh_due_channels
+
+        def admin_edit(channel):
+            Channel.objects.filter(pk=channel.pk).update(Key='https://cdn.example/admin.m3u8')
+            return ['https://cdn.example/scanned.m3u8']
+
+        with mock.patch('sleekweb.key_refresh.extract_candidates', side_effect=admin_edit), \
+                mock.patch('sleekweb.key_refresh.stream_finder.fingerprint_hls', return_value={'window': 3}):
+            [(_, new_key)] = refresh_due_channels(force=True)
+        self.assertIsNone(new_key)
+        self.channel.refresh_from_db()
+        self.assertEqual(self.channel.Key, 'https://cdn.example/admin.m3u8')
+
+    def test_urls_longer_than_the_key_field_are_skipped(self):
+        too_long = 'https://cdn.example/live.m3u8?token=' + 'a' * 500
+        self.assertIsNone(self.refresh([too_long]))
+        self.assertEqual(self.channel.Key, 'https://cdn.example/old.m3u8')
+        self.assertEqual(self.channel.Refresh_error, 'Không tìm thấy link hợp lệ')
+
+    def test_failing_channel_records_its_error_and_the_others_still_run(self):
+        from unittest import mock
+        from .key_refresh import refresh_due_channels
+        other = Channel.objects.create(Name='C2', Key='https://cdn.example/c2.m3u8', Source_page='https://site.example/c2')
+        with mock.patch('sleekweb.key_refresh.refresh_channel_key', side_effect=[RuntimeError('boom'), 'https://cdn.example/c2-new.m3u8']), \
+                self.assertLogs('sleekweb.key_refresh', 'ERROR'):
+            results = refresh_due_channels(force=True)
+        self.assertEqual([(channel.pk, key) for channel, key in results], [(self.channel.pk, None), (other.pk, 'https://cdn.example/c2-new.m3u8')])
+        self.channel.refresh_from_db()
+        self.assertEqual(self.channel.Refresh_error, 'boom')
+        self.assertIsNotNone(self.channel.Key_refreshed)
+
+    def test_admin_refresh_interval_must_be_a_positive_int(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = f'/admin/channel/edit/{self.channel.pk}/'
+        for bad in ('abc', '0', '-5', '1.5'):
+            self.assertEqual(self.client.post(url, {'Refresh_interval': bad}).status_code, 400)
+        self.client.post(url, {'Refresh_interval': '15'})
+        self.channel.refresh_from_db()
+        self.assertEqual(self.channel.Refresh_interval, 15)
+        self.client.post(url, {'Refresh_interval': ''})
+        self.channel.refresh_from_db()
+        self.assertIsNone(self.channel.Refresh_interval)
+
+
+class HomePageCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        Ads.objects.create(Note='A1', Link='http://ads/a', Count=1)
+
+    def test_second_hit_is_served_from_cache(self):
+        self.assertEqual(self.client.get('/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertContains(response, 'http://ads/a')
+
+    def test_pages_are_cached_per_language(self):
+        self.client.get('/')
+        self.client.cookies['language'] = 'EN'
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/')
+        self.assertGreater(len(queries), 0)
+
+    def test_unknown_languages_share_the_default_entry(self):
+        etag = self.client.get('/')['ETag']
+        for value in ('xx', 'random-1', 'VI' * 50):
+            self.client.cookies['language'] = value
+            with self.assertNumQueries(0):
+                response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        self.client.cookies['language'] = 'en'
+        self.assertNotEqual(self.client.get('/')['ETag'], etag)
+
+    def test_admin_write_invalidates_cache(self):
+        self.client.get('/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ads.objects.create(Note='A2', Link='http://ads/b', Count=2)
+        response = self.client.get('/')
+        self.assertContains(response, 'http://ads/b')
+
+    def test_invalidation_reaches_other_processes(self):
+        from unittest import mock
+        from django.core.cache import caches
+        from django.conf import settings
+        from . import page_cache, content_version
+        # LocMemCache instances in one process share memory, in separate workers they do not
+        self.assertNotIn('locmem', settings.CACHES['default']['BACKEND'])
+        # Separate backend instances, as in two gunicorn workers
+        writer, reader = caches.create_connection('default'), caches.create_connection('default')
+        with mock.patch.object(page_cache, 'cache', reader):
+            before = page_cache.page_version('home')
+        with mock.patch.object(page_cache, 'cache', writer), mock.patch.object(content_version, 'cache', writer):
+            page_cache.invalidate_page('home')
+            content_version.touch(Ads)
+            self.assertTrue(writer.add('page:home:lock', 1, 30))
+        with mock.patch.object(page_cache, 'cache', reader), mock.patch.object(content_version, 'cache', reader):
+            self.assertNotEqual(page_cache.page_version('home'), before)
+            self.assertEqual(content_version.model_versions([Ads])[Ads], writer.get(content_version.version_key(Ads)))
+            self.assertFalse(reader.add('page:home:lock', 1, 30))
+
+
+class ChannelManifestTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.channel = Channel.objects.create(Name='C1', Key='http://cdn/a.m3u8', Count=1, Password='secret')
+
+    def test_manifest_lists_channels_without_secrets(self):
+        channel = self.client.get('/api/channels/manifest.json').json()['channels'][0]
+        self.assertEqual(channel['src'], 'http://cdn/a.m3u8')
+        self.assertEqual(channel['stream_type'], 'url')
+        self.assertIs(channel['password'], True)
+        self.assertNotIn('secret', str(channel))
+
+    def test_channel_edit_only_invalidates_the_manifest(self):
+        home_etag = self.client.get('/')['ETag']
+        manifest_etag = self.client.get('/api/channels/manifest.json')['ETag']
+        self.channel.Key = 'http://cdn/b.m3u8'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.channel.save()
+
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=home_etag).status_code, 304)
+        response = self.client.get('/api/channels/manifest.json', HTTP_IF_NONE_MATCH=manifest_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['channels'][0]['src'], 'http://cdn/b.m3u8')
+
+
+class HomeSnapshotTests(TestCase):
+    def setUp(self):
+        from . import home_snapshot
+        # Sections left pending by earlier tests, rolled back without their commit callbacks
+        home_snapshot._pending.__dict__.pop('sections', None)
+
+    def test_only_the_changed_section_is_rebuilt(self):
+        from .home_snapshot import load_snapshot
+        with self.captureOnCommitCallbacks(execute=True):
+            Channel.objects.create(Name='C1', Key='http://cdn/a.m3u8', Count=1)
+        before = load_snapshot()
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                Ads.objects.create(Note='A1', Link='http://ads', Count=1)
+        after = load_snapshot()
+        self.assertEqual(after.Version, before.Version + 1)
+        self.assertEqual(after.Data['ads'][0]['Link'], 'http://ads')
+        self.assertEqual(after.Data['channels'], before.Data['channels'])
+        self.assertFalse(any('sleekweb_channel' in q['sql'] for q in queries.captured_queries))
+
+    def test_rebuild_waits_for_commit_and_runs_once_per_section(self):
+        from unittest import mock
+        from . import home_snapshot
+        before = home_snapshot.load_snapshot()
+        with mock.patch.object(home_snapshot, 'rebuild_snapshot', wraps=home_snapshot.rebuild_snapshot) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                for n in range(5):
+                    Ads.objects.create(Note=f'A{n}', Link='http://ads', Count=n)
+                Channel.objects.create(Name='C1', Key='http://cdn/a.m3u8', Count=1)
+                # Not committed yet: other workers must not rebuild from rows they cannot see
+                rebuild.assert_not_called()
+        rebuild.assert_called_once_with(['ads', 'channels'])
+        after = home_snapshot.load_snapshot()
+        self.assertEqual(after.Version, before.Version + 1)
+        self.assertEqual(len(after.Data['ads']), 5)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_matching_etag_gets_304_without_rendering(self):
+        response = self.client.get('/')
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            response = self.client.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_admin_write_changes_validators(self):
+        etag = self.client.get('/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Ads.objects.create(Note='A1', Link='http://ads', Count=1)
+            # Not committed: the cached body is still the old one, so is the ETag
+            self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'http://ads')
+
+    def test_content_version_never_moves_back(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .content_version import model_versions, touch
+        now = timezone.now()
+        touch(Ads, now)
+        touch(Ads, now - timedelta(seconds=5))
+        self.assertEqual(model_versions([Ads])[Ads], now)
+
+    def test_workers_touching_at_once_keep_the_newest_version(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.cache import cache, caches
+        from django.utils import timezone
+        from . import content_version
+        now = timezone.now()
+        moments = [now + timedelta(seconds=n) for n in range(8)]
+        real_get = cache.get
+
+        def slow_get(*args, **kwargs):
+            # Widen the read-then-write window
+            value = real_get(*args, **kwargs)
+            threading.Event().wait(0.01)
+            return value
+
+        def worker(moment):
+            with mock.patch.object(content_version, 'cache', caches.create_connection('default')) as own:
+                own.get = slow_get
+                content_version.touch(Ads, moment)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(worker, moments))
+        self.assertEqual(cache.get(content_version.version_key(Ads)), moments[-1])
+
+    def test_etag_depends_on_language(self):
+        etag = self.client.get('/about')['ETag']
+        self.client.cookies['language'] = 'EN'
+        response = self.client.get('/about', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class VideoFeedTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.videos = [Video.objects.create(Title=f'V{n}', Category='GaThuong') for n in range(30)]
+        Video.objects.create(Title='D', Category='GaDao')
+
+    def test_home_inlines_only_the_first_page(self):
+        from .home_snapshot import VIDEO_PAGE_SIZE
+        response = self.client.get('/')
+        self.assertContains(response, 'V29')
+        self.assertNotContains(response, '>V0<')
+        self.assertEqual(response.context['next_Video_GaThuong'], self.videos[-VIDEO_PAGE_SIZE].id)
+
+    def test_keyset_pages_cover_the_feed_once(self):
+        seen = []
+        before = None
+        while True:
+            params = {'category': 'GaThuong', 'limit': 7}
+            if before:
+                params['before'] = before
+            data = self.client.get('/api/videos/', params).json()
+            seen += [video['title'] for video in data['videos']]
+            before = data['next']
+            if not before:
+                break
+        self.assertEqual(seen, [f'V{n}' for n in reversed(range(30))])
+
+    def test_invalid_category_is_rejected(self):
+        self.assertEqual(self.client.get('/api/videos/', {'category': 'x'}).status_code, 400)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        Ads.objects.create(Note='A1', Link='http://ads/a', Count=1)
+
+    def test_negotiates_brotli_then_gzip(self):
+        import gzip
+        from . import compression
+        identity = self.client.get('/').content
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), identity)
+        self.assertLess(len(response.content), len(identity))
+
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        if compression.brotli:
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(compression.brotli.decompress(response.content), identity)
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_cached_page_is_compressed_once(self):
+        from unittest import mock
+        from . import compression
+        self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            for _ in range(3):
+                response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+        compress.assert_not_called()
+
+    @override_settings(COMPRESS_MIN_BYTES=10 ** 6)
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/api/channels/manifest.json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_responses_with_secrets_are_not_compressed(self):
+        from django.http import HttpResponse
+        from .compression import CompressionMiddleware
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        Channel.objects.create(Name='C1', Key='http://cdn/a.m3u8')
+        response = self.client.get('/admin/channel', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        def set_cookie(request):
+            response = HttpResponse(b'x' * 4096, content_type='text/html')
+            response.set_cookie('sessionid', 'secret')
+            return response
+
+        request = self.client.get('/').wsgi_request
+        request.META['HTTP_ACCEPT_ENCODING'] = 'gzip'
+        self.assertFalse(CompressionMiddleware(set_cookie)(request).has_header('Content-Encoding'))
+
+
+class FakeCdnProxy:
+    """
+    Local stand-in for the CDN: caches GETs made through the test client by
+    (path, language cookie) with their surrogate keys, and runs an HTTP purge
+    endpoint that records every purge call and evicts the matching entries
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.entries = {}  # (path, lang) -> (response, keys)
+        self.purges = []
+        self.misses = 0
+        self.lock = threading.Lock()
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                import json
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                proxy.purge(body['keys'], self.headers.get('Authorization'))
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.purge_url = f'http://127.0.0.1:{self.server.server_port}/purge'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def get(self, path):
+        cookie = self.client.cookies.get('language')
+        key = (path, cookie.value if cookie else None)
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key][0]
+        response = self.client.get(path)
+        self.misses += 1
+        if 's-maxage' in response.get('Cache-Control', ''):
+            with self.lock:
+                self.entries[key] = (response, set(response['Surrogate-Key'].split()))
+        return response
+
+    def purge(self, keys, authorization):
+        with self.lock:
+            self.purges.append((keys, authorization))
+            for entry_key, (_, entry_keys) in list(self.entries.items()):
+                if entry_keys & set(keys):
+                    del self.entries[entry_key]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class CdnTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.ads = Ads.objects.create(Note='A1', Link='http://ads/a', Count=1)
+        self.channel = Channel.objects.create(Name='C1', Key='http://cdn/a.m3u8', Count=1)
+        self.proxy = FakeCdnProxy(self.client)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def tearDown(self):
+        self.proxy.close()
+
+    def test_public_views_emit_cache_headers_and_keys(self):
+        response = self.client.get('/')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=', response['Cache-Control'])
+        self.assertIn('max-age=0', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        keys = response['Surrogate-Key'].split()
+        self.assertIn('ads', keys)
+        self.assertIn(f'ads:{self.ads.pk}', keys)
+
+        keys = self.client.get('/api/channels/manifest.json')['Surrogate-Key'].split()
+        self.assertIn(f'channel:{self.channel.pk}', keys)
+
+    @override_settings(CDN_PURGE_DELAY=0, CDN_PURGE_TOKEN='t0k')
+    def test_admin_edit_purges_the_proxy(self):
+        from . import background
+        with self.settings(CDN_PURGE_URL=self.proxy.purge_url):
+            self.proxy.get('/')
+            self.proxy.get('/')
+            self.assertEqual(self.proxy.misses, 1)
+
+            self.client.force_login(self.admin)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/admin/ads/edit/{self.ads.pk}/', {'Link': 'http://ads/new'})
+            self.client.logout()
+            self.assertTrue(background.wait_idle(timeout=5))
+
+        keys, authorization = self.proxy.purges[-1]
+        self.assertIn(f'ads:{self.ads.pk}', keys)
+        self.assertEqual(authorization, 'Bearer t0k')
+        self.assertContains(self.proxy.get('/'), 'http://ads/new')
+        self.assertEqual(self.proxy.misses, 2)
+
+    def test_no_purge_url_sends_nothing(self):
+        from .cdn import purge_queue
+        with self.captureOnCommitCallbacks(execute=True):
+            Ads.objects.create(Note='A2', Count=2)
+        self.assertEqual(purge_queue.pending(), [])
+        self.assertEqual(self.proxy.purges, [])
+
+
+class WarmupTests(TestCase):
+    def test_warm_up_primes_home_and_manifest(self):
+        from django.core.cache import cache
+        from .warmup import warm_up
+        cache.clear()
+        Channel.objects.create(Name='C1', Key='http://cdn/a.m3u8', Count=1)
+        report = warm_up()
+        self.assertEqual([error for _, _, error in report.stages if error], [])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/').status_code, 200)
+            self.assertEqual(self.client.get('/api/channels/manifest.json').status_code, 200)
+
+
+class LazyViewTests(TestCase):
+    def test_every_route_points_at_an_existing_view(self):
+        from django.urls import get_resolver
+        from .lazy_views import LazyView
+        for pattern in get_resolver().url_patterns:
+            for sub in getattr(pattern, 'url_patterns', [pattern]):
+                if isinstance(sub.callback, LazyView):
+                    self.assertTrue(callable(sub.callback.resolve()), sub.callback)
+
+    def test_routing_does_not_import_the_module(self):
+        import sys
+        from django.urls.resolvers import URLPattern, RoutePattern
+        from .lazy_views import LazyView
+        module = 'sleekweb.views.admin.product_admin'
+        sys.modules.pop(module, None)
+        view = LazyView(module, 'product_admin')
+        pattern = URLPattern(RoutePattern('admin/product'), view, name='product_admin')
+        self.assertEqual(pattern.lookup_str, f'{module}.product_admin')
+        self.assertNotIn(module, sys.modules)
+        # The CSRF middleware reads csrf_exempt before calling the view: that loads it
+        self.assertFalse(getattr(view, 'csrf_exempt', False))
+        self.assertIn(module, sys.modules)
+        self.assertTrue(view.loaded)
+
+    def test_csrf_exempt_view_stays_exempt(self):
+        from django.test import Client
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(client.post('/admin/login', {}).status_code, 403)
+        response = client.post('/stream-finder/scan/', '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+MP4_HEAD = b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom'
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT and FILE_UPLOAD_TEMP_DIR in throwaway directories, logged in as a superuser"""
+
+    def setUp(self):
+        import tempfile
+        self.media = tempfile.TemporaryDirectory()
+        self.temp = tempfile.TemporaryDirectory()
+        settings = override_settings(MEDIA_ROOT=self.media.name, FILE_UPLOAD_TEMP_DIR=self.temp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(self.media.cleanup)
+        self.addCleanup(self.temp.cleanup)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def run_deletes_inline(self):
+        """Background file deletions run in the test's transaction: a pool thread would not see it"""
+        from unittest import mock
+        for target, side_effect in (
+            ('sleekweb.storage.background.submit_to', lambda pool, fn, *args: fn(*args)),
+            ('sleekweb.storage.connections.close_all', None),
+        ):
+            patcher = mock.patch(target, side_effect=side_effect)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class StreamingUploadTests(TempMediaMixin, TestCase):
+    def upload(self, body, name='clip.mp4'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post('/admin/video/add', {
+            'Title': 'Clip', 'Category': 'GaDao', 'Video': SimpleUploadedFile(name, body, 'video/mp4'),
+        })
+
+    def test_video_is_hashed_and_moved_into_storage(self):
+        import os
+        import hashlib
+        body = MP4_HEAD + os.urandom(300 * 1024)  # several upload chunks
+        self.assertEqual(self.upload(body).status_code, 302)
+        video = Video.objects.get()
+        self.assertEqual(video.Video_hash, hashlib.sha256(body).hexdigest())
+        self.assertEqual(video.Video_size, len(body))
+        with video.Video.open('rb') as stored:
+            self.assertEqual(stored.read(), body)
+        self.assertEqual(os.listdir(self.temp.name), [])
+
+    def test_non_video_is_rejected_from_its_first_bytes(self):
+        import os
+        response = self.upload(b'<html><script>alert(1)</script>' + b' ' * 100000, name='clip.mp4')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Video.objects.exists())
+        self.assertEqual(os.listdir(self.temp.name), [])
+
+    def test_sniff_container(self):
+        from .uploads import sniff_container
+        self.assertEqual(sniff_container(MP4_HEAD), 'mp4')
+        self.assertEqual(sniff_container(b'\x1a\x45\xdf\xa3\x01'), 'webm')
+        self.assertEqual(sniff_container(b'\x47' + b'\x00' * 187 + b'\x47'), 'ts')
+        self.assertIsNone(sniff_container(b'GIF89a'))
+
+
+@override_settings(VIDEO_TRANSCODE_ON_SAVE=False)
+class ChunkedUploadTests(TempMediaMixin, TestCase):
+    def start(self, body):
+        response = self.client.post('/admin/video/upload/', {
+            'filename': 'match.mp4', 'size': len(body), 'title': 'Match', 'category': 'GaThuong', 'part_size': 1,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_part(self, token, number, data):
+        return self.client.put(f'/admin/video/upload/{token}/part/{number}', data, content_type='application/octet-stream')
+
+    def complete(self, token):
+        """POST complete; the queued assembly is returned, not run (a pool thread would not see the test transaction)"""
+        from unittest import mock
+        queued = []
+        with mock.patch('sleekweb.chunked_uploads.background.submit_to', side_effect=lambda pool, fn, *a: queued.append((pool, a))), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/admin/video/upload/{token}/complete')
+        return response, queued
+
+    def status(self, token):
+        return self.client.get(f'/admin/video/upload/{token}/').json()
+
+    def test_parts_in_any_order_then_complete(self):
+        import os
+        import hashlib
+        from .chunked_uploads import MIN_PART_SIZE
+        body = MP4_HEAD + os.urandom(MIN_PART_SIZE * 2 + 1000)
+        upload = self.start(body)
+        self.assertEqual((upload['part_size'], upload['part_count']), (MIN_PART_SIZE, 3))
+        parts = [body[n * MIN_PART_SIZE:(n + 1) * MIN_PART_SIZE] for n in range(3)]
+
+        self.assertEqual(self.put_part(upload['token'], 2, parts[2]).status_code, 200)
+        self.assertEqual(self.put_part(upload['token'], 0, parts[0]).status_code, 200)
+        # Truncated part (dropped connection) is not recorded
+        self.assertEqual(self.put_part(upload['token'], 1, parts[1][:100]).status_code, 400)
+        status = self.client.get(f'/admin/video/upload/{upload["token"]}/').json()
+        self.assertEqual((status['received'], status['missing']), ([0, 2], [1]))
+        self.assertEqual(self.complete(upload['token'])[0].status_code, 409)
+
+        self.put_part(upload['token'], 1, parts[1])
+        response, queued = self.complete(upload['token'])
+        self.assertEqual((response.status_code, response.json()), (202, {'status': 'assembling', 'video': None}))
+        self.assertEqual(len(queued), 1)
+        self.assertEqual((self.status(upload['token'])['status'], Video.objects.count()), ('assembling', 0))
+        # Parts are frozen and a second complete queues nothing
+        self.assertEqual(self.put_part(upload['token'], 1, parts[1]).status_code, 409)
+        self.assertEqual(self.complete(upload['token'])[1], [])
+
+        from .chunked_uploads import finalize
+        pool, args = queued[0]
+        self.assertEqual(pool, 'upload')
+        with self.captureOnCommitCallbacks(execute=True):
+            finalize(*args)
+        status = self.status(upload['token'])
+        self.assertEqual(status['status'], 'ready')
+        response = self.complete(upload['token'])[0]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['video'], status['video'])
+        video = Video.objects.get(pk=response.json()['video'])
+        self.assertEqual((video.Title, video.Category, video.Video_size), ('Match', 'GaThuong', len(body)))
+        self.assertEqual(video.Video_hash, hashlib.sha256(body).hexdigest())
+        with video.Video.open('rb') as stored:
+            self.assertEqual(stored.read(), body)
+        # Finalizing twice returns the same row
+        again, queued = self.complete(upload['token'])
+        self.assertEqual((again.json()['video'], queued), (video.pk, []))
+        self.assertEqual(Video.objects.count(), 1)
+
+    def test_assembly_runs_outside_the_transaction_and_can_be_retried(self):
+        import os
+        from unittest import mock
+        from .chunked_uploads import finalize, assemble, part_path
+        upload = self.start(MP4_HEAD * 10)
+        self.put_part(upload['token'], 0, MP4_HEAD * 10)
+        session = Upload_Session.objects.get()
+        response, queued = self.complete(upload['token'])
+
+        # A part lost before the job ran: the session fails and can be completed again
+        os.rename(part_path(session, 0), part_path(session, 0) + '.bak')
+        with self.assertLogs('sleekweb.chunked_uploads', 'ERROR'):
+            self.assertIsNone(finalize(*queued[0][1]))
+        status = self.status(upload['token'])
+        self.assertEqual((status['status'], status['video']), ('failed', None))
+        self.assertTrue(status['error'])
+        os.rename(part_path(session, 0) + '.bak', part_path(session, 0))
+        response, queued = self.complete(upload['token'])
+        self.assertEqual((response.status_code, len(queued)), (202, 1))
+
+        # The copy and hash hold no transaction (and so no row lock)
+        depth = len(connection.savepoint_ids)
+        depths = []
+
+        def tracked(session):
+            depths.append(len(connection.savepoint_ids))
+            return assemble(session)
+
+        with mock.patch('sleekweb.chunked_uploads.assemble', side_effect=tracked), \
+                self.captureOnCommitCallbacks(execute=True):
+            video = finalize(*queued[0][1])
+        self.assertEqual(depths, [depth])
+        status = self.status(upload['token'])
+        self.assertEqual((status['status'], status['video'], status['error']), ('ready', video.pk, None))
+
+    def test_non_video_first_part_is_rejected(self):
+        upload = self.start(b'x' * 5000)
+        self.assertEqual(self.put_part(upload['token'], 0, b'x' * 5000).status_code, 415)
+
+    def test_stale_sessions_are_collected(self):
+        import os
+        from datetime import timedelta
+        from django.utils import timezone
+        from .chunked_uploads import collect_stale, session_dir
+        upload = self.start(MP4_HEAD)
+        self.put_part(upload['token'], 0, MP4_HEAD)
+        session = Upload_Session.objects.get()
+        self.assertEqual(collect_stale(), (0, 0))
+        Upload_Session.objects.update(Update_time=timezone.now() - timedelta(days=2))
+        self.assertEqual(collect_stale()[0], 1)
+        self.assertFalse(Upload_Session.objects.exists())
+        self.assertFalse(os.path.exists(session_dir(session)))
+
+
+class StubTranscoder:
+    """VIDEO_TRANSCODER for tests: writes tiny playlists instead of running ffmpeg"""
+    calls = []
+    fail = False
+
+    def hls(self, source, output_dir, renditions):
+        import os
+        StubTranscoder.calls.append(source)
+        if StubTranscoder.fail:
+            from .transcoding import TranscodeError
+            raise TranscodeError('ffmpeg exited 1: broken input')
+        variants = []
+        for name, height, video_kbps, audio_kbps in renditions[-2:]:
+            os.makedirs(os.path.join(output_dir, name))
+            with open(os.path.join(output_dir, name, 'index.m3u8'), 'w') as playlist:
+                playlist.write('#EXTM3U\n#EXTINF:6,\nseg_00000.ts\n#EXT-X-ENDLIST\n')
+            variants.append({'playlist': f'{name}/index.m3u8', 'bandwidth': (video_kbps + audio_kbps) * 1000,
+                             'resolution': f'{height * 16 // 9}x{height}'})
+        return variants
+
+    def poster(self, source, output_path):
+        with open(output_path, 'wb') as poster:
+            poster.write(b'\xff\xd8\xff\xe0poster')
+
+
+@override_settings(VIDEO_TRANSCODER='sleekweb.tests.StubTranscoder', IMAGE_VARIANTS_ON_SAVE=False)
+class TranscodeTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        from unittest import mock
+        from .transcoding import run_job
+        super().setUp()
+        StubTranscoder.calls, StubTranscoder.fail = [], False
+        # Run the background job inline: a pool thread would not see the test transaction
+        patcher = mock.patch('sleekweb.transcoding.background.submit_to', side_effect=lambda pool, fn, job_id: run_job(job_id))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/video/add', {
+                'Title': 'Clip', 'Category': 'GaDao', 'Video': SimpleUploadedFile('clip.mp4', MP4_HEAD * 40, 'video/mp4'),
+            })
+        return Video.objects.get()
+
+    def test_upload_is_transcoded_to_hls_with_poster(self):
+        from django.core.files.storage import default_storage
+        video = self.upload()
+        job = Transcode_Job.objects.get()
+        self.assertEqual((job.Status, job.Attempts, job.Source), ('ready', 1, video.Video.name))
+        self.assertEqual(StubTranscoder.calls, [video.Video.path])
+        self.assertEqual(video.Hls, f'Video_Hls/{video.pk}/{job.pk}/master.m3u8')
+        with default_storage.open(video.Hls) as master:
+            lines = master.read().decode().splitlines()
+        self.assertEqual(lines[0], '#EXTM3U')
+        self.assertEqual([line for line in lines if not line.startswith('#')], ['480p/index.m3u8', '360p/index.m3u8'])
+        self.assertTrue(default_storage.exists(f'Video_Hls/{video.pk}/{job.pk}/360p/index.m3u8'))
+        self.assertTrue(video.Avatar.name.endswith('.jpg'))
+
+        # The page and the feed switch to HLS, the MP4 stays as fallback
+        feed = self.client.get('/api/videos/', {'category': 'GaDao'}).json()['videos'][0]
+        self.assertEqual(feed['hls'], default_storage.url(video.Hls))
+        self.assertEqual(feed['src'], video.Video.url)
+        self.assertContains(self.client.get('/'), f'data-hls="{default_storage.url(video.Hls)}"')
+
+    def test_saving_without_a_new_file_does_not_transcode_again(self):
+        video = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/admin/video/edit/{video.pk}/', {'Title': 'Renamed'})
+        self.assertEqual(Transcode_Job.objects.count(), 1)
+        self.assertEqual(len(StubTranscoder.calls), 1)
+
+    def test_failure_is_recorded_and_keeps_the_mp4(self):
+        from .transcoding import run_pending
+        StubTranscoder.fail = True
+        with self.assertLogs('sleekweb.transcoding', 'ERROR'):
+            video = self.upload()
+        job = Transcode_Job.objects.get()
+        self.assertEqual(job.Status, 'failed')
+        self.assertIn('broken input', job.Error)
+        self.assertIsNone(video.Hls)
+        self.assertFalse(video.Avatar)
+
+        StubTranscoder.fail = False
+        self.assertEqual(run_pending(), [])
+        self.assertEqual(run_pending(retry_failed=True), [job.pk])
+        job.refresh_from_db()
+        self.assertEqual((job.Status, job.Attempts), ('ready', 2))
+
+
+def png_bytes(width, height, mode='RGB'):
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height), (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_VARIANT_WIDTHS=(160, 640), IMAGE_VARIANT_MAX_WIDTH=1000)
+class ImageVariantTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        super().setUp()
+        cache.clear()
+
+    def banner(self, width=1600, height=400, mode='RGB'):
+        from django.core.files.base import ContentFile
+        ads = Ads(Note='A1', Link='http://ads/a', Count=1)
+        ads.Banner.save('banner.png', ContentFile(png_bytes(width, height, mode)), save=False)
+        with self.captureOnCommitCallbacks(execute=False):
+            ads.save()
+        return ads
+
+    def test_variants_are_resized_and_content_hashed(self):
+        from PIL import Image
+        from django.core.files.storage import default_storage
+        import os
+        from .image_variants import ensure
+        ads = self.banner()
+        stem = os.path.splitext(os.path.basename(ads.Banner.name))[0]
+        manifest = ensure(ads.Banner.name)
+        self.assertEqual([w for w, _ in manifest['variants']['webp']], [160, 640, 1000])
+        self.assertEqual([w for w, _ in manifest['variants']['jpg']], [160, 640, 1000])
+        name = manifest['variants']['webp'][1][1]
+        self.assertEqual(name, f'{os.path.dirname(ads.Banner.name)}/_variants/{stem}.{manifest["hash"]}.640.webp')
+        with Image.open(default_storage.path(name)) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (640, 160)))
+        # Second call reads the manifest instead of re-encoding
+        self.assertEqual(ensure(ads.Banner.name), manifest)
+
+    def test_transparent_images_get_no_jpeg(self):
+        from .image_variants import ensure
+        manifest = ensure(self.banner(mode='RGBA').Banner.name)
+        self.assertEqual(manifest['variants']['jpg'], [])
+        self.assertEqual(len(manifest['variants']['webp']), 3)
+
+    def test_lazy_url_generates_on_first_request(self):
+        from django.core.files.storage import default_storage
+        from .image_variants import load_manifest
+        ads = self.banner()
+        response = self.client.get('/')
+        self.assertContains(response, f'/img/640/webp/{ads.Banner.name} 640w')
+        self.assertIsNone(load_manifest(ads.Banner.name))
+
+        response = self.client.get(f'/img/300/webp/{ads.Banner.name}')
+        self.assertEqual(response.status_code, 302)
+        self.assertRegex(response['Location'], r'/_variants/[0-9a-f]{64}\.[0-9a-f]{12}\.640\.webp$')
+        self.assertTrue(default_storage.exists(load_manifest(ads.Banner.name)['variants']['webp'][1][1]))
+
+        self.assertEqual(self.client.get(f'/img/300/gif/{ads.Banner.name}').status_code, 404)
+        self.assertEqual(self.client.get('/img/300/webp/ADS_Daga/../../secret.png').status_code, 404)
+        self.assertEqual(self.client.get('/img/300/webp/Video_Daga/missing.png').status_code, 404)
+        self.assertEqual(self.client.get('/img/300/webp/sleeksoft/settings.py').status_code, 404)
+
+    def test_upload_builds_variants_after_commit(self):
+        import os
+        from unittest import mock
+        with mock.patch('sleekweb.signals.background.submit', side_effect=lambda fn, *a: fn(*a)), \
+                mock.patch('sleekweb.image_variants.connections.close_all'):
+            ads = self.banner()
+            with self.captureOnCommitCallbacks(execute=True):
+                ads.save()
+        self.assertContains(self.client.get('/'), f'/upload/{os.path.dirname(ads.Banner.name)}/_variants/')
+        self.assertNotContains(self.client.get('/'), '/img/')
+
+
+def gif_bytes(width, height, frames=4):
+    import io
+    import random
+    from PIL import Image
+    # Noise: GIF cannot compress it, so the WebP comes out smaller
+    noise = random.Random(1)
+    images = [Image.frombytes('L', (width, height), bytes(noise.randrange(256) for _ in range(width * height))).convert('P')
+              for _ in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, 'GIF', save_all=True, append_images=images[1:], duration=[50, 60, 70, 80][:frames], loop=0)
+    return buffer.getvalue()
+
+
+class StubAnimationEncoder:
+    """ANIMATION_VIDEO_ENCODER for tests: a few bytes instead of running ffmpeg"""
+    def mp4(self, source, output_path, width):
+        with open(output_path, 'wb') as video:
+            video.write(b'\x00\x00\x00\x18ftypmp42')
+
+
+@override_settings(IMAGE_VARIANTS_ON_SAVE=False, IMAGE_VARIANT_MAX_WIDTH=100)
+class AnimatedImageTests(TempMediaMixin, TestCase):
+    def animation(self):
+        from django.core.files.base import ContentFile
+        image = Animation_Image()
+        image.Image.save('a.gif', ContentFile(gif_bytes(120, 80)), save=False)
+        image.save()
+        return image
+
+    def test_gif_gets_a_smaller_animated_webp(self):
+        import os
+        from PIL import Image
+        from django.core.files.storage import default_storage
+        from .image_variants import ensure, image_info
+        image = self.animation()
+        manifest = ensure(image.Image.name)
+        [[width, webp]] = manifest['variants']['webp']
+        self.assertEqual(manifest['variants']['jpg'], [])
+        with Image.open(default_storage.path(webp)) as converted:
+            self.assertEqual((converted.format, converted.size, converted.n_frames), ('WEBP', (100, 67), 4))
+        sizes = manifest['animation']
+        self.assertEqual(sizes['source'], os.path.getsize(image.Image.path))
+        self.assertLess(sizes['webp'], sizes['source'])
+        self.assertNotIn('mp4', sizes)
+        # The GIF stays as the <img> fallback
+        info = image_info(image.Image)
+        self.assertEqual(info['url'], image.Image.url)
+        self.assertEqual(info['webp_srcset'], f'{default_storage.url(webp)} 100w')
+        self.assertNotIn('mp4', info)
+
+    @override_settings(ANIMATION_VIDEO_ENCODER='sleekweb.tests.StubAnimationEncoder')
+    def test_smallest_encoding_is_served_and_reported(self):
+        import io
+        from django.core.cache import cache
+        from django.core.management import call_command
+        from django.core.files.storage import default_storage
+        from unittest import mock
+        from .image_variants import ensure, discard_variants, generate_for_instance
+        cache.clear()
+        image = self.animation()
+        # The upload job hands the encode to the 'animation' pool, which saves the row again so home picks it up
+        with mock.patch('sleekweb.image_variants.connections.close_all'), \
+                mock.patch('sleekweb.image_variants.background.submit_to', side_effect=lambda pool, fn, *a: fn(*a)) as submit_to:
+            generate_for_instance(Animation_Image, image.pk)
+        self.assertEqual(submit_to.call_args.args[0], 'animation')
+        manifest = ensure(image.Image.name)
+        mp4 = manifest['video'][1]
+        self.assertTrue(mp4.endswith('.100.mp4'))
+        self.assertContains(self.client.get('/'), f'<video autoplay muted loop playsinline src="{default_storage.url(mp4)}"')
+
+        out = io.StringIO()
+        call_command('report_animations', stdout=out)
+        saved = manifest['animation']['source'] - manifest['animation']['mp4']
+        self.assertIn('1 ảnh động', out.getvalue())
+        self.assertIn(f'tiết kiệm {saved} byte', out.getvalue())
+
+        discard_variants(image.Image.name, default_storage.delete_now)
+        self.assertFalse(default_storage.exists(mp4))
+
+
+    @override_settings(IMAGE_VARIANT_MAX_WIDTH=200)
+    def test_webp_at_source_width_keeps_every_frame(self):
+        from PIL import Image, ImageSequence
+        from django.core.files.storage import default_storage
+        from .image_variants import ensure
+        [[width, webp]] = ensure(self.animation().Image.name)['variants']['webp']
+        self.assertEqual(width, 120)
+        with Image.open(default_storage.path(webp)) as converted:
+            self.assertEqual((converted.size, converted.n_frames), ((120, 80), 4))
+            durations = []
+            for frame in ImageSequence.Iterator(converted):
+                # WebP frames read their duration on load
+                frame.load()
+                durations.append(frame.info['duration'])
+        self.assertEqual(durations, [50, 60, 70, 80])
+
+    @override_settings(ANIMATION_MAX_PIXELS=100 * 67 * 3)
+    def test_resize_over_the_memory_budget_is_skipped(self):
+        from .image_variants import ensure
+        manifest = ensure(self.animation().Image.name)
+        self.assertEqual(manifest['variants']['webp'], [])
+        self.assertNotIn('webp', manifest['animation'])
+
+    def test_image_url_does_not_encode_in_the_request(self):
+        from django.core.files.storage import default_storage
+        from .image_variants import load_manifest
+        image = self.animation()
+        response = self.client.get(f'/img/100/webp/{image.Image.name}')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], default_storage.url(image.Image.name))
+        self.assertNotIn('max-age', response.get('Cache-Control', ''))
+        self.assertIsNone(load_manifest(image.Image.name))
+
+
+def xlsx_file(rows, name='import.xlsx'):
+    import io
+    from openpyxl import Workbook
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+@override_settings(IMAGE_VARIANTS_ON_SAVE=False, VIDEO_TRANSCODE_ON_SAVE=False)
+class CatalogImportTests(TempMediaMixin, TestCase):
+    def test_products_get_batched_unique_slugs(self):
+        from .catalog_import import import_xlsx
+        self.assertEqual([Product.objects.create(Title='Ga Da').Slug for _ in range(2)], ['ga-da', 'ga-da-1'])
+        Product.objects.create(Title='Ga Da', Slug='ga-da-7')
+        upload = xlsx_file([
+            ('Tiêu đề', 'Slug', 'Ghi chú'),
+            ('Ga Da', None, 'x'),
+            ('Ga Da', None, None),
+            (None, None, None),
+            ('Khac', None, None),
+            ('Trung', 'ga-da', None),
+            ('Sai', 'not a slug', None),
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            result = import_xlsx('product', upload, batch_size=2)
+        self.assertEqual(result.created, 3)
+        self.assertEqual([number for number, _ in result.errors], [6, 7])
+        self.assertIn('ga-da', result.errors[0][1])
+        self.assertEqual(
+            list(Product.objects.filter(Title__in=['Ga Da', 'Khac']).values_list('Slug', flat=True)),
+            ['ga-da', 'ga-da-1', 'ga-da-7', 'ga-da-8', 'ga-da-9', 'khac'],
+        )
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "sleekweb_product"')]
+        self.assertEqual(len(inserts), 2)
+
+    def test_admin_imports_videos_and_reports_bad_rows(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        name = default_storage.save('Video_Daga/a.mp4', ContentFile(MP4_HEAD))
+        upload = xlsx_file([
+            ('Title', 'Danh mục', 'Video'),
+            ('V1', 'GaDao', name),
+            ('V2', 'GaMoi', name),
+            ('V3', 'GaThuong', 'Video_Daga/missing.mp4'),
+            ('V4', 'GaThuong', '../../etc/passwd'),
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/import/video', {'File': upload})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['created'], data['error_count']), (1, 3))
+        self.assertEqual([error['row'] for error in data['errors']], [3, 4, 5])
+        self.assertIn('Category', data['errors'][0]['error'])
+        video = Video.objects.get()
+        self.assertEqual((video.Title, video.Video.name, video.Video_size), ('V1', name, len(MP4_HEAD)))
+        self.assertEqual(Media_Blob.objects.get(Name=name).References, 1)
+        # bulk_create sends no post_save: the transcode job is still recorded
+        self.assertTrue(Transcode_Job.objects.filter(Link_video=video, Source=name).exists())
+
+    def test_rejects_files_that_are_not_xlsx(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        response = self.client.post('/admin/import/product', {'File': SimpleUploadedFile('a.xlsx', b'not a zip')})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/admin/import/channel', {'File': xlsx_file([('Title',)])}).status_code, 404)
+        self.assertFalse(Product.objects.exists())
+
+
+@override_settings(IMAGE_VARIANTS_ON_SAVE=False, MEDIA_BLOB_GRACE_SECONDS=0)
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+    def post_banner(self, url, content, **fields):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'Note': 'A', 'Link': 'http://ads', 'Banner': SimpleUploadedFile('b.png', content, 'image/png'), **fields})
+
+    def test_identical_uploads_share_one_blob(self):
+        import os
+        from .storage import is_blob
+        for _ in range(3):
+            self.post_banner('/admin/ads/add', png_bytes(40, 20))
+        names = set(Ads.objects.values_list('Banner', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_blob(name))
+        self.assertEqual(Media_Blob.objects.get(Name=name).References, 3)
+        self.assertEqual(len(os.listdir(os.path.dirname(os.path.join(self.media.name, name)))), 1)
+
+    def test_blob_is_deleted_with_its_last_reference(self):
+        from django.core.files.storage import default_storage
+        self.run_deletes_inline()
+        self.post_banner('/admin/ads/add', png_bytes(40, 20))
+        self.post_banner('/admin/ads/add', png_bytes(40, 20))
+        first, second = Ads.objects.order_by('id')
+        shared = first.Banner.name
+
+        # The edit view deletes the old file before saving the new one: the other row still shows it
+        self.post_banner(f'/admin/ads/edit/{first.pk}/', png_bytes(50, 20))
+        self.assertTrue(default_storage.exists(shared))
+        self.assertEqual(Media_Blob.objects.get(Name=shared).References, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(shared))
+        self.assertFalse(Media_Blob.objects.filter(Name=shared).exists())
+        first.refresh_from_db()
+        self.assertTrue(default_storage.exists(first.Banner.name))
+
+    def test_existing_content_is_not_written_again(self):
+        from unittest import mock
+        from django.core.files.storage import FileSystemStorage
+        self.post_banner('/admin/ads/add', png_bytes(40, 20))
+        with mock.patch.object(FileSystemStorage, '_save', side_effect=AssertionError('written twice')):
+            self.post_banner('/admin/ads/add', png_bytes(40, 20))
+        self.assertEqual(Ads.objects.count(), 2)
+
+    def test_blob_saved_again_from_another_process_is_not_removed(self):
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from .storage import ContentAddressedStorage
+        self.post_banner('/admin/ads/add', png_bytes(40, 20))
+        ads = Ads.objects.get()
+        name = ads.Banner.name
+        queued = []
+        with mock.patch('sleekweb.storage.background.submit_to', side_effect=lambda pool, fn, *a: queued.append((fn, a))):
+            with self.captureOnCommitCallbacks(execute=True):
+                ads.delete()
+        [(remove, args)] = queued
+
+        def saved_elsewhere():
+            # Another worker saves the same content; its save cannot cancel this process's queue
+            saved = default_storage.save('ADS_Daga/again.png', ContentFile(png_bytes(40, 20)))
+            ContentAddressedStorage._queued.add(name)
+            return saved
+
+        with mock.patch('sleekweb.storage.connections.close_all'):
+            with override_settings(MEDIA_BLOB_GRACE_SECONDS=60):
+                self.assertEqual(saved_elsewhere(), name)
+                remove(*args)
+            self.assertTrue(default_storage.exists(name))
+
+            # ... and references it before the job runs
+            saved_elsewhere()
+            Ads.objects.create(Note='B', Banner=name)
+            remove(*args)
+            self.assertTrue(default_storage.exists(name))
+            self.assertEqual(Media_Blob.objects.get(Name=name).References, 1)
+
+            # Removed for good: saving the content again writes the file and the row again
+            Ads.objects.all().delete()
+            self.assertTrue(default_storage.remove_blob(name))
+            self.assertFalse(default_storage.exists(name))
+            default_storage.save('ADS_Daga/again.png', ContentFile(png_bytes(40, 20)))
+            self.assertTrue(default_storage.exists(name))
+            self.assertTrue(Media_Blob.objects.filter(Name=name).exists())
+
+    def test_removal_does_not_hold_the_queue_lock(self):
+        from unittest import mock
+        from .storage import ContentAddressedStorage
+        self.post_banner('/admin/ads/add', png_bytes(40, 20))
+        ads = Ads.objects.get()
+        held = []
+        real_remove_blob = ContentAddressedStorage.remove_blob
+
+        def remove_blob(storage, name):
+            # Uploads and deletes of other files take this lock
+            held.append(ContentAddressedStorage._queued_lock.locked())
+            return real_remove_blob(storage, name)
+
+        self.run_deletes_inline()
+        with mock.patch.object(ContentAddressedStorage, 'remove_blob', remove_blob):
+            with self.captureOnCommitCallbacks(execute=True):
+                ads.delete()
+        self.assertEqual(held, [False])
+
+    def test_same_new_content_saved_by_two_processes_shares_one_row(self):
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage, default_storage
+        from .storage import blob_name, content_hash
+        content = ContentFile(png_bytes(30, 30))
+        name = blob_name(content_hash(content), '.png')
+        real_save = FileSystemStorage._save
+
+        def racing_save(storage, saved_name, file):
+            # The other process inserts the row while this one writes the file
+            Media_Blob.objects.create(Name=name, Hash=name, References=1)
+            return real_save(storage, saved_name, file)
+
+        with mock.patch.object(FileSystemStorage, '_save', racing_save):
+            self.assertEqual(default_storage.save('ADS_Daga/b.png', content), name)
+        blob = Media_Blob.objects.get(Name=name)
+        self.assertEqual(blob.References, 1)
+        self.assertTrue(default_storage.exists(name))
+
+
+class MediaDeletionTests(TempMediaMixin, TestCase):
+    def write(self, name, body=b'x', age=0):
+        import os
+        import time
+        path = os.path.join(self.media.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        if age:
+            os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_replaced_file_is_removed_in_the_background_after_commit(self):
+        import os
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        old = self.write('Video_Daga/old.png')
+        video = Video.objects.create(Title='V', Avatar='Video_Daga/old.png')
+        queued = []
+        with mock.patch('sleekweb.storage.background.submit_to', side_effect=lambda pool, fn, *a: queued.append((pool, fn, a))):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                self.client.post(f'/admin/video/edit/{video.pk}/', {'Avatar': SimpleUploadedFile('new.png', png_bytes(8, 8), 'image/png')})
+            self.assertEqual(queued, [])
+            for callback in callbacks:
+                callback()
+        self.assertTrue(os.path.exists(old))
+        deletions = [(fn, args) for pool, fn, args in queued if pool == 'delete']
+        self.assertEqual(len(deletions), 1)
+        fn, args = deletions[0]
+        fn(*args)
+        self.assertFalse(os.path.exists(old))
+
+    def test_gc_removes_only_unreferenced_old_files(self):
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        day = 2 * 24 * 3600
+        Ads.objects.create(Note='A', Banner='ADS_Daga/kept.png')
+        Video.objects.create(Title='V', Hls='Video_Hls/1/2/master.m3u8')
+        kept = [
+            self.write('ADS_Daga/kept.png', age=day),
+            self.write('ADS_Daga/_variants/kept.json', b'{"source": "ADS_Daga/kept.png"}', age=day),
+            self.write('ADS_Daga/_variants/kept.0123456789ab.320.webp', age=day),
+            self.write('Video_Hls/1/2/720p/seg_00000.ts', age=day),
+            self.write('CKeditor/2024/inline.png', age=day),
+            self.write('ADS_Daga/just-uploaded.png'),
+        ]
+        orphans = [
+            self.write('ADS_Daga/orphan.png', age=day),
+            self.write('ADS_Daga/_variants/orphan.0123456789ab.320.webp', age=day),
+            self.write('Video_Hls/1/1/720p/seg_00000.ts', age=day),
+        ]
+        out = StringIO()
+        call_command('gc_media', '--dry-run', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        self.assertTrue(all(os.path.exists(path) for path in orphans))
+
+        call_command('gc_media', stdout=StringIO())
+        self.assertFalse(any(os.path.exists(path) for path in orphans))
+        self.assertTrue(all(os.path.exists(path) for path in kept))
+
+    def test_gc_skips_a_blob_adopted_after_the_scan(self):
+        import os
+        import time
+        from datetime import timedelta
+        from django.utils import timezone
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from .media_gc import find_orphans, remove_orphan
+        day = 2 * 24 * 3600
+        name = default_storage.save('ADS_Daga/a.png', ContentFile(png_bytes(8, 8)))
+        Media_Blob.objects.filter(Name=name).update(Update_time=timezone.now() - timedelta(days=2))
+        os.utime(default_storage.path(name), (time.time() - day, time.time() - day))
+        self.assertIn(name, [found for found, _ in find_orphans(min_age=day // 2)])
+
+        # Uploaded again between the scan and the unlink
+        self.assertEqual(default_storage.save('ADS_Daga/b.png', ContentFile(png_bytes(8, 8))), name)
+        self.assertGreater(os.path.getmtime(default_storage.path(name)), time.time() - 60)
+        self.assertFalse(remove_orphan(name, min_age=day // 2))
+        Ads.objects.create(Note='A', Banner=name)
+        Media_Blob.objects.filter(Name=name).update(Update_time=timezone.now() - timedelta(days=2))
+        os.utime(default_storage.path(name), (time.time() - day, time.time() - day))
+        self.assertFalse(remove_orphan(name, min_age=day // 2))
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(Media_Blob.objects.get(Name=name).References, 1)
+
+        Ads.objects.all().delete()
+        Media_Blob.objects.filter(Name=name).update(References=0, Update_time=timezone.now() - timedelta(days=2))
+        self.assertTrue(remove_orphan(name, min_age=day // 2))
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(Media_Blob.objects.filter(Name=name).exists())
+
+
+@override_settings(IMAGE_VARIANTS_ON_SAVE=False, IMAGE_INGEST_MAX_WIDTH=100, MEDIA_BLOB_GRACE_SECONDS=0)
+class OddsImageIngestTests(TempMediaMixin, TestCase):
+    def images(self, *sizes):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return [SimpleUploadedFile(f'{n}.png', png_bytes(*size), 'image/png') for n, size in enumerate(sizes)]
+
+    def post(self, url, images):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {'Category': 'O1', 'Describe': 'D', 'List_Image': images})
+
+    def test_add_validates_resizes_and_bulk_inserts(self):
+        from PIL import Image
+        self.post('/admin/odds/add', self.images((40, 20), (300, 60), (41, 20)))
+        odds = Odds.objects.get()
+        rows = list(odds.images.all())
+        self.assertEqual(len(rows), 3)
+        with Image.open(rows[1].Image.path) as image:
+            self.assertEqual(image.size, (100, 20))
+        self.assertEqual(Media_Blob.objects.get(Name=rows[0].Image.name).References, 1)
+        self.assertContains(self.client.get('/'), rows[2].Image.url)
+
+    def test_edit_keeps_unchanged_images(self):
+        from django.core.files.storage import default_storage
+        self.run_deletes_inline()
+        self.post('/admin/odds/add', self.images((40, 20), (50, 20)))
+        odds = Odds.objects.get()
+        kept, dropped = odds.images.all()
+
+        self.post(f'/admin/odds/edit/{odds.pk}/', self.images((40, 20), (60, 20)))
+        rows = list(odds.images.all())
+        self.assertEqual(len(rows), 2)
+        self.assertEqual((rows[0].pk, rows[0].Image.name), (kept.pk, kept.Image.name))
+        self.assertNotEqual(rows[1].pk, dropped.pk)
+        self.assertFalse(default_storage.exists(dropped.Image.name))
+        self.assertTrue(default_storage.exists(kept.Image.name))
+
+    def test_invalid_image_rejects_the_whole_batch(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        images = self.images((40, 20)) + [SimpleUploadedFile('bad.png', b'not an image', 'image/png')]
+        response = self.post('/admin/odds/add', images)
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(response, 'bad.png', status_code=400)
+        self.assertFalse(Odds.objects.exists())
+
+
+class MediaServingTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        import os
+        super().setUp()
+        self.body = bytes(range(256)) * 4
+        os.makedirs(os.path.join(self.media.name, 'Video_Daga'))
+        with open(os.path.join(self.media.name, 'Video_Daga', 'clip.mp4'), 'wb') as f:
+            f.write(self.body)
+
+    def get(self, **headers):
+        response = self.client.get('/upload/Video_Daga/clip.mp4', **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_whole_file_with_validators(self):
+        response, content = self.get()
+        self.assertEqual((response.status_code, content), (200, self.body))
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])[0].status_code, 304)
+
+    def test_single_and_suffix_ranges(self):
+        response, content = self.get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual((response.status_code, content), (206, self.body[100:200]))
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+        self.assertEqual(response['Content-Length'], '100')
+
+        response, content = self.get(HTTP_RANGE='bytes=-24')
+        self.assertEqual((response.status_code, content), (206, self.body[-24:]))
+        response, content = self.get(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+
+        response, _ = self.get(HTTP_RANGE='bytes=5000-6000')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */1024'))
+
+    def test_multiple_ranges_are_multipart(self):
+        response, content = self.get(HTTP_RANGE='bytes=0-9, 500-509')
+        self.assertEqual(response.status_code, 206)
+        boundary = response['Content-Type'].split('boundary=')[1]
+        self.assertEqual(int(response['Content-Length']), len(content))
+        parts = [part for part in content.split(f'--{boundary}'.encode())[1:-1]]
+        self.assertEqual(len(parts), 2)
+        self.assertIn(b'Content-Range: bytes 500-509/1024', parts[1])
+        self.assertTrue(parts[1].endswith(b'\r\n\r\n' + self.body[500:510] + b'\r\n'))
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response, content = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual((response.status_code, content), (200, self.body))
+
+    def test_sendfile_offload(self):
+        with override_settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response, content = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual((response.status_code, content), (200, b''))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-upload/Video_Daga/clip.mp4')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        with override_settings(MEDIA_SENDFILE='x-sendfile'):
+            response, _ = self.get()
+        self.assertTrue(response['X-Sendfile'].endswith('/Video_Daga/clip.mp4'))
+        from django.core.exceptions import ImproperlyConfigured
+        with override_settings(MEDIA_SENDFILE='x-accel'), self.assertRaises(ImproperlyConfigured):
+            self.get()
+
+    def test_hashed_names_are_immutable_and_paths_stay_in_media_root(self):
+        import os
+        os.makedirs(os.path.join(self.media.name, 'ADS_Daga', '_variants'))
+        with open(os.path.join(self.media.name, 'ADS_Daga', '_variants', 'a.0123456789ab.320.webp'), 'wb') as f:
+            f.write(b'RIFF')
+        response = self.client.get('/upload/ADS_Daga/_variants/a.0123456789ab.320.webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(self.client.get('/upload/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/upload/Video_Daga').status_code, 404)
+
+
+# Max queries per view on the seeded data below; raise only with a reason
+QUERY_BUDGETS = {
+    'home': 2,  # snapshot + content versions (cold cache)
+    'channel_manifest': 2,
+    'video_feed': 2,
+    'channel_admin': 4,
+    'odds_admin': 4,
+    'video_admin': 4,
+    'ads_admin': 3,
+}
+# Total DB time per view (seconds)
+DB_TIME_BUDGET = 0.5
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.create_rows()
+
+    @classmethod
+    def create_rows(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        for n in range(12):
+            channel = Channel.objects.create(Name=f'C{n}', Key=f'http://cdn/{n}.m3u8', Count=n, Avatar='Channel_Daga/a.webp')
+            Channel_Source.objects.create(Link_channel=channel, Url=f'http://mirror/{n}.m3u8')
+        for n in range(6):
+            odds = Odds.objects.create(Category=f'O{n}', Count=n)
+            for m in range(3):
+                Odds_Image.objects.create(Link_image=odds, Image=f'Odds_Image/{n}-{m}.png')
+        for n in range(20):
+            Video.objects.create(Title=f'V{n}', Category='GaThuong' if n % 2 else 'GaDao', Avatar='Video_Daga/a.png', Video='Video_Daga/a.mp4')
+        for n in range(5):
+            Ads.objects.create(Note=f'A{n}', Banner='ADS_Daga/a.png', Link='http://ads', Count=n)
+        for n in range(3):
+            Animation_Image.objects.create(Image=f'Animation_Image/{n}.gif')
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def assertWithinBudget(self, name, url, login=False):
+        if login:
+            self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        db_time = sum(float(q['time']) for q in queries.captured_queries)
+        self.assertLessEqual(
+            len(queries), QUERY_BUDGETS[name],
+            f'{name}: {len(queries)} queries > budget {QUERY_BUDGETS[name]}:\n'
+            + '\n'.join(q['sql'] for q in queries.captured_queries)
+        )
+        self.assertLessEqual(db_time, DB_TIME_BUDGET, f'{name}: {db_time:.3f}s DB time > {DB_TIME_BUDGET}s')
+
+    def test_home(self):
+        self.assertWithinBudget('home', '/')
+
+    def test_channel_manifest(self):
+        self.assertWithinBudget('channel_manifest', '/api/channels/manifest.json')
+
+    def test_video_feed(self):
+        self.assertWithinBudget('video_feed', '/api/videos/?category=GaThuong')
+
+    def test_channel_admin(self):
+        self.assertWithinBudget('channel_admin', '/admin/channel', login=True)
+
+    def test_odds_admin(self):
+        self.assertWithinBudget('odds_admin', '/admin/odds', login=True)
+
+    def test_video_admin(self):
+        self.assertWithinBudget('video_admin', '/admin/video', login=True)
+
+    def test_ads_admin(self):
+        self.assertWithinBudget('ads_admin', '/admin/ads', login=True)
@@ -0,0 +1,267 @@
+"""
+Background HLS transcoding of uploaded videos.
+
+Saving a Video with a new file records a Transcode_Job (signals.py). After
+the commit the job runs on the 'transcode' background pool; `manage.py
+transcode_videos` (cron) picks up jobs that were not run there: the setting
+is off, the worker restarted, or an earlier run failed.
+
+A job turns Video.Video into one HLS rendition per entry of RENDITIONS that
+fits the source height, writes a master playlist over them, and moves the
+result to MEDIA_ROOT/Video_Hls/<video id>/<job id>/. Video.Hls then points
+at the master playlist. When the video has no Avatar, a poster frame is
+extracted into it. home.html plays Video.Hls when set and falls back to the
+MP4.
+
+The transcoder is pluggable: VIDEO_TRANSCODER is the dotted path of a class
+with `hls(source, output_dir, renditions)` (returns the variants it wrote,
+see FfmpegTranscoder) and `poster(source, output_path)`.
+"""
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+import subprocess
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import background
+from .models import Video, Transcode_Job
+
+
+logger = logging.getLogger(__name__)
+
+# (name, height, video kbps, audio kbps)
+RENDITIONS = (
+    ('1080p', 1080, 5000, 128),
+    ('720p', 720, 2800, 128),
+    ('480p', 480, 1400, 96),
+    ('360p', 360, 800, 96),
+)
+HLS_SEGMENT_SECONDS = 6
+HLS_ROOT = 'Video_Hls'
+# A transcode killed after this long is failed
+TRANSCODE_TIMEOUT = 6 * 3600
+
+
+class TranscodeError(Exception):
+    pass
+
+
+class FfmpegTranscoder:
+    """ffmpeg / ffprobe on PATH (or FFMPEG_BIN / FFPROBE_BIN)"""
+
+    def __init__(self):
+        self.ffmpeg = getattr(settings, 'FFMPEG_BIN', 'ffmpeg')
+        self.ffprobe = getattr(settings, 'FFPROBE_BIN', 'ffprobe')
+
+    def run(self, command):
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=TRANSCODE_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise TranscodeError(f'{command[0]}: {e}')
+        if result.returncode != 0:
+            raise TranscodeError(f'{command[0]} exited {result.returncode}: {result.stderr.strip()[-2000:]}')
+        return result.stdout
+
+    def probe(self, source):
+        """(width, height, duration seconds) of the first video stream"""
+        output = self.run([
+            self.ffprobe, '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height:format=duration', '-of', 'json', source,
+        ])
+        data = json.loads(output)
+        if not data.get('streams'):
+            raise TranscodeError('no video stream')
+        stream = data['streams'][0]
+        return int(stream['width']), int(stream['height']), float(data.get('format', {}).get('duration') or 0)
+
+    def hls(self, source, output_dir, renditions):
+        width, height, _ = self.probe(source)
+        # Never upscale; a source smaller than every rendition still gets the smallest one
+        fitting = [r for r in renditions if r[1] <= height] or [min(renditions, key=lambda r: r[1])]
+        variants = []
+        for name, rendition_height, video_kbps, audio_kbps in fitting:
+            variant_dir = os.path.join(output_dir, name)
+            os.makedirs(variant_dir)
+            self.run([
+                self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-i', source,
+                '-map', '0:v:0', '-map', '0:a:0?',
+                '-vf', f'scale=-2:{rendition_height}',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+                '-b:v', f'{video_kbps}k', '-maxrate', f'{video_kbps * 107 // 100}k', '-bufsize', f'{video_kbps * 2}k',
+                # Keyframe at every segment boundary so renditions switch cleanly
+                '-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})',
+                '-c:a', 'aac', '-b:a', f'{audio_kbps}k', '-ac', '2',
+                '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+                '-hls_segment_filename', os.path.join(variant_dir, 'seg_%05d.ts'),
+                os.path.join(variant_dir, 'index.m3u8'),
+            ])
+            scaled_width = round(width * rendition_height / height / 2) * 2
+            variants.append({
+                'playlist': f'{name}/index.m3u8',
+                'bandwidth': (video_kbps + audio_kbps) * 1000,
+                'resolution': f'{scaled_width}x{rendition_height}',
+            })
+        return variants
+
+    def poster(self, source, output_path):
+        _, _, duration = self.probe(source)
+        self.run([
+            self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+            '-ss', f'{min(1.0, duration / 10):.2f}', '-i', source,
+            '-frames:v', '1', '-vf', 'scale=-2:720', '-q:v', '3', output_path,
+        ])
+
+
+def get_transcoder():
+    return import_string(getattr(settings, 'VIDEO_TRANSCODER', 'sleekweb.transcoding.FfmpegTranscoder'))()
+
+
+def master_playlist(variants):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for variant in sorted(variants, key=lambda v: v['bandwidth'], reverse=True):
+        info = f'BANDWIDTH={variant["bandwidth"]}'
+        if variant.get('resolution'):
+            info += f',RESOLUTION={variant["resolution"]}'
+        lines += [f'#EXT-X-STREAM-INF:{info}', variant['playlist']]
+    return '\n'.join(lines) + '\n'
+
+
+def hls_dir(path):
+    """Directory (in storage) of a Video.Hls master playlist"""
+    return os.path.dirname(path)
+
+
+def enqueue(video):
+    """Record a job for the current Video.Video unless one exists; returns the new job or None"""
+    if not video.Video:
+        return None
+    if Transcode_Job.objects.filter(Link_video=video, Source=video.Video.name).exists():
+        return None
+    return Transcode_Job.objects.create(Link_video=video, Source=video.Video.name)
+
+
+def schedule(video_id):
+    """on_commit hook for a saved Video: record the job and start it in the background"""
+    video = Video.objects.filter(pk=video_id).first()
+    job = enqueue(video) if video else None
+    if job and getattr(settings, 'VIDEO_TRANSCODE_ON_SAVE', True):
+        background.submit_to('transcode', run_in_background, job.pk)
+    return job
+
+
+def run_in_background(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Pool threads keep their own DB connection otherwise
+        connections.close_all()
+
+
+def claim(job_id):
+    """Mark the job running unless another process already has it"""
+    claimed = Transcode_Job.objects.filter(pk=job_id, Status__in=('pending', 'failed')).update(
+        Status='running', Started_time=timezone.now(), Finished_time=None, Error=None,
+    )
+    return claimed == 1
+
+
+def run_job(job_id):
+    if not claim(job_id):
+        return None
+    job = Transcode_Job.objects.select_related('Link_video').get(pk=job_id)
+    Transcode_Job.objects.filter(pk=job_id).update(Attempts=job.Attempts + 1)
+    video = job.Link_video
+    try:
+        result = transcode(video, job)
+    except Exception as e:
+        logger.exception('Transcode job %s (video %s) failed', job.pk, video.pk)
+        Transcode_Job.objects.filter(pk=job_id).update(Status='failed', Error=str(e)[-4000:], Finished_time=timezone.now())
+        return None
+    if result is None:
+        Transcode_Job.objects.filter(pk=job_id).update(
+            Status='failed', Error='video file replaced during the job', Finished_time=timezone.now(),
+        )
+        return None
+    Transcode_Job.objects.filter(pk=job_id).update(Status='ready', Finished_time=timezone.now())
+    return result
+
+
+def transcode(video, job):
+    transcoder = get_transcoder()
+    source = default_storage.path(job.Source)
+    target = f'{HLS_ROOT}/{video.pk}/{job.pk}'
+    work = tempfile.mkdtemp(dir=getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None), prefix='hls-')
+    try:
+        output = os.path.join(work, 'hls')
+        os.makedirs(output)
+        variants = transcoder.hls(source, output, RENDITIONS)
+        if not variants:
+            raise TranscodeError('transcoder produced no renditions')
+        with open(os.path.join(output, 'master.m3u8'), 'w') as master:
+            master.write(master_playlist(variants))
+
+        poster = None
+        if not video.Avatar:
+            poster = os.path.join(work, 'poster.jpg')
+            try:
+                transcoder.poster(source, poster)
+            except TranscodeError as e:
+                # A missing poster does not fail the job
+                logger.warning('Poster for video %s failed: %s', video.pk, e)
+                poster = None
+
+        final = default_storage.path(target)
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        # Same filesystem as MEDIA_ROOT (FILE_UPLOAD_TEMP_DIR): a rename
+        shutil.move(output, final)
+
+        with transaction.atomic():
+            video = Video.objects.select_for_update().get(pk=video.pk)
+            if video.Video.name != job.Source:
+                # Replaced while transcoding: the newer file has its own job
+                shutil.rmtree(final, ignore_errors=True)
+                return None
+            previous = video.Hls
+            video.Hls = f'{target}/master.m3u8'
+            if poster and not video.Avatar:
+                with open(poster, 'rb') as image:
+                    video.Avatar.save(f'poster-{video.pk}.jpg', File(image), save=False)
+            video.save()
+        if previous and hls_dir(previous) != target:
+            shutil.rmtree(default_storage.path(hls_dir(previous)), ignore_errors=True)
+        return video
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def fail_interrupted(now=None):
+    """Jobs still 'running' long after any transcode would have timed out: their worker died"""
+    cutoff = (now or timezone.now()) - timedelta(seconds=TRANSCODE_TIMEOUT * len(RENDITIONS) + 3600)
+    return Transcode_Job.objects.filter(Status='running', Started_time__lt=cutoff).update(
+        Status='failed', Error='interrupted', Finished_time=timezone.now(),
+    )
+
+
+def run_pending(retry_failed=False, limit=None):
+    """Run queued jobs in this process (manage.py transcode_videos); returns the jobs run"""
+    fail_interrupted()
+    statuses = ['pending', 'failed'] if retry_failed else ['pending']
+    # Only jobs for the file the video still has
+    jobs = Transcode_Job.objects.filter(Status__in=statuses, Source=F('Link_video__Video')).order_by('id')
+    jobs = list(jobs.values_list('pk', flat=True)[:limit])
+    for job_id in jobs:
+        run_job(job_id)
+    return jobs
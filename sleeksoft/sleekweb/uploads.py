@@ -0,0 +1,103 @@
+"""
+Streaming upload handling.
+
+StreamingUploadHandler (the only FILE_UPLOAD_HANDLERS entry) writes every
+uploaded file to a temp file in FILE_UPLOAD_TEMP_DIR chunk by chunk, hashing
+it and counting its size on the way, so a worker holds one chunk per upload
+instead of the whole file. The returned TemporaryUploadedFile carries
+`sha256` and `container` (detected from the first bytes).
+
+Video fields are checked as soon as their first bytes arrive: anything that
+is not a known video container, or that grows past UPLOAD_MAX_BYTES, stops
+the upload; the rest of the body is drained without being written and the
+reason is left in `request.rejected_uploads[field_name]`.
+
+FileSystemStorage moves a TemporaryUploadedFile into MEDIA_ROOT with a
+rename when both directories are on the same filesystem, so keep
+FILE_UPLOAD_TEMP_DIR next to MEDIA_ROOT to avoid a second copy.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, StopUpload
+
+
+# Form fields that must contain a video
+VIDEO_FIELDS = ('Video',)
+ALLOWED_VIDEO_CONTAINERS = ('mp4', 'mov', 'webm', 'ogg', 'ts')
+# Enough for every signature below (MPEG-TS needs the second sync byte at 188)
+SNIFF_BYTES = 512
+
+
+def sniff_container(head):
+    """Container format from the first bytes of a file, None if unknown"""
+    if head[4:8] == b'ftyp':
+        return 'mp4'  # also m4v / 3gp / QuickTime with ftyp
+    if head[4:8] in (b'moov', b'mdat', b'wide', b'free', b'skip'):
+        return 'mov'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'  # Matroska / WebM (EBML header)
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'avi'
+    if head[:3] == b'FLV':
+        return 'flv'
+    if head[:4] == b'\x00\x00\x01\xba':
+        return 'mpeg'
+    if head[:1] == b'\x47' and head[188:189] == b'\x47':
+        return 'ts'
+    return None
+
+
+def upload_max_bytes():
+    return getattr(settings, 'UPLOAD_MAX_BYTES', 1024 * 1024 * 1024)
+
+
+class StreamingUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.container = None
+        self.sniffed = False
+
+    def reject(self, reason):
+        if self.request is not None:
+            if not hasattr(self.request, 'rejected_uploads'):
+                self.request.rejected_uploads = {}
+            self.request.rejected_uploads[self.field_name] = reason
+        # connection_reset=False: the parser drains the rest of the body without storing it
+        raise StopUpload(connection_reset=False)
+
+    def sniff(self):
+        self.sniffed = True
+        self.container = sniff_container(self.head)
+        if self.field_name in VIDEO_FIELDS and self.container not in ALLOWED_VIDEO_CONTAINERS:
+            self.reject(f'{self.file_name}: not a supported video file ({", ".join(ALLOWED_VIDEO_CONTAINERS)})')
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > upload_max_bytes():
+            self.reject(f'{self.file_name}: larger than {upload_max_bytes()} bytes')
+        if not self.sniffed:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self.sniff()
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.sniffed:
+            self.sniff()
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        file.container = self.container
+        return file
+
+
+def rejected_upload(request, field_name):
+    """Why the handler refused this field's file, None if it did not"""
+    return getattr(request, 'rejected_uploads', {}).get(field_name)
@@ -38,31 +38,34 @@ from django.views.generic import RedirectView
 from django.contrib.auth import views as auth_views
 
 
-from .views.client.home_client import *
-
-from .views.client.about_client import *
-from .views.client.booking_client import *
-from .views.client.contact_client import *
-from .views.client.menu_client import *
-from .views.client.service_client import *
-from .views.client.team_client import *
-from .views.client.testimonial_client import *
-
-
-from .views.client.login_client import *
 from sleekweb.sitemaps import *
 from django.contrib.sitemaps.views import sitemap
 
-from .views.admin.login_admin import *
-from .views.admin.channel_admin import *
-from .views.admin.odds_admin import *
-from .views.admin.animation_admin import *
-from .views.admin.ads_admin import *
-from .views.admin.video_admin import *
-# from .views.admin.product_admin import *
-# from .views.admin.ads_admin import *
-
-from .views.client.stream_finder import stream_finder_page, scan_url, check_single_stream
+# View module chỉ được import khi có request đầu tiên tới nó (xem lazy_views.py)
+from .lazy_views import LazyModule
+
+home_client = LazyModule('sleekweb.views.client.home_client')
+about_client = LazyModule('sleekweb.views.client.about_client')
+booking_client = LazyModule('sleekweb.views.client.booking_client')
+contact_client = LazyModule('sleekweb.views.client.contact_client')
+menu_client = LazyModule('sleekweb.views.client.menu_client')
+service_client = LazyModule('sleekweb.views.client.service_client')
+team_client = LazyModule('sleekweb.views.client.team_client')
+testimonial_client = LazyModule('sleekweb.views.client.testimonial_client')
+video_client = LazyModule('sleekweb.views.client.video_client')
+image_client = LazyModule('sleekweb.views.client.image_client')
+hls_relay = LazyModule('sleekweb.views.client.hls_relay')
+stream_finder = LazyModule('sleekweb.views.client.stream_finder')
+
+login_admin = LazyModule('sleekweb.views.admin.login_admin')
+channel_admin = LazyModule('sleekweb.views.admin.channel_admin')
+odds_admin = LazyModule('sleekweb.views.admin.odds_admin')
+animation_admin = LazyModule('sleekweb.views.admin.animation_admin')
+ads_admin = LazyModule('sleekweb.views.admin.ads_admin')
+video_admin = LazyModule('sleekweb.views.admin.video_admin')
+video_upload_admin = LazyModule('sleekweb.views.admin.video_upload_admin')
+import_admin = LazyModule('sleekweb.views.admin.import_admin')
+# product_admin = LazyModule('sleekweb.views.admin.product_admin')
 
 
 sitemaps_dict = {
@@ -72,56 +75,68 @@ sitemaps_dict = {
 urlpatterns = [
     path('sitemap.xml', sitemap, {'sitemaps': sitemaps_dict}, name='sitemap'),
 
-    path('set-language/<str:lang_code>/', set_language, name='set_language'),
-
-    path('',home,name='home'),
-    path('p',phom,name='phom'),
-
-    path("live/", live_view, name="live_view"),
-
-    path('about',about,name='about'),
-    path('booking',booking,name='booking'),
-    path('contact',contact,name='contact'),
-    path('menu',menu,name='menu'),
-    path('service',service,name='service'),
-    path('team',team,name='team'),
-    path('testimonial',testimonial,name='testimonial'),
-
-
-    path('admin/login', login_admin,name='login_admin'),
-    path('admin/logout', logout_admin,name='logout_admin'),
-
-    path('admin/channel', channel_admin,name='channel_admin'),
-    path('admin/channel/add', channel_add_admin,name='channel_add_admin'),
-    path('admin/channel/edit/<int:pk>/', channel_edit_admin,name='channel_edit_admin'),
-    path('admin/channel/remove/<int:pk>/', channel_remove_admin,name='channel_remove_admin'),
-    path('api/check-password/', check_password_api, name='check_password_api'),
-
-    path('admin/odds', odds_admin,name='odds_admin'),
-    path('admin/odds/add', odds_add_admin,name='odds_add_admin'),
-    path('admin/odds/edit/<int:pk>/', odds_edit_admin,name='odds_edit_admin'),
-    path('admin/odds/remove/<int:pk>/', odds_remove_admin,name='odds_remove_admin'),
-
-    path('admin/animation', animation_admin,name='animation_admin'),
-    path('admin/animation/add', animation_add_admin,name='animation_add_admin'),
-    path('admin/animation/edit/<int:pk>/', animation_edit_admin,name='animation_edit_admin'),
-    path('admin/animation/remove/<int:pk>/', animation_remove_admin,name='animation_remove_admin'),
-
-    path('admin/ads', ads_admin,name='ads_admin'),
-    path('admin/ads/add', ads_add_admin,name='ads_add_admin'),
-    path('admin/ads/edit/<int:pk>/', ads_edit_admin,name='ads_edit_admin'),
-    path('admin/ads/remove/<int:pk>/', ads_remove_admin,name='ads_remove_admin'),
+    path('set-language/<str:lang_code>/', home_client.set_language, name='set_language'),
+
+    path('',home_client.home,name='home'),
+    path('p',home_client.phom,name='phom'),
+
+    path("live/", home_client.live_view, name="live_view"),
+
+    path('about',about_client.about,name='about'),
+    path('booking',booking_client.booking,name='booking'),
+    path('contact',contact_client.contact,name='contact'),
+    path('menu',menu_client.menu,name='menu'),
+    path('service',service_client.service,name='service'),
+    path('team',team_client.team,name='team'),
+    path('testimonial',testimonial_client.testimonial,name='testimonial'),
+
+
+    path('admin/login', login_admin.login_admin,name='login_admin'),
+    path('admin/logout', login_admin.logout_admin,name='logout_admin'),
+
+    path('admin/channel', channel_admin.channel_admin,name='channel_admin'),
+    path('admin/channel/add', channel_admin.channel_add_admin,name='channel_add_admin'),
+    path('admin/channel/edit/<int:pk>/', channel_admin.channel_edit_admin,name='channel_edit_admin'),
+    path('admin/channel/remove/<int:pk>/', channel_admin.channel_remove_admin,name='channel_remove_admin'),
+    path('api/check-password/', channel_admin.check_password_api, name='check_password_api'),
+    path('api/channel/next-source/', channel_admin.next_source_api, name='next_source_api'),
+    path('api/channels/manifest.json', home_client.channel_manifest, name='channel_manifest'),
+    path('api/videos/', video_client.video_feed, name='video_feed'),
+    path('img/<int:width>/<str:fmt>/<path:name>', image_client.image_variant, name='image_variant'),
+    path('relay/<int:pk>/index.m3u8', hls_relay.relay_playlist, name='hls_relay_playlist'),
+    path('relay/<int:pk>/segment', hls_relay.relay_segment, name='hls_relay_segment'),
+
+    path('admin/odds', odds_admin.odds_admin,name='odds_admin'),
+    path('admin/odds/add', odds_admin.odds_add_admin,name='odds_add_admin'),
+    path('admin/odds/edit/<int:pk>/', odds_admin.odds_edit_admin,name='odds_edit_admin'),
+    path('admin/odds/remove/<int:pk>/', odds_admin.odds_remove_admin,name='odds_remove_admin'),
+
+    path('admin/animation', animation_admin.animation_admin,name='animation_admin'),
+    path('admin/animation/add', animation_admin.animation_add_admin,name='animation_add_admin'),
+    path('admin/animation/edit/<int:pk>/', animation_admin.animation_edit_admin,name='animation_edit_admin'),
+    path('admin/animation/remove/<int:pk>/', animation_admin.animation_remove_admin,name='animation_remove_admin'),
+
+    path('admin/ads', ads_admin.ads_admin,name='ads_admin'),
+    path('admin/ads/add', ads_admin.ads_add_admin,name='ads_add_admin'),
+    path('admin/ads/edit/<int:pk>/', ads_admin.ads_edit_admin,name='ads_edit_admin'),
+    path('admin/ads/remove/<int:pk>/', ads_admin.ads_remove_admin,name='ads_remove_admin'),
     
 
-    path('admin/video', video_admin,name='video_admin'),
-    path('admin/video/add', video_add_admin,name='video_add_admin'),
-    path('admin/video/edit/<int:pk>/', video_edit_admin,name='video_edit_admin'),
-    path('admin/video/remove/<int:pk>/', video_remove_admin,name='video_remove_admin'),
+    path('admin/video', video_admin.video_admin,name='video_admin'),
+    path('admin/video/add', video_admin.video_add_admin,name='video_add_admin'),
+    path('admin/video/edit/<int:pk>/', video_admin.video_edit_admin,name='video_edit_admin'),
+    path('admin/video/remove/<int:pk>/', video_admin.video_remove_admin,name='video_remove_admin'),
+    path('admin/video/upload/', video_upload_admin.video_upload_create, name='video_upload_create'),
+    path('admin/video/upload/<uuid:token>/', video_upload_admin.video_upload_status, name='video_upload_status'),
+    path('admin/video/upload/<uuid:token>/part/<int:number>', video_upload_admin.video_upload_part, name='video_upload_part'),
+    path('admin/video/upload/<uuid:token>/complete', video_upload_admin.video_upload_complete, name='video_upload_complete'),
+    path('admin/import/<str:kind>', import_admin.catalog_import_admin, name='catalog_import_admin'),
 
     # Stream Finder Tool
-    path('stream-finder/', stream_finder_page, name='stream_finder'),
-    path('stream-finder/scan/', scan_url, name='stream_finder_scan'),
-    path('stream-finder/check/', check_single_stream, name='stream_finder_check'),
+    path('stream-finder/', stream_finder.stream_finder_page, name='stream_finder'),
+    path('stream-finder/scan/', stream_finder.scan_url, name='stream_finder_scan'),
+    path('stream-finder/crawl/', stream_finder.crawl_url, name='stream_finder_crawl'),
+    path('stream-finder/check/', stream_finder.check_single_stream, name='stream_finder_check'),
 
 
     # path('admin/product', product_admin,name='product_admin'),
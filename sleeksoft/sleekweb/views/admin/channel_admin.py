@@ -10,7 +10,7 @@ from django.http import HttpResponse
 import requests
 import time
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 import os
@@ -61,14 +61,40 @@ from django.views.decorators.csrf import csrf_exempt
 
 import base64
 
-
+from ...stream_ranking import invalidate_ranking, next_source
+from ...key_refresh import detect_key_expiry
+
+
+def save_channel_sources(obj, raw):
+    # Mỗi dòng một link nguồn dự phòng, giữ thứ tự admin nhập
+    urls = []
+    for line in (raw or '').splitlines():
+        line = line.strip()
+        if line and line not in urls:
+            urls.append(line)
+    Channel_Source.objects.filter(Link_channel=obj).delete()
+    Channel_Source.objects.bulk_create([
+        Channel_Source(Link_channel=obj, Url=url, Order=index)
+        for index, url in enumerate(urls)
+    ])
+    invalidate_ranking(obj.pk)
+
+
+def parse_refresh_interval(raw):
+    # Số phút > 0, trống = theo token; ValueError nếu không hợp lệ
+    if not raw:
+        return None
+    interval = int(raw)
+    if interval <= 0:
+        raise ValueError(raw)
+    return interval
 
     
 def channel_admin(request):
     if request.method == 'GET':
         context = {}
         context['domain'] = settings.DOMAIN
-        context['list_Channel'] = Channel.objects.all().order_by('Count')
+        context['list_Channel'] = Channel.objects.all().order_by('Count').prefetch_related('sources')
         s = request.GET.get('s')
         if s:
             context['list_Channel'] = context['list_Channel'].filter(Q(Title__icontains=s)).order_by('-id')
@@ -91,11 +117,18 @@ def channel_add_admin(request):
             fields['Time'] = request.POST.get('Time')
             fields['Iframe'] = request.POST.get('Iframe')
             fields['Avatar'] = request.FILES.get('Avatar')
+            fields['Source_page'] = request.POST.get('Source_page') or None
+            fields['Extract_rule'] = request.POST.get('Extract_rule') or None
+            fields['Key_expires'] = detect_key_expiry(fields['Key'])
             obj = Channel.objects.create(**fields)
+            if request.POST.get('Sources'):
+                save_channel_sources(obj, request.POST.get('Sources'))
             return redirect('channel_admin')
         else:
             return redirect('login_admin')
     
+# File cũ được xoá sau khi commit, ở background (storage.py)
+@transaction.atomic
 def channel_edit_admin(request,pk):
     if request.method == 'GET':
         return redirect('login_admin')
@@ -110,6 +143,11 @@ def channel_edit_admin(request,pk):
             fields['Count'] = request.POST.get('Count')
             fields['Password'] = request.POST.get('Password')
             fields['Avatar'] = request.FILES.get('Avatar')
+            # Kiểm tra trước khi sửa gì: Avatar cũ bị xoá khi commit
+            try:
+                refresh_interval = parse_refresh_interval(request.POST.get('Refresh_interval'))
+            except ValueError:
+                return JsonResponse({"error": "Chu kỳ làm mới phải là số phút lớn hơn 0"}, status=400)
 
             obj = Channel.objects.get(pk=pk)
 
@@ -118,6 +156,8 @@ def channel_edit_admin(request,pk):
                 obj.Name = fields['Name']
             if fields['Key']:
                 obj.Key = fields['Key']
+                obj.Key_expires = detect_key_expiry(fields['Key'])
+                invalidate_ranking(obj.pk)
             if fields['Time']:
                 obj.Time = fields['Time']
             if fields['Iframe']:
@@ -129,12 +169,22 @@ def channel_edit_admin(request,pk):
             if fields['Avatar']:
                 obj.Avatar.delete(save=False)
                 obj.Avatar = fields['Avatar']
+            # Tự làm mới Key: cho phép xoá trống để tắt
+            if 'Source_page' in request.POST:
+                obj.Source_page = request.POST.get('Source_page') or None
+            if 'Extract_rule' in request.POST:
+                obj.Extract_rule = request.POST.get('Extract_rule') or None
+            if 'Refresh_interval' in request.POST:
+                obj.Refresh_interval = refresh_interval
 
             obj.save()
+            if 'Sources' in request.POST:
+                save_channel_sources(obj, request.POST.get('Sources'))
             return redirect('channel_admin')
         else:
             return redirect('login_admin')
     
+@transaction.atomic
 def channel_remove_admin(request,pk):
     if request.user.is_authenticated and request.user.is_superuser:
         if request.method == 'POST':
@@ -173,5 +223,19 @@ def check_password_api(request):
         return JsonResponse({"valid": True})
     else:
         return JsonResponse({"valid": False})
-        
 
+def next_source_api(request):
+    # Player gặp lỗi -> hỏi link tốt kế tiếp thay vì tải lại cả trang
+    try:
+        channel = Channel.objects.prefetch_related('sources').get(pk=request.GET.get('channel'))
+    except (Channel.DoesNotExist, ValueError):
+        return JsonResponse({"error": "Channel not found"}, status=404)
+
+    current = request.GET.get('current', '')
+    # Player đang xem qua relay: đổi link relay về link gốc, trả về link relay của nguồn kế tiếp
+    from ..client.hls_relay import relay_enabled, relay_playlist_url, relay_upstream
+    upstream = relay_upstream(channel, current)
+    url = next_source(channel, upstream if upstream is not None else current)
+    if url and relay_enabled():
+        url = relay_playlist_url(channel.pk, url)
+    return JsonResponse({"url": url, "exhausted": url is None})
@@ -0,0 +1,32 @@
+from django.http import JsonResponse
+
+from ...catalog_import import IMPORTS, ImportFailed, import_xlsx
+
+# Nhập sản phẩm / video hàng loạt từ file Excel (catalog_import.py), trả về JSON
+MAX_REPORTED_ERRORS = 1000
+
+
+def is_admin(request):
+    return request.user.is_authenticated and request.user.is_superuser
+
+
+def catalog_import_admin(request, kind):
+    if not is_admin(request):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    if kind not in IMPORTS:
+        return JsonResponse({"error": f"Chỉ nhập được: {', '.join(IMPORTS)}"}, status=404)
+    upload = request.FILES.get('File')
+    if not upload:
+        return JsonResponse({"error": "Thiếu file XLSX"}, status=400)
+    try:
+        result = import_xlsx(kind, upload)
+    except ImportFailed as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({
+        "created": result.created,
+        "error_count": len(result.errors),
+        # Dòng lỗi bị bỏ qua, các dòng còn lại vẫn được nhập
+        "errors": [{"row": number, "error": message} for number, message in result.errors[:MAX_REPORTED_ERRORS]],
+    })
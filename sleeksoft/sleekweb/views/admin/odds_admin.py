@@ -1,4 +1,5 @@
 from ...models import *
+from ...image_ingest import ImageRejected, prepare_images, save_odds_images
 
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
@@ -6,11 +7,11 @@ from django.shortcuts import get_list_or_404, get_object_or_404
 from django.core.paginator import Paginator
 
 
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest
 import requests
 import time
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 import os
@@ -68,7 +69,7 @@ def odds_admin(request):
     if request.method == 'GET':
         context = {}
         context['domain'] = settings.DOMAIN
-        context['list_Odds'] = Odds.objects.all().order_by('Count')
+        context['list_Odds'] = Odds.objects.all().order_by('Count').prefetch_related('images')
         s = request.GET.get('s')
         if s:
             context['list_Odds'] = context['list_Odds'].filter(Q(Title__icontains=s)).order_by('-id')
@@ -88,18 +89,23 @@ def odds_add_admin(request):
             fields = {}
             fields['Category'] = request.POST.get('Category')
             fields['Describe'] = request.POST.get('Describe')
-            obj = Odds.objects.create(**fields)
 
-            List_Image = request.FILES.getlist('List_Image')
+            # Kiểm tra / thu nhỏ ảnh song song trước khi ghi gì vào DB (image_ingest.py)
+            try:
+                List_Image = prepare_images(request.FILES.getlist('List_Image'))
+            except ImageRejected as e:
+                return HttpResponseBadRequest(str(e))
 
-            if List_Image:
-                for img in List_Image:
-                    img_obj = Odds_Image.objects.create(Link_image=obj,Image=img)
+            with transaction.atomic():
+                obj = Odds.objects.create(**fields)
+                save_odds_images(obj, List_Image)
 
             return redirect('odds_admin')
         else:
             return redirect('login_admin')
     
+# File cũ được xoá sau khi commit, ở background (storage.py)
+@transaction.atomic
 def odds_edit_admin(request,pk):
     if request.method == 'GET':
         return redirect('login_admin')
@@ -110,6 +116,11 @@ def odds_edit_admin(request,pk):
             fields['Describe'] = request.POST.get('Describe')
             fields['Count'] = request.POST.get('Count')
 
+            try:
+                List_Image = prepare_images(request.FILES.getlist('List_Image'))
+            except ImageRejected as e:
+                return HttpResponseBadRequest(str(e))
+
             obj = Odds.objects.get(pk=pk)
 
 
@@ -122,25 +133,15 @@ def odds_edit_admin(request,pk):
             
             obj.save()
 
-            List_Image = request.FILES.getlist('List_Image')
-            List_Image_Odds = Odds_Image.objects.filter(Link_image=obj)
-
-            # Nếu có ảnh mới upload
+            # Nếu có ảnh mới upload: thay bộ ảnh cũ, ảnh trùng nội dung được giữ nguyên
             if List_Image:
-                # Xóa ảnh cũ
-                for img_obj in List_Image_Odds:
-                    if img_obj.Image:
-                        img_obj.Image.delete(save=False)
-                    img_obj.delete()
-
-                # Thêm ảnh mới
-                for img in List_Image:
-                    Odds_Image.objects.create(Link_image=obj, Image=img)
+                save_odds_images(obj, List_Image, replace=True)
 
             return redirect('odds_admin')
         else:
             return redirect('login_admin')
     
+@transaction.atomic
 def odds_remove_admin(request,pk):
     if request.user.is_authenticated and request.user.is_superuser:
         if request.method == 'POST':
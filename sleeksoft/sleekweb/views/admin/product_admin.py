@@ -1,4 +1,5 @@
 from ...models import *
+from ...uploads import rejected_upload
 
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
@@ -6,7 +7,7 @@ from django.shortcuts import get_list_or_404, get_object_or_404
 from django.core.paginator import Paginator
 
 
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest
 import requests
 import time
 
@@ -99,6 +100,12 @@ def product_add_admin(request):
             fields['Link'] = request.POST.get('Link')
             fields['Iframe'] = request.POST.get('Iframe')
             fields['Video']= request.FILES.get('Video')
+            error = rejected_upload(request, 'Video')
+            if error:
+                return HttpResponseBadRequest(error)
+            if fields['Video']:
+                fields['Video_hash'] = getattr(fields['Video'], 'sha256', None)
+                fields['Video_size'] = fields['Video'].size
             obj = Product.objects.create(**fields)
             return redirect('product_admin')
         else:
@@ -123,6 +130,9 @@ def product_edit_admin(request,pk):
             fields['Link'] = request.POST.get('Link')
             fields['Iframe'] = request.POST.get('Iframe')
             fields['Video']= request.FILES.get('Video')
+            error = rejected_upload(request, 'Video')
+            if error:
+                return HttpResponseBadRequest(error)
 
             obj = Product.objects.get(pk=pk)
             obj.Title = fields['Title']
@@ -138,6 +148,8 @@ def product_edit_admin(request,pk):
                 if obj.Video:
                     obj.Video.delete(save=False)
                 obj.Video = fields['Video']
+                obj.Video_hash = getattr(fields['Video'], 'sha256', None)
+                obj.Video_size = fields['Video'].size
 
             obj.save()
             return redirect('product_edit_admin',pk=pk)
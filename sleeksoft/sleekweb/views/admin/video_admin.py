@@ -1,4 +1,5 @@
 from ...models import *
+from ...uploads import rejected_upload
 
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
@@ -6,11 +7,11 @@ from django.shortcuts import get_list_or_404, get_object_or_404
 from django.core.paginator import Paginator
 
 
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest
 import requests
 import time
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 import os
@@ -92,11 +93,20 @@ def video_add_admin(request):
             fields['Video'] = request.FILES.get('Video')
             fields['Category'] = request.POST.get('Category')
             print('fields:',fields)
+            error = rejected_upload(request, 'Video')
+            if error:
+                return HttpResponseBadRequest(error)
+            if fields['Video']:
+                # Hash / dung lượng đã được tính khi ghi file xuống đĩa (uploads.py)
+                fields['Video_hash'] = getattr(fields['Video'], 'sha256', None)
+                fields['Video_size'] = fields['Video'].size
             obj = Video.objects.create(**fields)
             return redirect('video_admin')
         else:
             return redirect('login_admin')
     
+# File cũ được xoá sau khi commit, ở background (storage.py)
+@transaction.atomic
 def video_edit_admin(request,pk):
     if request.method == 'GET':
         return redirect('login_admin')
@@ -107,6 +117,9 @@ def video_edit_admin(request,pk):
             fields['Avatar'] = request.FILES.get('Avatar')
             fields['Video'] = request.FILES.get('Video')
             fields['Category'] = request.POST.get('Category')
+            error = rejected_upload(request, 'Video')
+            if error:
+                return HttpResponseBadRequest(error)
 
             obj = Video.objects.get(pk=pk)
 
@@ -118,6 +131,8 @@ def video_edit_admin(request,pk):
             if fields['Video']:
                 obj.Video.delete(save=False)
                 obj.Video = fields['Video']
+                obj.Video_hash = getattr(fields['Video'], 'sha256', None)
+                obj.Video_size = fields['Video'].size
             if fields['Category']:
                 obj.Category = fields['Category']
 
@@ -127,6 +142,7 @@ def video_edit_admin(request,pk):
             return redirect('login_admin')
     
 
+@transaction.atomic
 def video_remove_admin(request, pk):
     if request.user.is_authenticated and request.user.is_superuser:
         if request.method == 'POST':
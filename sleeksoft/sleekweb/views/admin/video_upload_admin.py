@@ -0,0 +1,97 @@
+import json
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from ...models import Upload_Session
+from ...chunked_uploads import (
+    UploadError, create_session, write_part, received_parts, missing_parts,
+    part_count, complete_session, abort_session,
+)
+
+# API upload video theo từng phần (xem chunked_uploads.py), trình duyệt gửi X-CSRFToken
+
+
+def is_admin(request):
+    return request.user.is_authenticated and request.user.is_superuser
+
+
+def upload_error(e):
+    return JsonResponse({"error": str(e)}, status=e.status)
+
+
+def video_upload_create(request):
+    if not is_admin(request):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    try:
+        body = json.loads(request.body.decode('utf-8'))
+        session = create_session(
+            body.get('filename'), int(body.get('size') or 0),
+            title=body.get('title') or None, category=body.get('category') or None,
+            part_size=int(body['part_size']) if body.get('part_size') else None,
+        )
+    except (ValueError, TypeError):
+        return JsonResponse({"error": "Bad JSON"}, status=400)
+    except UploadError as e:
+        return upload_error(e)
+    return JsonResponse({
+        "token": str(session.Token),
+        "part_size": session.Part_size,
+        "part_count": part_count(session),
+    }, status=201)
+
+
+def video_upload_status(request, token):
+    if not is_admin(request):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    session = get_object_or_404(Upload_Session, Token=token)
+    if request.method == 'DELETE':
+        abort_session(session)
+        return JsonResponse({"deleted": True})
+    return JsonResponse({
+        "token": str(session.Token),
+        "size": session.Size,
+        "part_size": session.Part_size,
+        "part_count": part_count(session),
+        "received": received_parts(session),
+        "missing": missing_parts(session),
+        "status": session.Status,
+        "error": session.Error,
+        "video": session.Link_video_id,
+    })
+
+
+def video_upload_part(request, token, number):
+    if not is_admin(request):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    if request.method != 'PUT':
+        return JsonResponse({"error": "PUT required"}, status=405)
+    session = get_object_or_404(Upload_Session, Token=token)
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        # Đọc thẳng từ stream của request theo từng đoạn, không dùng request.body
+        write_part(session, number, request, length)
+    except ValueError:
+        return JsonResponse({"error": "Bad Content-Length"}, status=400)
+    except UploadError as e:
+        return upload_error(e)
+    return JsonResponse({"part": number, "received": True})
+
+
+def video_upload_complete(request, token):
+    if not is_admin(request):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    get_object_or_404(Upload_Session, Token=token)
+    try:
+        session = complete_session(token)
+    except UploadError as e:
+        return upload_error(e)
+    if session.Link_video_id:
+        video = session.Link_video
+        return JsonResponse({"status": session.Status, "video": video.pk, "url": video.Video.url})
+    # Ghép file chạy nền: trình duyệt hỏi lại GET /admin/video/upload/<token>/ tới khi status = ready
+    return JsonResponse({"status": session.Status, "video": None}, status=202)
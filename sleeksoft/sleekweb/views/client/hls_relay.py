@@ -0,0 +1,331 @@
+"""
+HLS Relay - serves a channel's playlists and segments through this server
+so N viewers cause one upstream fetch instead of N.
+
+Playlists are cached for about one target duration in the shared Django
+cache, segments sit in a byte-bounded LRU directory on disk. Both are shared
+by every gunicorn worker: concurrent misses for the same URL, in any worker,
+are coalesced through a cache.add lock so one request fetches upstream and
+the others wait for its result.
+"""
+
+import os
+import re
+import time
+import hashlib
+import tempfile
+import threading
+import requests
+from urllib.parse import urljoin, urlencode, urlsplit, parse_qs
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse, Http404
+from django.urls import reverse
+
+from ...models import Channel
+from ...stream_ranking import best_source
+from .stream_finder import stream_headers, parse_media_playlist
+
+
+UPSTREAM_TIMEOUT = 10
+CHUNK_SIZE = 64 * 1024
+# Master playlists rarely change, media playlists change every target duration
+MASTER_PLAYLIST_TTL = 30
+DEFAULT_PLAYLIST_TTL = 2
+SEGMENT_MAX_AGE = 60
+# Waiters poll the shared cache while another worker fetches upstream
+WAIT_STEP = 0.05
+
+signer = signing.Signer(salt='sleekweb.hls_relay')
+
+
+def relay_enabled():
+    return getattr(settings, 'HLS_RELAY', False)
+
+
+def relay_playlist_url(channel_pk, upstream=None):
+    url = reverse('hls_relay_playlist', kwargs={'pk': channel_pk})
+    if upstream:
+        url += '?' + urlencode({'u': signer.sign(upstream)})
+    return url
+
+
+def relay_segment_url(channel_pk, upstream):
+    return reverse('hls_relay_segment', kwargs={'pk': channel_pk}) + '?' + urlencode({'u': signer.sign(upstream)})
+
+
+def relay_upstream(channel, url):
+    """
+    Upstream URL behind a relay playlist URL of this channel, None for other URLs
+    The root playlist (no ?u=) plays the channel's best source
+    """
+    parts = urlsplit(url)
+    if parts.path != reverse('hls_relay_playlist', kwargs={'pk': channel.pk}):
+        return None
+    signed = parse_qs(parts.query).get('u')
+    if not signed:
+        return best_source(channel)
+    try:
+        return signer.unsign(signed[0])
+    except signing.BadSignature:
+        return None
+
+
+def coalesce(key, lookup, produce, wait_timeout=UPSTREAM_TIMEOUT + 5):
+    """
+    lookup() or, on a miss, produce() - run by one caller across all workers
+    The others poll lookup() until the leader releases the shared-cache lock
+    """
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + wait_timeout
+    while True:
+        value = lookup()
+        if value is not None:
+            return value
+        if cache.add(lock_key, 1, wait_timeout):
+            try:
+                # The previous leader may have finished between lookup and add
+                value = lookup()
+                return value if value is not None else produce()
+            finally:
+                cache.delete(lock_key)
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'Upstream fetch for {key} timed out')
+        time.sleep(WAIT_STEP)
+
+
+def cache_key(kind, url):
+    return f'hls_relay:{kind}:' + hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+class SegmentCache:
+    """
+    Byte-bounded LRU of segment files in a directory shared by every worker
+    Each file is the content type on the first line, then the body
+    """
+
+    def __init__(self, max_bytes, directory):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def get(self, url):
+        """(content_type, chunk iterator) or None on miss"""
+        path = self.path(url)
+        # Open now: another worker may evict the file before the response is streamed
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return self._open(f)
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    @property
+    def total_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def download(self, url):
+        """Stream the upstream body to disk, then serve it from the file"""
+        response = requests.get(url, headers=stream_headers(url), timeout=UPSTREAM_TIMEOUT, verify=False, stream=True)
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type', 'video/mp2t')
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix='.', delete=False) as tmp:
+            tmp.write(content_type.encode('latin-1') + b'\n')
+            for chunk in response.iter_content(CHUNK_SIZE):
+                tmp.write(chunk)
+        path = self.path(url)
+        os.replace(tmp.name, path)
+        f = open(path, 'rb')
+        self._evict(path)
+        return self._open(f)
+
+    def _evict(self, newest):
+        """Drop least recently used files until the directory fits max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == newest:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        if total > self.max_bytes:
+            # Larger than the whole cache: served from the open file, never kept
+            try:
+                os.remove(newest)
+            except OSError:
+                pass
+
+    def fetch(self, url):
+        """Cached segment, fetching upstream once for concurrent misses"""
+        return coalesce(cache_key('segment', url), lambda: self.get(url), lambda: self.download(url))
+
+    def _open(self, f):
+        content_type = f.readline().rstrip(b'\n').decode('latin-1')
+        return content_type, self._read_file(f)
+
+    @staticmethod
+    def _read_file(f):
+        with f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_segments = None
+_segments_lock = threading.Lock()
+
+
+def segment_cache():
+    global _segments
+    with _segments_lock:
+        if _segments is None:
+            _segments = SegmentCache(
+                getattr(settings, 'HLS_RELAY_SEGMENT_CACHE_BYTES', 256 * 1024 * 1024),
+                getattr(settings, 'HLS_RELAY_SEGMENT_CACHE_DIR', None) or os.path.join(settings.CACHE_DIR, 'hls_segments'),
+            )
+        return _segments
+
+
+def reset_caches():
+    """Delete the stored segments; playlists live in the shared cache"""
+    global _segments
+    with _segments_lock:
+        if _segments is not None:
+            _segments.clear()
+        _segments = None
+
+
+URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+
+
+def rewrite_playlist(text, base_url, channel_pk):
+    """Point every URI of a playlist at the relay"""
+    playlist = parse_media_playlist(text)
+    is_master = bool(playlist['variants'])
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            lines.append(line)
+        elif stripped.startswith('#'):
+            if 'URI="' in stripped:
+                media_tag = stripped.startswith('#EXT-X-MEDIA:') or stripped.startswith('#EXT-X-I-FRAME-STREAM-INF')
+                def replace(match):
+                    upstream = urljoin(base_url, match.group(1))
+                    if media_tag:
+                        return f'URI="{relay_playlist_url(channel_pk, upstream)}"'
+                    return f'URI="{relay_segment_url(channel_pk, upstream)}"'
+                line = URI_ATTRIBUTE.sub(replace, stripped)
+            lines.append(line)
+        else:
+            upstream = urljoin(base_url, stripped)
+            if is_master or '.m3u8' in stripped.split('?', 1)[0].lower():
+                lines.append(relay_playlist_url(channel_pk, upstream))
+            else:
+                lines.append(relay_segment_url(channel_pk, upstream))
+    return '\n'.join(lines) + '\n'
+
+
+def fetch_playlist(url):
+    """Fetch + parse one upstream playlist, TTL = one target duration"""
+    response = requests.get(url, headers=stream_headers(url), timeout=UPSTREAM_TIMEOUT, verify=False)
+    response.raise_for_status()
+    playlist = parse_media_playlist(response.text)
+    if playlist['variants']:
+        ttl = MASTER_PLAYLIST_TTL
+    else:
+        ttl = playlist['target_duration'] or DEFAULT_PLAYLIST_TTL
+    return response.text, response.url, ttl
+
+
+def cached_playlist(url):
+    key = cache_key('playlist', url)
+
+    def produce():
+        value = fetch_playlist(url)
+        cache.set(key, value, value[2])
+        return value
+
+    return coalesce(key, lambda: cache.get(key), produce)
+
+
+def unsign_upstream(request):
+    try:
+        return signer.unsign(request.GET.get('u', ''))
+    except signing.BadSignature:
+        raise Http404('Invalid relay URL')
+
+
+def relay_playlist(request, pk):
+    """Rewritten playlist of a channel (root) or of one of its variants (?u=)"""
+    if not relay_enabled():
+        raise Http404('Relay disabled')
+    if 'u' in request.GET:
+        upstream = unsign_upstream(request)
+    else:
+        try:
+            channel = Channel.objects.prefetch_related('sources').get(pk=pk)
+        except Channel.DoesNotExist:
+            raise Http404('Channel not found')
+        upstream = best_source(channel)
+        if not upstream:
+            raise Http404('Channel has no stream')
+
+    try:
+        text, final_url, ttl = cached_playlist(upstream)
+    except (requests.exceptions.RequestException, TimeoutError):
+        return HttpResponse('Upstream unavailable', status=502, content_type='text/plain')
+
+    response = HttpResponse(rewrite_playlist(text, final_url, pk), content_type='application/vnd.apple.mpegurl')
+    response['Cache-Control'] = f'public, max-age={max(int(ttl) // 2, 1)}'
+    return response
+
+
+def relay_segment(request, pk):
+    """Segment (or key / init section) streamed from the LRU"""
+    if not relay_enabled():
+        raise Http404('Relay disabled')
+    upstream = unsign_upstream(request)
+    try:
+        content_type, chunks = segment_cache().fetch(upstream)
+    except (requests.exceptions.RequestException, TimeoutError):
+        return HttpResponse('Upstream unavailable', status=502, content_type='text/plain')
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Cache-Control'] = f'public, max-age={SEGMENT_MAX_AGE}'
+    return response
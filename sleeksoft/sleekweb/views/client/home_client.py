@@ -65,6 +65,14 @@ from django.core.mail import send_mail
 from django.forms.models import model_to_dict
 from django.core.mail import send_mail,EmailMessage
 
+from ...stream_ranking import cached_rankings
+from ...home_snapshot import load_snapshot
+from .hls_relay import relay_enabled, relay_playlist_url
+from ...page_cache import cached_page, entry_to_response
+from ...content_version import conditional_page, page_language
+from ...cdn import object_key
+
+@conditional_page('phom')
 def phom(request):
     if request.method == 'GET':
         context = {}
@@ -79,41 +87,70 @@ def live_view(request):
     hls_url = "http://your-domain-or-ip/hls/kenh1.m3u8"  # đổi thành domain/https nếu có reverse proxy
     return render(request, "live.html", {"hls_url": hls_url})
     
+@conditional_page('home')
 def home(request):
     if request.method == 'GET':
-        context = {}
-        context['domain'] = settings.DOMAIN
-        context['lg'] = request.COOKIES.get('language') or 'VI'
-        context['list_Ads'] = Ads.objects.all().order_by('Count')
-        context['list_Channel'] = Channel.objects.all().order_by('Count')
-        context['list_Odds'] = Odds.objects.all().order_by('Count')
-        context['list_Animation_Image'] = Animation_Image.objects.all()
-        context['list_Video_GaThuong'] = Video.objects.filter(Category='GaThuong').order_by('-id')
-        context['list_Video_GaDao'] = Video.objects.filter(Category='GaDao').order_by('-id')
-        # context['Product'] = Product.objects.get(Slug=slug)
-        # try:
-        #     context['Ads_1'] = Ads.objects.get(Count=1)
-        # except:
-        #     context['Ads_1'] = {}
-        # try:
-        #     context['Ads_2'] = Ads.objects.get(Count=2)
-        # except:
-        #     context['Ads_2'] = {}
-        # try:
-        #     context['Ads_3'] = Ads.objects.get(Count=3)
-        # except:
-        #     context['Ads_3'] = {}
-        # try:
-        #     context['Ads_4'] = Ads.objects.get(Count=4)
-        # except:
-        #     context['Ads_4'] = {}
-        # try:
-        #     context['Ads_100'] = Ads.objects.get(Count=100)
-        # except:
-        #     context['Ads_100'] = {}
-        # print('context:',context)
-        # return render(request, 'sleekweb/client/home.html', context, status=200)
-        return render(request, 'sleekweb/client/home.html', context, status=200)
+        lg = page_language(request)
+        # Trang chủ chỉ đổi khi admin sửa dữ liệu -> cache theo ngôn ngữ, xoá bằng signals
+        page = cached_page('home', lg, lambda: render_home(request, lg))
+        return entry_to_response(page)
+
+def render_home(request, lg):
+    context = {}
+    context['domain'] = settings.DOMAIN
+    context['lg'] = lg
+    # Toàn bộ dữ liệu trang chủ nằm trong một snapshot (dựng lại bằng signals)
+    # Lưới kênh được dựng phía trình duyệt từ channel_manifest
+    data = load_snapshot().Data
+    context['list_Ads'] = data['ads']
+    context['list_Odds'] = data['odds']
+    context['list_Animation_Image'] = data['animations']
+    # Trang đầu của mỗi danh mục video, trang sau tải bằng video_feed (keyset theo id)
+    context['list_Video_GaThuong'] = data['videos']['GaThuong']['items']
+    context['next_Video_GaThuong'] = data['videos']['GaThuong']['next']
+    context['list_Video_GaDao'] = data['videos']['GaDao']['items']
+    context['next_Video_GaDao'] = data['videos']['GaDao']['next']
+    response = render(request, 'sleekweb/client/home.html', context, status=200)
+    # CDN xoá trang này khi một trong các dòng đang hiện bị sửa
+    response.surrogate_keys = (
+        [object_key(Ads, i['id']) for i in data['ads']]
+        + [object_key(Odds, i['id']) for i in data['odds']]
+        + [object_key(Animation_Image, i['id']) for i in data['animations']]
+        + [object_key(Video, i['id']) for page in data['videos'].values() for i in page['items']]
+    )
+    return response
+
+@conditional_page('channel_manifest', per_language=False)
+def channel_manifest(request):
+    if request.method == 'GET':
+        # Sửa kênh chỉ làm mới manifest nhỏ này, HTML trang chủ vẫn giữ nguyên cache
+        page = cached_page('channel_manifest', 'all', render_channel_manifest)
+        return entry_to_response(page)
+
+def render_channel_manifest():
+    list_Channel = load_snapshot().Data['channels']
+    # Nguồn phát tốt nhất lấy từ bảng xếp hạng trong cache (không probe khi render)
+    rankings = cached_rankings({channel['id']: channel['Candidates'] for channel in list_Channel})
+    use_relay = relay_enabled()
+    channels = []
+    for channel in list_Channel:
+        play_url = rankings[channel['id']][0] if rankings[channel['id']] else channel['Key']
+        if use_relay and play_url and channel['StreamType'] != 'iframe':
+            play_url = relay_playlist_url(channel['id'])
+        channels.append({
+            'id': channel['id'],
+            'name': channel['Name'],
+            'src': play_url or '',
+            'iframe': channel['Iframe'] or '',
+            'stream_type': channel['StreamType'] or 'url',
+            'avatar': (channel['Avatar'].get('thumb') or channel['Avatar']['url']) if channel['Avatar'] else '',
+            'order': channel['Count'],
+            'password': channel['Password'],
+            'time': channel['Time'] or '',
+        })
+    response = JsonResponse({'channels': channels}, json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+    response.surrogate_keys = [object_key(Channel, channel['id']) for channel in channels]
+    return response
     
 def card_credit(request):
     if request.method == 'GET':
@@ -0,0 +1,34 @@
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponseRedirect
+from django.utils.cache import patch_cache_control
+
+from ...image_variants import FORMATS, image_dirs, is_animated, load_manifest, variant_for
+from ...storage import is_blob
+
+# Redirect đã trỏ tới tên file có hash nội dung, cache được lâu
+IMAGE_REDIRECT_MAX_AGE = 24 * 3600
+
+
+def image_variant(request, width, fmt, name):
+    # /img/<width>/<format>/<tên file gốc>: tạo ảnh thu nhỏ nếu chưa có, rồi chuyển hướng tới nó
+    name = posixpath.normpath(name)
+    if fmt not in FORMATS or name.startswith(('.', '/')):
+        raise Http404()
+    if posixpath.dirname(name) not in image_dirs() and not is_blob(name):
+        raise Http404()
+    if not default_storage.exists(name):
+        raise Http404()
+    if load_manifest(name) is None and is_animated(name):
+        # Ảnh động chỉ được mã hoá ở pool 'animation' sau upload, không trong request:
+        # trả về file gốc, không cache để lần sau nhận bản đã mã hoá
+        return HttpResponseRedirect(default_storage.url(name))
+    try:
+        variant = variant_for(name, width, fmt)
+    except OSError:
+        # Không đọc được như ảnh: trả về file gốc
+        variant = None
+    response = HttpResponseRedirect(default_storage.url(variant or name))
+    patch_cache_control(response, public=True, max_age=IMAGE_REDIRECT_MAX_AGE)
+    return response
@@ -0,0 +1,258 @@
+"""
+Media view for MEDIA_URL (/upload/): Range requests, ETag / Last-Modified
+and cache headers, with the bytes sent by the web server when it can.
+
+MEDIA_SENDFILE selects who sends the file body:
+
+    'x-accel-redirect'  nginx: `X-Accel-Redirect: MEDIA_ACCEL_PREFIX<path>`
+                        (an `internal` location aliased to MEDIA_ROOT)
+    'x-sendfile'        Apache mod_xsendfile / lighttpd: `X-Sendfile: <abs path>`
+    None                this view answers ranges itself; the body is a
+                        FileResponse, which the WSGI server sends with
+                        sendfile() (wsgi.file_wrapper) where it can
+
+With offload the web server also answers Range and If-Range; this view only
+resolves the path, answers conditional requests with 304 and sets the cache
+headers. Names that never change content (content-addressed blobs and
+image variants, per-job HLS directories) are cached for a year as
+immutable.
+"""
+
+import os
+import re
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, Http404, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import get_random_string
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+from django.views.decorators.http import require_safe
+
+from ...image_variants import HASH_LENGTH
+from ...transcoding import HLS_ROOT
+from ...storage import blob_re
+
+
+CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.webp': 'image/webp',
+    '.mp4': 'video/mp4',
+    '.webm': 'video/webm',
+}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Above this many ranges the request is answered with the whole file
+MAX_RANGES = 16
+COPY_BUFFER = 256 * 1024
+
+range_re = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+immutable_res = (
+    # image_variants.py: <stem>.<sha256 prefix>.<width>.<format>
+    re.compile(r'(^|/)_variants/[^/]+\.[0-9a-f]{%d}\.\d+\.\w+$' % HASH_LENGTH),
+    # transcoding.py: Video_Hls/<video>/<job>/...
+    re.compile(r'^%s/\d+/\d+/' % re.escape(HLS_ROOT)),
+    # storage.py: blobs/<aa>/<sha256>.<ext>
+    blob_re,
+)
+
+
+def content_type(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in CONTENT_TYPES:
+        return CONTENT_TYPES[extension]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def is_immutable(path):
+    return any(pattern.search(path) for pattern in immutable_res)
+
+
+def parse_ranges(header, size):
+    """
+    `Range: bytes=...` -> list of (start, end inclusive) within `size`.
+    None when the header is absent, malformed or asks for too many ranges
+    (serve the whole file), [] when no range is satisfiable (416)
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+    ranges = []
+    for part in spec.split(','):
+        match = range_re.match(part)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if first == '':
+            # Suffix: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+        ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def if_range_matches(request, etag, mtime):
+    """If-Range: a range is served only while the file is still this version"""
+    condition = request.META.get('HTTP_IF_RANGE')
+    if not condition:
+        return True
+    if condition.startswith(('"', 'W/')):
+        return condition == etag
+    date = parse_http_date_safe(condition)
+    return date is not None and int(mtime) <= date
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+    return since is not None and int(mtime) <= since
+
+
+class RangeFile:
+    """Read-only view of bytes [start, start + length) of a file"""
+
+    def __init__(self, f, start, length):
+        self.file = f
+        self.remaining = length
+        f.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # wsgi.file_wrapper sendfile(): starts at the current offset, sends Content-Length bytes
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def multipart_body(f, ranges, size, mime, boundary):
+    try:
+        for start, end in ranges:
+            yield (
+                f'\r\n--{boundary}\r\nContent-Type: {mime}\r\n'
+                f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+            ).encode()
+            part = RangeFile(f, start, end - start + 1)
+            while True:
+                chunk = part.read(COPY_BUFFER)
+                if not chunk:
+                    break
+                yield chunk
+        yield f'\r\n--{boundary}--\r\n'.encode()
+    finally:
+        f.close()
+
+
+def multipart_length(ranges, size, mime, boundary):
+    length = len(f'\r\n--{boundary}--\r\n')
+    for start, end in ranges:
+        length += len(
+            f'\r\n--{boundary}\r\nContent-Type: {mime}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        ) + end - start + 1
+    return length
+
+
+def file_response(request, full_path, stat, mime, etag):
+    if request.method == 'HEAD':
+        # Range applies to GET only; nothing is read
+        response = HttpResponse(content_type=mime)
+        response['Content-Length'] = stat.st_size
+        return response
+
+    ranges = parse_ranges(request.META.get('HTTP_RANGE'), stat.st_size)
+    if ranges is not None and not if_range_matches(request, etag, stat.st_mtime):
+        ranges = None
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    f = open(full_path, 'rb')
+    if ranges is None:
+        response = FileResponse(f, content_type=mime)
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = FileResponse(RangeFile(f, start, end - start + 1), content_type=mime, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        boundary = get_random_string(24)
+        response = StreamingHttpResponse(
+            multipart_body(f, ranges, stat.st_size, mime, boundary),
+            content_type=f'multipart/byteranges; boundary={boundary}', status=206,
+        )
+        response['Content-Length'] = multipart_length(ranges, stat.st_size, mime, boundary)
+    return response
+
+
+def offload_response(full_path, path, mime):
+    mode = getattr(settings, 'MEDIA_SENDFILE', None)
+    response = HttpResponse(content_type=mime)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-upload/')
+        response['X-Accel-Redirect'] = prefix + quote(path)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        # A typo must not send an empty body with a header no server understands
+        raise ImproperlyConfigured(f"MEDIA_SENDFILE must be 'x-accel-redirect', 'x-sendfile' or empty, not {mode!r}")
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, ValueError, OSError):
+        raise Http404()
+    if not os.path.isfile(full_path):
+        raise Http404()
+
+    mime = content_type(full_path)
+    etag = file_etag(stat)
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    elif getattr(settings, 'MEDIA_SENDFILE', None):
+        response = offload_response(full_path, path, mime)
+    else:
+        response = file_response(request, full_path, stat, mime, etag)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if is_immutable(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600))
+    return response
@@ -65,16 +65,19 @@ from django.core.mail import send_mail
 from django.forms.models import model_to_dict
 from django.core.mail import send_mail,EmailMessage
 
+from ...content_version import conditional_page, page_language
+
 def set_language(request, lang_code):
     response = redirect(request.META.get('HTTP_REFERER', '/'))  # quay lại trang vừa bấm
     response.set_cookie('language', lang_code, max_age=60*60*24*30)  # 30 ngày
     return response
     
+@conditional_page('service')
 def service(request):
     if request.method == 'GET':
         context = {}
         context['domain'] = settings.DOMAIN
-        context['lg'] = request.COOKIES.get('language') or 'VI'
+        context['lg'] = page_language(request)
         print('context:',context)
         return render(request, 'sleekweb/client/service.html', context, status=200)
     
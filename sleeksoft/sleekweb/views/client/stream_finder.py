@@ -9,23 +9,20 @@ import json
 import requests
 import threading
 import time
+import hashlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import render
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urldefrag
 
-# Selenium imports
-try:
-    from selenium import webdriver
-    from selenium.webdriver.chrome.service import Service as ChromeService
-    from selenium.webdriver.chrome.options import Options as ChromeOptions
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from webdriver_manager.chrome import ChromeDriverManager
-    SELENIUM_AVAILABLE = True
-except ImportError:
-    SELENIUM_AVAILABLE = False
+# Selenium is imported inside fetch_with_selenium(): selenium + webdriver_manager
+# are slow to import and heavy, and most processes never render a page.
+# find_spec() only checks that they are installed.
+SELENIUM_AVAILABLE = all(
+    importlib.util.find_spec(name) is not None for name in ('selenium', 'webdriver_manager')
+)
 
 
 def stream_finder_page(request):
@@ -73,57 +70,19 @@ def scan_url(request):
         if html_content is None:
             return JsonResponse({'error': 'Cannot fetch URL'}, status=400)
         
-        # Find all stream URLs
-        streams = find_stream_urls(html_content, base_url, target_url)
-        
-        # Add network captured URLs (from Selenium)
-        for url in network_urls:
-            if url not in [s['url'] for s in streams]:
-                stream_type = detect_stream_type(url)
-                if stream_type:
-                    streams.append({
-                        'url': url,
-                        'type': stream_type,
-                        'source': 'network_capture'
-                    })
-        
-        # Parse JS sources for URLs
-        for js_content in js_sources:
-            js_streams = find_urls_in_js(js_content, base_url)
-            for stream in js_streams:
-                if stream['url'] not in [s['url'] for s in streams]:
-                    streams.append(stream)
-        
-        # ========== FILTER: ONLY HLS (.m3u8) STREAMS ==========
-        # Remove TS segments, iframes, and other non-HLS streams
-        hls_streams = []
-        for stream in streams:
-            url_lower = stream['url'].lower()
-            # Only keep .m3u8 URLs
-            if '.m3u8' in url_lower:
-                # Skip tracking/analytics URLs
-                if 'ping.gif' in url_lower or 'analytics' in url_lower or 'tracking' in url_lower:
-                    continue
-                hls_streams.append(stream)
-        
-        streams = hls_streams
-        
-        # Check which streams are alive
-        live_streams = []
-        for stream in streams:
-            status = check_stream_status(stream['url'])
-            stream['status'] = status
-            stream['status_text'] = 'Online' if status else 'Offline/Unknown'
-            live_streams.append(stream)
+        # Find all HLS stream URLs
+        streams = extract_hls_streams(html_content, base_url, target_url, network_urls, js_sources)
         
-        # Sort: online first
-        live_streams.sort(key=lambda x: (not x['status'], x['type']))
+        # Group mirrors of the same feed, check one member per cluster
+        clusters = check_streams_by_cluster(streams)
+        live_streams = [stream for cluster in clusters for stream in cluster['streams']]
         
         return JsonResponse({
             'success': True,
             'url': target_url,
             'method': 'selenium' if use_selenium else 'requests',
             'streams': live_streams,
+            'clusters': clusters,
             'total': len(live_streams),
             'online': sum(1 for s in live_streams if s['status'])
         })
@@ -138,6 +97,96 @@ def scan_url(request):
         return JsonResponse({'error': f'Error: {str(e)}'}, status=500)
 
 
+@csrf_exempt
+def crawl_url(request):
+    """
+    API endpoint to crawl a site starting from one URL and scan every channel page
+    POST: { "url": "https://example.com", "patterns": ["/live", "/kenh"], "max_depth": 2,
+            "max_pages": 30, "use_selenium": true, "deep_scan": false }
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST method required'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError('expected a JSON object')
+        target_url = data.get('url', '').strip()
+        use_selenium = data.get('use_selenium', False)
+        deep_scan = data.get('deep_scan', False)
+        patterns = crawl_patterns(data.get('patterns'))
+        max_depth = max(0, min(int(data.get('max_depth', CRAWL_MAX_DEPTH)), CRAWL_MAX_DEPTH_LIMIT))
+        max_pages = max(1, min(int(data.get('max_pages', CRAWL_MAX_PAGES)), CRAWL_MAX_PAGES_LIMIT))
+        
+        if not target_url:
+            return JsonResponse({'error': 'URL is required'}, status=400)
+        
+        # Add https if missing
+        if not target_url.startswith(('http://', 'https://')):
+            target_url = 'https://' + target_url
+        
+        if use_selenium and not SELENIUM_AVAILABLE:
+            return JsonResponse({
+                'error': 'Selenium not installed. Run: pip install selenium webdriver-manager'
+            }, status=400)
+        
+        pages = crawl_site(
+            target_url,
+            patterns=patterns,
+            max_depth=max_depth,
+            max_pages=max_pages,
+            use_selenium=use_selenium,
+            deep_scan=deep_scan,
+        )
+        
+        if not pages:
+            return JsonResponse({'error': 'Cannot fetch URL'}, status=400)
+        
+        # Group mirrors across all pages, check one member per cluster
+        all_streams = [stream for page in pages for stream in page['streams']]
+        clusters = check_streams_by_cluster(all_streams)
+        
+        for page in pages:
+            page['streams'].sort(key=lambda x: (not x['status'], x['cluster'], x['mirror_rank']))
+        
+        return JsonResponse({
+            'success': True,
+            'url': target_url,
+            'method': 'crawl',
+            'pages': pages,
+            'pages_crawled': len(pages),
+            'clusters': clusters,
+            'total': len(all_streams),
+            'online': sum(1 for s in all_streams if s['status'])
+        })
+        
+    except (AttributeError, TypeError, ValueError) as e:
+        return JsonResponse({'error': f'Invalid parameters: {str(e)}'}, status=400)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': f'Error: {str(e)}'}, status=500)
+
+
+def crawl_patterns(raw):
+    """
+    Link patterns from a crawl request
+    User patterns are plain substrings of the link path (escaped, never run as
+    regexes: the endpoint is public); None / empty = CRAWL_DEFAULT_PATTERNS
+    Raises ValueError on anything but a short list of short strings
+    """
+    if not raw:
+        return [re.compile(p, re.IGNORECASE) for p in CRAWL_DEFAULT_PATTERNS]
+    if not isinstance(raw, list) or len(raw) > CRAWL_MAX_PATTERNS:
+        raise ValueError(f'patterns must be a list of at most {CRAWL_MAX_PATTERNS} strings')
+    patterns = []
+    for p in raw:
+        if not isinstance(p, str) or not p.strip() or len(p) > CRAWL_PATTERN_MAX_LENGTH:
+            raise ValueError(f'each pattern must be a non-empty string of at most {CRAWL_PATTERN_MAX_LENGTH} characters')
+        patterns.append(re.compile(re.escape(p.strip()), re.IGNORECASE))
+    return patterns
+
+
 def fetch_with_requests(target_url):
     """Simple fetch using requests library"""
     headers = {
@@ -151,6 +200,46 @@ def fetch_with_requests(target_url):
     return response.text
 
 
+def extract_hls_streams(html_content, base_url, page_url, network_urls=(), js_sources=()):
+    """
+    Run every extractor over one fetched page and keep only HLS (.m3u8) streams
+    Returns a list of stream dicts: { url, type, source }
+    """
+    streams = find_stream_urls(html_content, base_url, page_url)
+    
+    # Add network captured URLs (from Selenium)
+    for url in network_urls:
+        if url not in [s['url'] for s in streams]:
+            stream_type = detect_stream_type(url)
+            if stream_type:
+                streams.append({
+                    'url': url,
+                    'type': stream_type,
+                    'source': 'network_capture'
+                })
+    
+    # Parse JS sources for URLs
+    for js_content in js_sources:
+        js_streams = find_urls_in_js(js_content, base_url)
+        for stream in js_streams:
+            if stream['url'] not in [s['url'] for s in streams]:
+                streams.append(stream)
+    
+    # ========== FILTER: ONLY HLS (.m3u8) STREAMS ==========
+    # Remove TS segments, iframes, and other non-HLS streams
+    hls_streams = []
+    for stream in streams:
+        url_lower = stream['url'].lower()
+        # Only keep .m3u8 URLs
+        if '.m3u8' in url_lower:
+            # Skip tracking/analytics URLs
+            if 'ping.gif' in url_lower or 'analytics' in url_lower or 'tracking' in url_lower:
+                continue
+            hls_streams.append(stream)
+    
+    return hls_streams
+
+
 def fetch_with_selenium(target_url, deep_scan=False):
     """
     Fetch page with Selenium to execute JavaScript
@@ -161,6 +250,14 @@ def fetch_with_selenium(target_url, deep_scan=False):
         target_url: URL to scan
         deep_scan: If True, waits longer and clicks more aggressively (slower but more thorough)
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from webdriver_manager.chrome import ChromeDriverManager
+
     captured_urls = []
     js_sources = []
     
@@ -831,6 +928,249 @@ def check_stream_status(url):
         return False
 
 
+# ========== MIRROR DETECTION ==========
+# The same feed is often exposed on several CDN hostnames. Fingerprint HLS media
+# playlists so identical feeds cluster together and only one mirror is probed.
+
+FINGERPRINT_TIMEOUT = 8
+FINGERPRINT_CONCURRENCY = 8
+# Max media-sequence drift between two mirrors of the same live feed
+SEQUENCE_TOLERANCE = 6
+# EXTINF durations of the same segment on two mirrors differ by less than this (seconds)
+DURATION_TOLERANCE = 0.05
+
+
+def stream_headers(url):
+    """Browser-like headers with Origin/Referer of the stream host"""
+    parsed = urlparse(url)
+    return {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': '*/*',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Origin': f"{parsed.scheme}://{parsed.netloc}",
+        'Referer': f"{parsed.scheme}://{parsed.netloc}/",
+    }
+
+
+def segment_pattern(uri):
+    """Segment file name with digits collapsed: 'live_1234.ts?t=9' -> 'live_#.ts'"""
+    name = uri.split('?', 1)[0].rsplit('/', 1)[-1]
+    return re.sub(r'\d+', '#', name)
+
+
+def parse_media_playlist(text):
+    """
+    Parse the parts of an HLS playlist used for fingerprinting
+    Returns: { target_duration, media_sequence, segments, durations, ended, variants }
+    media_sequence is None when the playlist has no #EXT-X-MEDIA-SEQUENCE;
+    durations[i] is the EXTINF of segments[i] (None if missing)
+    """
+    target_duration = None
+    media_sequence = None
+    segments = []
+    durations = []
+    ended = False
+    variants = []
+    expect_variant = False
+    duration = None
+    
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-TARGETDURATION:'):
+            try:
+                target_duration = int(float(line.split(':', 1)[1]))
+            except ValueError:
+                pass
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            try:
+                media_sequence = int(line.split(':', 1)[1])
+            except ValueError:
+                pass
+        elif line.startswith('#EXTINF:'):
+            try:
+                duration = float(line.split(':', 1)[1].split(',', 1)[0])
+            except ValueError:
+                duration = None
+        elif line == '#EXT-X-ENDLIST' or line == '#EXT-X-PLAYLIST-TYPE:VOD':
+            ended = True
+        elif line.startswith('#EXT-X-STREAM-INF'):
+            expect_variant = True
+        elif not line.startswith('#'):
+            if expect_variant:
+                variants.append(line)
+                expect_variant = False
+            else:
+                segments.append(line)
+                durations.append(duration)
+                duration = None
+    
+    return {
+        'target_duration': target_duration,
+        'media_sequence': media_sequence,
+        'segments': segments,
+        'durations': durations,
+        'ended': ended,
+        'variants': variants,
+    }
+
+
+def fingerprint_hls(url):
+    """
+    Fetch an HLS playlist (following the first variant of a master playlist)
+    Returns fingerprint dict with latency_ms, or None if it can't be read
+    """
+    try:
+        started = time.monotonic()
+        response = requests.get(url, headers=stream_headers(url), timeout=FINGERPRINT_TIMEOUT, verify=False)
+        latency_ms = int((time.monotonic() - started) * 1000)
+        if response.status_code != 200 or '#EXTM3U' not in response.text[:1024].upper():
+            return None
+        
+        playlist = parse_media_playlist(response.text)
+        if playlist['variants'] and not playlist['segments']:
+            variant_url = urljoin(response.url, playlist['variants'][0])
+            variant = requests.get(variant_url, headers=stream_headers(variant_url), timeout=FINGERPRINT_TIMEOUT, verify=False)
+            if variant.status_code != 200:
+                return None
+            playlist = parse_media_playlist(variant.text)
+        
+        if not playlist['segments']:
+            return None
+        
+        patterns = sorted(set(segment_pattern(seg) for seg in playlist['segments']))
+        return {
+            'target_duration': playlist['target_duration'],
+            'media_sequence': playlist['media_sequence'],
+            'ended': playlist['ended'],
+            'window': len(playlist['segments']),
+            'pattern': '|'.join(patterns),
+            # segment file name -> EXTINF, in playlist order
+            'segments': {
+                seg.split('?', 1)[0].rsplit('/', 1)[-1]: duration
+                for seg, duration in zip(playlist['segments'], playlist['durations'])
+            },
+            'durations': playlist['durations'],
+            'latency_ms': latency_ms,
+        }
+    except Exception:
+        return None
+
+
+def durations_match(a, b):
+    return a is not None and b is not None and abs(a - b) < DURATION_TOLERANCE
+
+
+def majority(count, fp_a, fp_b):
+    """More than half of the shorter playlist window"""
+    return count * 2 > min(fp_a['window'], fp_b['window'])
+
+
+def shared_segments(fp_a, fp_b):
+    """
+    Evidence from file names: most segments of the shorter window are on both
+    mirrors, with the same durations. One or two shared generic names
+    (index0.ts, seg-1.ts) prove nothing
+    """
+    shared = fp_a['segments'].keys() & fp_b['segments'].keys()
+    if not majority(len(shared), fp_a, fp_b):
+        return False
+    return all(durations_match(fp_a['segments'][name], fp_b['segments'][name]) for name in shared)
+
+
+def aligned_sequences(fp_a, fp_b):
+    """
+    Evidence from media sequences, for mirrors that rename segments: the live
+    windows overlap and the overlapping segments have the same durations.
+    A playlist without #EXT-X-MEDIA-SEQUENCE, a VOD or a feed cut into equal
+    segments gives no evidence
+    """
+    if fp_a['media_sequence'] is None or fp_b['media_sequence'] is None or fp_a['ended'] or fp_b['ended']:
+        return False
+    offset = fp_b['media_sequence'] - fp_a['media_sequence']
+    if abs(offset) > max(fp_a['window'], fp_b['window'], SEQUENCE_TOLERANCE):
+        return False
+    # Segment i of a is segment i - offset of b
+    pairs = [
+        (duration, fp_b['durations'][i - offset])
+        for i, duration in enumerate(fp_a['durations'])
+        if 0 <= i - offset < len(fp_b['durations'])
+    ]
+    if not majority(len(pairs), fp_a, fp_b):
+        return False
+    if len({duration for duration, _ in pairs}) < 2:
+        return False
+    return all(durations_match(a, b) for a, b in pairs)
+
+
+def same_feed(fp_a, fp_b):
+    """Two fingerprints belong to the same feed"""
+    if fp_a['target_duration'] != fp_b['target_duration'] or fp_a['pattern'] != fp_b['pattern']:
+        return False
+    return shared_segments(fp_a, fp_b) or aligned_sequences(fp_a, fp_b)
+
+
+def check_streams_by_cluster(streams):
+    """
+    Cluster identical feeds and check liveness once per cluster
+    Sets status / cluster / mirror_rank / latency_ms on every stream dict
+    Returns clusters: [{ id, status, size, target_duration, pattern, streams }]
+    with the fastest mirror first, online clusters first
+    """
+    if not streams:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=FINGERPRINT_CONCURRENCY) as executor:
+        fingerprints = list(executor.map(lambda s: fingerprint_hls(s['url']), streams))
+    
+    groups = []  # [(fingerprint, [(stream, fingerprint), ...])]
+    for stream, fp in zip(streams, fingerprints):
+        if fp is not None:
+            for group_fp, members in groups:
+                # Any member: mirrors polled a few seconds apart may only overlap with some of the others
+                if group_fp is not None and any(same_feed(member_fp, fp) for _, member_fp in members):
+                    members.append((stream, fp))
+                    break
+            else:
+                groups.append((fp, [(stream, fp)]))
+        else:
+            groups.append((None, [(stream, None)]))
+    
+    def check_group(group):
+        group_fp, members = group
+        members.sort(key=lambda m: m[1]['latency_ms'] if m[1] else float('inf'))
+        # A readable playlist already proves the fastest mirror is alive
+        if members[0][1] is not None:
+            return True
+        return check_stream_status(members[0][0]['url'])
+    
+    with ThreadPoolExecutor(max_workers=FINGERPRINT_CONCURRENCY) as executor:
+        statuses = list(executor.map(check_group, groups))
+    
+    clusters = []
+    for cluster_id, ((group_fp, members), status) in enumerate(zip(groups, statuses), start=1):
+        cluster_streams = []
+        for rank, (stream, fp) in enumerate(members):
+            stream['status'] = status
+            stream['status_text'] = 'Online' if status else 'Offline/Unknown'
+            stream['cluster'] = cluster_id
+            stream['mirror_rank'] = rank
+            stream['latency_ms'] = fp['latency_ms'] if fp else None
+            cluster_streams.append(stream)
+        clusters.append({
+            'id': cluster_id,
+            'status': status,
+            'size': len(cluster_streams),
+            'target_duration': group_fp['target_duration'] if group_fp else None,
+            'pattern': group_fp['pattern'] if group_fp else None,
+            'streams': cluster_streams,
+        })
+    
+    clusters.sort(key=lambda c: (not c['status'], -c['size']))
+    return clusters
+
+
 @csrf_exempt
 def check_single_stream(request):
     """
@@ -860,3 +1200,174 @@ def check_single_stream(request):
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+
+# ========== CRAWL MODE ==========
+# Follow same-origin links from one start page to discover every channel page
+
+# Links worth following: channel / live pages on Vietnamese streaming sites
+CRAWL_DEFAULT_PATTERNS = [r'/live', r'/kenh', r'/channel', r'/truc-?tiep', r'/xem', r'/tv']
+CRAWL_MAX_DEPTH = 2
+CRAWL_MAX_PAGES = 30
+CRAWL_MAX_DEPTH_LIMIT = 4
+CRAWL_MAX_PAGES_LIMIT = 100
+CRAWL_MAX_PATTERNS = 20
+CRAWL_PATTERN_MAX_LENGTH = 100
+CRAWL_CONCURRENCY = 4
+
+# Selenium is heavy - never run more than one browser at a time while crawling
+_selenium_slot = threading.Semaphore(1)
+
+# Markers of a page that renders its player with JavaScript
+PLAYER_INDICATORS = [
+    '<video', 'jwplayer', 'hls.js', 'hls.min.js', 'videojs', 'video.js',
+    'clappr', 'flowplayer', 'dplayer', 'artplayer', 'plyr', 'player.setup',
+]
+
+SKIP_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.css', '.js',
+    '.woff', '.woff2', '.ttf', '.mp4', '.m3u8', '.ts', '.zip', '.pdf', '.xml',
+)
+
+
+class VisitedSet:
+    """
+    Compact visited-set for the crawl frontier
+    Stores an 8-byte digest per normalized URL instead of the full string
+    """
+
+    def __init__(self):
+        self._digests = set()
+
+    @staticmethod
+    def _digest(url):
+        return hashlib.blake2b(normalize_crawl_url(url).encode('utf-8'), digest_size=8).digest()
+
+    def add(self, url):
+        """Add url, return False if it was already seen"""
+        digest = self._digest(url)
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        return True
+
+    def __contains__(self, url):
+        return self._digest(url) in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+
+def normalize_crawl_url(url):
+    """Drop fragment, lowercase scheme/host and trailing slash so duplicates collapse"""
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    path = parsed.path.rstrip('/') or '/'
+    normalized = f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}"
+    if parsed.query:
+        normalized += '?' + parsed.query
+    return normalized
+
+
+def extract_links(html_content, page_url, origin, patterns):
+    """Find same-origin <a href> links matching any of the patterns"""
+    links = []
+    for href in re.findall(r'<a[^>]*\s+href=["\']([^"\'#][^"\']*)["\']', html_content, re.IGNORECASE):
+        if href.startswith(('javascript:', 'mailto:', 'tel:')):
+            continue
+        full_url = urldefrag(urljoin(page_url, href))[0]
+        parsed = urlparse(full_url)
+        if f"{parsed.scheme}://{parsed.netloc}" != origin:
+            continue
+        if parsed.path.lower().endswith(SKIP_EXTENSIONS):
+            continue
+        if any(p.search(parsed.path) for p in patterns):
+            links.append(full_url)
+    return links
+
+
+def looks_like_player(html_content):
+    """True if the page seems to build its player with JavaScript"""
+    html_lower = html_content.lower()
+    return any(indicator in html_lower for indicator in PLAYER_INDICATORS)
+
+
+def scan_crawl_page(page_url, base_url, use_selenium, deep_scan):
+    """
+    Scan one crawled page
+    The requests extractors always run; Selenium only for player pages without static HLS
+    Returns: (html_content, method, streams)
+    """
+    try:
+        html_content = fetch_with_requests(page_url)
+    except requests.exceptions.RequestException:
+        return None, 'requests', []
+    
+    streams = extract_hls_streams(html_content, base_url, page_url)
+    method = 'requests'
+    
+    if use_selenium and SELENIUM_AVAILABLE and not streams and looks_like_player(html_content):
+        with _selenium_slot:
+            rendered, network_urls, js_sources = fetch_with_selenium(page_url, deep_scan=deep_scan)
+        if rendered is not None:
+            streams = extract_hls_streams(rendered, base_url, page_url, network_urls, js_sources)
+            method = 'selenium'
+    
+    return html_content, method, streams
+
+
+def crawl_site(start_url, patterns, max_depth=CRAWL_MAX_DEPTH, max_pages=CRAWL_MAX_PAGES,
+               use_selenium=False, deep_scan=False, concurrency=CRAWL_CONCURRENCY):
+    """
+    Breadth-first crawl of same-origin pages matching patterns
+    Fetches each depth level with bounded concurrency
+    Returns pages: [{ url, depth, method, streams }], every stream URL listed once
+    (on the first page it was found)
+    """
+    parsed = urlparse(start_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    
+    visited = VisitedSet()
+    seen_streams = set()
+    visited.add(start_url)
+    frontier = [start_url]
+    pages = []
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for depth in range(max_depth + 1):
+            if not frontier:
+                break
+            frontier = frontier[:max_pages - len(pages)]
+            results = executor.map(
+                lambda url: scan_crawl_page(url, origin, use_selenium, deep_scan),
+                frontier
+            )
+            
+            next_frontier = []
+            for page_url, (html_content, method, streams) in zip(frontier, results):
+                if html_content is None:
+                    continue
+                
+                unique_streams = []
+                for stream in streams:
+                    if stream['url'] not in seen_streams:
+                        seen_streams.add(stream['url'])
+                        unique_streams.append(stream)
+                
+                pages.append({
+                    'url': page_url,
+                    'depth': depth,
+                    'method': method,
+                    'streams': unique_streams,
+                })
+                
+                if depth < max_depth:
+                    for link in extract_links(html_content, page_url, origin, patterns):
+                        if visited.add(link):
+                            next_frontier.append(link)
+            
+            if len(pages) >= max_pages:
+                break
+            frontier = next_frontier
+    
+    return pages
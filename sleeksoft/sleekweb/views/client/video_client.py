@@ -0,0 +1,41 @@
+from django.http import JsonResponse, HttpResponseBadRequest
+
+from ...home_snapshot import VIDEO_CATEGORIES, VIDEO_PAGE_SIZE, video_page
+from ...content_version import conditional_page
+from ...cdn import object_key
+from ...models import Video
+
+# Giới hạn số video mỗi lần tải thêm
+VIDEO_FEED_MAX_LIMIT = 48
+
+@conditional_page('video_feed', per_language=False)
+def video_feed(request):
+    if request.method == 'GET':
+        # Phân trang keyset: ?category=GaThuong&before=<id video cuối đã hiện>
+        category = request.GET.get('category')
+        if category not in VIDEO_CATEGORIES:
+            return HttpResponseBadRequest('Invalid category')
+        try:
+            before = int(request.GET['before']) if request.GET.get('before') else None
+            limit = min(int(request.GET.get('limit') or VIDEO_PAGE_SIZE), VIDEO_FEED_MAX_LIMIT)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid cursor')
+        if limit < 1:
+            return HttpResponseBadRequest('Invalid limit')
+
+        videos, next_cursor = video_page(category, before, limit)
+        response = JsonResponse({
+            'videos': [
+                {
+                    'id': video['id'],
+                    'title': video['Title'] or '',
+                    'poster': (video['Avatar'].get('poster') or video['Avatar']['url']) if video['Avatar'] else '',
+                    'src': video['Video']['url'] if video['Video'] else '',
+                    'hls': video['Hls']['url'] if video.get('Hls') else '',
+                }
+                for video in videos
+            ],
+            'next': next_cursor,
+        })
+        response.surrogate_keys = [object_key(Video, video['id']) for video in videos]
+        return response
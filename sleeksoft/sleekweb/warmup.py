@@ -0,0 +1,125 @@
+"""
+Startup warm-up: pay the first-request costs before the worker serves.
+
+Stages: import the public view modules, build the URL resolver, compile the page
+templates into the cached loader, prime the snapshot / content versions /
+page cache for home and the channel manifest. Each stage is timed and the
+report is printed once at startup (wsgi.py) or by `manage.py warmup`.
+
+With `gunicorn --preload` this runs once in the master before workers fork;
+the DB connections it opened are closed so no worker inherits them.
+Safe to import before django.setup(): models are only imported inside stages.
+Admin views are not imported here: urls.py routes to them lazily
+(lazy_views.py), so a worker loads them on its first admin request.
+"""
+
+import sys
+import time
+import pkgutil
+import importlib
+
+from django.conf import settings
+
+
+VIEW_PACKAGES = ('sleekweb.views.client',)
+WARMUP_LANGUAGES = ('VI', 'EN')
+
+
+class StartupReport:
+    def __init__(self):
+        self.stages = []  # (name, seconds, error or None)
+
+    def add(self, name, seconds, error=None):
+        self.stages.append((name, seconds, error))
+
+    def stage(self, name, fn, *args):
+        started = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.add(name, time.perf_counter() - started, f'{type(e).__name__}: {e}')
+            return None
+        self.add(name, time.perf_counter() - started)
+        return result
+
+    @property
+    def total(self):
+        return sum(seconds for name, seconds, _ in self.stages if not name.startswith('  '))
+
+    def lines(self):
+        width = max((len(name) for name, _, _ in self.stages), default=0)
+        for name, seconds, error in self.stages:
+            line = f'{name.ljust(width)}  {seconds * 1000:8.1f} ms'
+            yield f'{line}  ! {error}' if error else line
+        yield f'{"total".ljust(width)}  {self.total * 1000:8.1f} ms'
+
+
+def import_views(report):
+    """Import each view module on its own so the report shows which one is slow"""
+    for package_name in VIEW_PACKAGES:
+        package = importlib.import_module(package_name)
+        for module in sorted(pkgutil.iter_modules(package.__path__), key=lambda m: m.name):
+            name = f'{package_name}.{module.name}'
+            already = name in sys.modules
+            started = time.perf_counter()
+            importlib.import_module(name)
+            report.add(f'  import {module.name}{" (loaded)" if already else ""}', time.perf_counter() - started)
+
+
+def build_resolver():
+    from django.urls import get_resolver, resolve, reverse
+    resolver = get_resolver()
+    resolver.reverse_dict  # populates every pattern
+    resolve(reverse('home'))
+
+
+def compile_templates():
+    from django.template.loader import get_template
+    from .content_version import PAGES
+    for template_name, _ in PAGES.values():
+        if template_name:
+            get_template(template_name)
+
+
+def prime_caches():
+    from django.test.client import RequestFactory
+    from .content_version import PAGES, model_versions
+    from .home_snapshot import load_snapshot
+    from .views.client.home_client import home, channel_manifest
+
+    load_snapshot()
+    model_versions({model for _, models in PAGES.values() for model in models})
+    factory = RequestFactory()
+    for lang in WARMUP_LANGUAGES:
+        request = factory.get('/')
+        request.COOKIES['language'] = lang
+        home(request)
+    channel_manifest(factory.get('/api/channels/manifest.json'))
+
+
+def warm_up(prime=True):
+    """Run every stage and return the StartupReport"""
+    report = StartupReport()
+    report.stage('import views', import_views, report)
+    report.stage('url resolver', build_resolver)
+    report.stage('templates', compile_templates)
+    if prime:
+        report.stage('home / channel caches', prime_caches)
+    return report
+
+
+def startup(setup_seconds=None):
+    """Called from wsgi.py after django.setup()"""
+    if not getattr(settings, 'WARMUP_ON_STARTUP', True):
+        return None
+    from django.db import connections
+
+    report = warm_up(prime=getattr(settings, 'WARMUP_PRIME_CACHES', True))
+    # Forked workers must not share the master's DB connections
+    connections.close_all()
+    if setup_seconds is not None:
+        report.stages.insert(0, ('django.setup', setup_seconds, None))
+    print('[warmup] startup report', file=sys.stderr)
+    for line in report.lines():
+        print(f'[warmup] {line}', file=sys.stderr)
+    return report